@@ -0,0 +1,111 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from analyse_incrementale import fichiers_par_cle, differences
+from extraction_pdf import nombre_workers, nom_fichier
+import traces
+
+# Analyses en tâche de fond : l'interface soumet une tâche par téléversement et suit sa progression
+# (fichiers traités, synthèse partielle) sans bloquer la page. Une tâche n'est jamais lancée deux fois
+# pour la même liste de fichiers ; une liste modifiée annule la tâche en cours.
+try:
+    ANALYSES_SIMULTANEES = max(1, int(os.environ.get("IMPOT_CALC_ANALYSES", "4")))
+except ValueError:
+    ANALYSES_SIMULTANEES = 4
+
+_executeur = None
+_verrou = threading.Lock()
+
+
+def _get_executeur():
+    global _executeur
+    with _verrou:
+        if _executeur is None:
+            _executeur = ThreadPoolExecutor(max_workers=ANALYSES_SIMULTANEES, thread_name_prefix="analyse")
+        return _executeur
+
+
+def soumettre(precedente, etat, uploaded_files, ajouter, retirer, synthese, diagnostics=False, forcer_synthese=False):
+    """
+    Aligne `etat` sur les fichiers téléversés dans une tâche de fond (voir analyse_incrementale.synchroniser).
+    Retourne `precedente` si elle porte déjà sur les mêmes fichiers (sans erreur) ; sinon elle est annulée et une nouvelle
+    tâche est créée. Elle ne démarre qu'une fois la précédente arrêtée, seule à modifier `etat`.
+    Tâche : {"cles", "progression": {"faits", "total", "fichier"}, "partiel", "resultat", "erreur", ...}.
+    """
+    courants = fichiers_par_cle(uploaded_files)
+    if (precedente is not None and precedente["cles"] == frozenset(courants)
+            and not precedente["annulation"].is_set() and precedente["erreur"] is None):
+        return precedente
+    if precedente is not None:
+        annuler(precedente)
+    tache = {
+        "cles": frozenset(courants),
+        "progression": {"faits": 0, "total": 0, "fichier": None},
+        "partiel": None,
+        "resultat": None,
+        "erreur": None,
+        "annulation": threading.Event(),
+        "publiee": False,
+        "precedente": precedente,
+    }
+    tache["future"] = _get_executeur().submit(_executer, tache, etat, courants, ajouter, retirer, synthese,
+                                              diagnostics, forcer_synthese)
+    return tache
+
+
+def annuler(tache):
+    """Demande l'arrêt d'une tâche : elle s'interrompt entre deux lots, l'état reste cohérent."""
+    tache["annulation"].set()
+    tache["future"].cancel()
+
+
+def terminee(tache):
+    return tache["future"].done()
+
+
+def attendre(tache, delai_s=None):
+    """Attend la fin de la tâche au plus `delai_s` secondes ; retourne True si elle est terminée."""
+    try:
+        tache["future"].result(timeout=delai_s)
+    except TimeoutError:
+        return False
+    except Exception:
+        pass
+    return True
+
+
+def _executer(tache, etat, courants, ajouter, retirer, synthese, diagnostics, forcer_synthese):
+    # Les tâches annulées s'arrêtent au lot en cours : l'état ne doit être modifié que par une tâche à la fois.
+    # Une tâche annulée avant d'avoir démarré n'a attendu personne : on remonte toute la chaîne.
+    # "etat_modifie" : l'état a changé depuis la dernière synthèse publiée (tâche interrompue), elle est à refaire.
+    precedente = tache.pop("precedente")
+    while precedente is not None:
+        attendre(precedente)
+        tache["etat_modifie"] = tache.get("etat_modifie") or precedente.get("etat_modifie", False)
+        precedente = precedente.get("precedente")
+    if tache["annulation"].is_set():
+        return
+    try:
+        with traces.activation(diagnostics):
+            retires, nouveaux = differences(etat, courants)
+            tache["progression"]["total"] = len(nouveaux)
+            if retires:
+                tache["etat_modifie"] = True
+                retirer(etat, retires)
+            # Lots de la taille du pool d'extraction : la lecture reste parallèle, la synthèse est publiée après chaque lot
+            taille_lot = nombre_workers()
+            for debut in range(0, len(nouveaux), taille_lot):
+                if tache["annulation"].is_set():
+                    return
+                lot = nouveaux[debut:debut + taille_lot]
+                tache["progression"]["fichier"] = nom_fichier(lot[0])
+                tache["etat_modifie"] = True
+                ajouter(etat, lot)
+                tache["progression"]["faits"] += len(lot)
+                if debut + taille_lot < len(nouveaux):
+                    tache["partiel"] = synthese(etat)
+            if tache.get("etat_modifie") or forcer_synthese:
+                tache["resultat"] = synthese(etat)
+                tache["etat_modifie"] = False
+    except Exception as e:
+        tache["erreur"] = e
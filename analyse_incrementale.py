@@ -0,0 +1,53 @@
+from extraction_pdf import empreinte_fichier, nom_fichier
+
+
+def cle_fichier(fichier):
+    """Identifiant d'un fichier dans un état d'analyse : l'empreinte de son contenu (ou son nom s'il est illisible)."""
+    try:
+        return empreinte_fichier(fichier)
+    except Exception:
+        return f"nom:{nom_fichier(fichier)}"
+
+
+def fichiers_par_cle(uploaded_files):
+    """{clé: fichier} des fichiers téléversés, sans doublon de contenu (le premier est gardé)."""
+    courants = {}
+    for fichier in uploaded_files:
+        courants.setdefault(cle_fichier(fichier), fichier)
+    return courants
+
+
+def differences(etat, courants):
+    """(clés des fichiers disparus, fichiers nouveaux) entre un état d'analyse et {clé: fichier} courant."""
+    retires = [cle for cle in etat["fichiers"] if cle not in courants]
+    nouveaux = [fichier for cle, fichier in courants.items() if cle not in etat["fichiers"]]
+    return retires, nouveaux
+
+
+def pages_document(document):
+    """Pages lues et écartées d'un document extrait, à conserver dans l'enregistrement du fichier."""
+    return {"extraites": document["pages_extraites"], "ignorees": document["pages_ignorees"]}
+
+
+def stats_pages(etat):
+    """Pages lues et écartées des fichiers présents dans l'état (un fichier retiré n'y compte plus)."""
+    totaux = {"extraites": 0, "ignorees": 0}
+    for enregistrement in etat["fichiers"].values():
+        for cle, nombre in (enregistrement.get("pages") or {}).items():
+            totaux[cle] += nombre
+    return totaux
+
+
+def synchroniser(etat, uploaded_files, ajouter, retirer):
+    """
+    Aligne un état d'analyse sur la liste courante des fichiers téléversés :
+    les fichiers disparus sont retirés, seuls les nouveaux sont analysés.
+    `ajouter(etat, fichiers)` et `retirer(etat, cles)` sont les fonctions de l'analyseur.
+    Retourne True si l'état a changé.
+    """
+    retires, nouveaux = differences(etat, fichiers_par_cle(uploaded_files))
+    if retires:
+        retirer(etat, retires)
+    if nouveaux:
+        ajouter(etat, nouveaux)
+    return bool(retires or nouveaux)
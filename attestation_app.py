@@ -1,56 +1,106 @@
 import streamlit as st
-import pdfplumber
 import re
+from extraction_pdf import extraire_documents
+from analyse_incrementale import pages_document, stats_pages
+import cache_pdf
+import traces
 
-def analyse_attestation_nuitees(uploaded_files):
+pattern_titre_attestation = re.compile(r"ATTESTATION DE DECOMPTE DES NUITEES POUR L'ANNEE\s+(\d{4})", re.IGNORECASE)
+
+# Version du parseur d'attestations : à incrémenter pour invalider les résultats en cache
+VERSION_PARSEUR_ATTESTATION = 1
+
+def analyser_pages_attestation(pages):
     """
-    Analyse les PDF d'attestation de nuitées et retourne les montants extraits.
-    NOTE : Ne contient plus de code d'affichage Streamlit.
+    Cherche la page d'attestation et son montant.
+    Retourne None si aucune page ne porte le titre, sinon {"annee", "valeur_brute", "montant"}
+    (valeur_brute / montant à None si la phrase du montant est absente ou illisible).
     """
+    for text in pages:
+        if not text:
+            continue
+
+        # 1. Identifier la page par son titre
+        match_titre = pattern_titre_attestation.search(text)
+        
+        if match_titre:
+            resultat = {"annee": match_titre.group(1), "valeur_brute": None, "montant": None}
+            
+            # 2. Chercher la phrase avec le montant
+            match_montant = re.search(r"s'élève à\s+([\d\s.,]+)\s+Euros", text, re.IGNORECASE)
+            
+            if match_montant:
+                resultat["valeur_brute"] = match_montant.group(1)
+                valeur_nettoyee_str = resultat["valeur_brute"].replace(" ", "").replace(",", ".")
+                try:
+                    resultat["montant"] = float(valeur_nettoyee_str)
+                except ValueError:
+                    pass
+            return resultat  # Page trouvée, inutile de lire les suivantes
+    return None
+
+def nouvel_etat_attestations():
+    """État d'analyse incrémentale : un enregistrement par attestation, indexé par empreinte du fichier."""
+    return {"fichiers": {}, "diagnostics": traces.nouveaux_diagnostics()}
+
+def ajouter_attestations(etat, uploaded_files):
+    """Analyse uniquement les attestations fournies et les ajoute à l'état."""
+    with traces.collecte(etat["diagnostics"]):
+        # Lecture parallèle ; les pages sans le titre sont écartées sur leur flux brut,
+        # et chaque document s'arrête à la page portant le titre de l'attestation
+        documents = extraire_documents(uploaded_files, arret=pattern_titre_attestation, filtre="ATTESTATIONDEDECOMPTEDESNUITEES")
+        for document in documents:
+            enregistrement = {"nom": document["nom"], "attestation": None, "erreur": document["erreur"],
+                              "pages": pages_document(document)}
+            if not document["erreur"]:
+                cle = cache_pdf.cle_cache(document["empreinte"], VERSION_PARSEUR_ATTESTATION)
+                attestation = cache_pdf.lire("attestation", cle)
+                if attestation is None:
+                    with traces.etape("regex", fichier=document["nom"]):
+                        attestation = analyser_pages_attestation(document["pages"]) or {}
+                    cache_pdf.ecrire("attestation", cle, attestation)
+                enregistrement["attestation"] = attestation
+            etat["fichiers"][document["empreinte"] or f"nom:{document['nom']}"] = enregistrement
+    return etat
+
+def retirer_attestations(etat, empreintes):
+    """Retire de l'état les attestations dont l'empreinte est fournie."""
+    for empreinte in empreintes:
+        enregistrement = etat["fichiers"].pop(empreinte, None)
+        if enregistrement:
+            traces.oublier_fichiers(etat["diagnostics"], [enregistrement["nom"]])
+    return etat
+
+def synthese_attestations(etat):
+    """Montants par année à partir des attestations déjà analysées (sans relire de PDF)."""
     resultats_annuels = {}  # { "année": montant }
     fichiers_sans_attestation = []
     erreurs = []
 
-    for fichier in uploaded_files:
-        try:
-            with pdfplumber.open(fichier) as pdf:
-                page_trouvee = False
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if not text:
-                        continue
-
-                    # 1. Identifier la page par son titre
-                    match_titre = re.search(r"ATTESTATION DE DECOMPTE DES NUITEES POUR L'ANNEE\s+(\d{4})", text, re.IGNORECASE)
-                    
-                    if match_titre:
-                        annee_attestation = match_titre.group(1)
-                        page_trouvee = True
-                        
-                        # 2. Chercher la phrase avec le montant
-                        match_montant = re.search(r"s'élève à\s+([\d\s.,]+)\s+Euros", text, re.IGNORECASE)
-                        
-                        if match_montant:
-                            valeur_extraite_str = match_montant.group(1)
-                            valeur_nettoyee_str = valeur_extraite_str.replace(" ", "").replace(",", ".")
-                            try:
-                                montant_total = float(valeur_nettoyee_str)
-                                resultats_annuels[annee_attestation] = montant_total
-                            except ValueError:
-                                erreurs.append(f"Fichier {fichier.name} ({annee_attestation}): valeur '{valeur_extraite_str}' non convertible.")
-                        else:
-                            erreurs.append(f"Fichier {fichier.name} ({annee_attestation}): page trouvée mais montant manquant.")
-                        
-                        break  # Page trouvée, passer au fichier suivant
-                
-                if not page_trouvee:
-                    fichiers_sans_attestation.append(fichier.name)
-
-        except Exception as e:
-            erreurs.append(f"Erreur de lecture du fichier {fichier.name} : {e}")
+    for enregistrement in etat["fichiers"].values():
+        nom, attestation = enregistrement["nom"], enregistrement["attestation"]
+        if enregistrement["erreur"]:
+            erreurs.append(f"Erreur de lecture du fichier {nom} : {enregistrement['erreur']}")
+        elif not attestation:
+            fichiers_sans_attestation.append(nom)
+        elif attestation["montant"] is not None:
+            resultats_annuels[attestation["annee"]] = attestation["montant"]
+        elif attestation["valeur_brute"] is not None:
+            erreurs.append(f"Fichier {nom} ({attestation['annee']}): valeur '{attestation['valeur_brute']}' non convertible.")
+        else:
+            erreurs.append(f"Fichier {nom} ({attestation['annee']}): page trouvée mais montant manquant.")
 
     return {
         "resultats": resultats_annuels,
         "erreurs": erreurs,
-        "fichiers_sans_attestation": fichiers_sans_attestation
+        "fichiers_sans_attestation": fichiers_sans_attestation,
+        "stats_pages": stats_pages(etat),
+        "diagnostics": traces.resume(etat["diagnostics"])
     }
+
+def analyse_attestation_nuitees(uploaded_files):
+    """
+    Analyse les PDF d'attestation de nuitées et retourne les montants extraits.
+    NOTE : Ne contient plus de code d'affichage Streamlit.
+    """
+    return synthese_attestations(ajouter_attestations(nouvel_etat_attestations(), uploaded_files))
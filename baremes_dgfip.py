@@ -0,0 +1,274 @@
+import os
+import csv
+import sqlite3
+from pathlib import Path
+from datetime import date, datetime
+
+# Barèmes DGFiP de toutes les années dans une seule base SQLite, indexée par (code pays, date de validité).
+# dgfip_data.py l'alimente, ep5_app.py la lit ; les fichiers dgfip_indemnites_AAAA.csv en sont un export
+# et servent à l'amorcer pour une année qui n'y figure pas encore.
+# BASE_CONFIGUREE : chemin imposé par l'environnement, utilisé tel quel par le lecteur et par dgfip_data.py.
+BASE_CONFIGUREE = os.environ.get("IMPOT_CALC_BAREMES")
+CHEMIN_BASE = BASE_CONFIGUREE or "dgfip_baremes.sqlite"
+
+# Version du schéma : une base d'une autre version est reconstruite par le premier écrivain
+# (import d'un CSV ou dgfip_data.py) ; les lecteurs la tiennent pour indisponible d'ici là.
+VERSION_SCHEMA = 1
+
+# Marge (s) de comparaison entre la date d'un CSV et la mise à jour de l'année (enregistrée à la seconde)
+TOLERANCE_MISE_A_JOUR_S = 1.0
+
+# Les colonnes de montants et de taux n'ont pas de type : chaque valeur est restituée telle qu'écrite
+# (float, entier ou texte comme "Erreur Calc."), ce qui rend l'export CSV identique à l'écriture directe.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS annees (
+    annee INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    source TEXT,
+    mis_a_jour TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS baremes (
+    annee INTEGER NOT NULL,
+    rang INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    nom TEXT,
+    date_validite TEXT NOT NULL,
+    ordinal INTEGER,
+    montant,
+    devise TEXT,
+    taux_debut,
+    taux_fin,
+    taux_moyen,
+    montant_eur,
+    PRIMARY KEY (annee, rang)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_baremes_code_date ON baremes (code, ordinal);
+CREATE INDEX IF NOT EXISTS idx_baremes_annee_code_date ON baremes (annee, code, ordinal);
+"""
+
+# Colonnes d'une ligne de barème, dans l'ordre du CSV
+COLONNES = ("code", "nom", "date_validite", "montant", "devise", "taux_debut", "taux_fin", "taux_moyen", "montant_eur")
+
+
+def entetes_csv(annee_str):
+    return [
+        "Code Pays", "Nom Pays", "Date Validité Barème", "Montant Barème", "Devise Barème",
+        "Taux (EUR par Devise) Début " + annee_str,
+        "Taux (EUR par Devise) Fin " + annee_str,
+        "Taux (EUR par Devise) Moyen " + annee_str,
+        "Montant Barème (EUR)"
+    ]
+
+
+def nom_csv(annee_str):
+    return f"dgfip_indemnites_{annee_str}.csv"
+
+
+def _ordinal(date_validite):
+    try:
+        annee, mois, jour = str(date_validite).rsplit("-", 2)
+        return date(int(annee), int(mois), int(jour)).toordinal()
+    except ValueError:
+        return None
+
+
+def connexion(chemin=None, ecriture=False):
+    """
+    Connexion à la base. En écriture, la base est créée si besoin et reconstruite si son schéma est d'une
+    autre version. En lecture, elle est ouverte en lecture seule et jamais modifiée : None si elle
+    n'existe pas ou si son schéma est d'une autre version (barèmes indisponibles).
+    """
+    chemin = chemin or CHEMIN_BASE
+    if not ecriture:
+        if not os.path.exists(chemin):
+            return None
+        con = sqlite3.connect(Path(chemin).resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+        if con.execute("PRAGMA user_version").fetchone()[0] != VERSION_SCHEMA:
+            con.close()
+            return None
+        return con
+    con = sqlite3.connect(chemin, timeout=30)
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version != VERSION_SCHEMA:
+        with con:
+            con.execute("DROP TABLE IF EXISTS baremes")
+            con.execute("DROP TABLE IF EXISTS annees")
+            con.executescript(_SCHEMA)
+            con.execute(f"PRAGMA user_version = {VERSION_SCHEMA}")
+    return con
+
+
+def version_compatible(chemin=None):
+    """Faux si la base existe avec un schéma d'une autre version (les lecteurs doivent alors s'en passer)."""
+    chemin = chemin or CHEMIN_BASE
+    if not os.path.exists(chemin):
+        return True
+    con = sqlite3.connect(Path(chemin).resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+    try:
+        return con.execute("PRAGMA user_version").fetchone()[0] == VERSION_SCHEMA
+    finally:
+        con.close()
+
+
+def annees_disponibles(chemin=None):
+    """{annee: révision} des années présentes dans la base."""
+    return {annee: revision for annee, (revision, _, _) in etat_annees(chemin).items()}
+
+
+def etat_annees(chemin=None):
+    """{annee: (révision, date de mise à jour en secondes epoch, source)} des années présentes dans la base."""
+    con = connexion(chemin)
+    if con is None:
+        return {}
+    try:
+        return {str(annee): (revision, datetime.fromisoformat(mis_a_jour).timestamp(), source)
+                for annee, revision, mis_a_jour, source in con.execute("SELECT annee, revision, mis_a_jour, source FROM annees")}
+    finally:
+        con.close()
+
+
+def csv_plus_recent(annee_str, chemin_csv, etat=None, chemin=None):
+    """
+    Vrai si le CSV de l'année a été déposé après la dernière écriture de cette année dans la base
+    (il faut alors le réimporter). L'export d'une année porte la date de sa mise à jour : il n'est
+    jamais plus récent que la ligne dont il provient.
+    """
+    if not os.path.exists(chemin_csv):
+        return False
+    etat = etat_annees(chemin) if etat is None else etat
+    if annee_str not in etat:
+        return True
+    return os.path.getmtime(chemin_csv) > etat[annee_str][1] + TOLERANCE_MISE_A_JOUR_S
+
+
+def ecrire_annee(annee_str, lignes, source=None, chemin=None):
+    """
+    Remplace, en une transaction, les barèmes d'une année par `lignes` (tuples dans l'ordre de COLONNES,
+    valeurs brutes : None pour une valeur absente). La révision de l'année est incrémentée.
+    """
+    con = connexion(chemin, ecriture=True)
+    try:
+        with con:
+            precedente = con.execute("SELECT revision FROM annees WHERE annee = ?", (int(annee_str),)).fetchone()
+            con.execute("DELETE FROM baremes WHERE annee = ?", (int(annee_str),))
+            con.executemany(
+                "INSERT INTO baremes (annee, rang, code, nom, date_validite, ordinal, montant, devise,"
+                " taux_debut, taux_fin, taux_moyen, montant_eur) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(int(annee_str), rang, code, nom, date_validite, _ordinal(date_validite), *reste)
+                 for rang, (code, nom, date_validite, *reste) in enumerate(lignes)])
+            con.execute("INSERT OR REPLACE INTO annees (annee, revision, source, mis_a_jour) VALUES (?, ?, ?, ?)",
+                        (int(annee_str), (precedente[0] + 1) if precedente else 1, source,
+                         datetime.now().isoformat(timespec="seconds")))
+    finally:
+        con.close()
+
+
+def _valeur_csv(valeur):
+    """Valeur lue dans un CSV exporté : "N/A" -> None, nombre -> float, sinon le texte tel quel."""
+    if valeur == "N/A":
+        return None
+    try:
+        return float(valeur)
+    except ValueError:
+        return valeur
+
+
+def _lignes_csv(chemin_csv):
+    """Lignes de barème (valeurs brutes, ordre de COLONNES) d'un fichier dgfip_indemnites_AAAA.csv."""
+    with open(chemin_csv, newline="", encoding="utf-8-sig") as f:
+        lecteur = csv.reader(f, delimiter=";")
+        next(lecteur, None)
+        return [(code, nom, date_validite, _valeur_csv(montant), devise,
+                 _valeur_csv(taux_debut), _valeur_csv(taux_fin), _valeur_csv(taux_moyen), _valeur_csv(montant_eur))
+                for code, nom, date_validite, montant, devise, taux_debut, taux_fin, taux_moyen, montant_eur
+                in (ligne for ligne in lecteur if len(ligne) >= len(COLONNES))]
+
+
+def importer_csv(annee_str, chemin_csv, chemin=None):
+    """Charge dans la base un fichier dgfip_indemnites_AAAA.csv (généré par une version antérieure)."""
+    ecrire_annee(annee_str, _lignes_csv(chemin_csv), source=os.path.basename(chemin_csv), chemin=chemin)
+
+
+def lire_table_csv(chemin_csv):
+    """
+    Table de recherche d'une année lue directement dans son CSV, sans la base (même forme et mêmes règles
+    que lire_tables) : utilisée quand la base est d'une autre version de schéma.
+    """
+    retenus = {}
+    for code, _, date_validite, *_, montant_eur in _lignes_csv(chemin_csv):
+        ordinal = _ordinal(date_validite)
+        if ordinal is not None and isinstance(montant_eur, float) and montant_eur == montant_eur:
+            retenus.setdefault((code.strip(" ").upper(), ordinal), montant_eur)
+    table = {}
+    for (code, ordinal), montant in sorted(retenus.items()):
+        ordinaux, montants = table.setdefault(code, ([], []))
+        ordinaux.append(ordinal)
+        montants.append(montant)
+    return table
+
+
+def lire_tables(annees, chemin=None):
+    """
+    Tables de recherche de plusieurs années en une requête indexée :
+    {annee: {code: (dates de validité en ordinaux croissants, montants EUR)}}.
+    À date égale, le premier barème de l'année l'emporte ; les barèmes sans montant EUR sont ignorés.
+    """
+    tables = {str(annee): {} for annee in annees}
+    con = connexion(chemin) if tables else None
+    if con is None:
+        return tables
+    try:
+        # SQLite : avec MIN(rang), les autres colonnes sont celles de la ligne retenue
+        curseur = con.execute(
+            f"SELECT annee, UPPER(TRIM(code)), ordinal, montant_eur, MIN(rang) FROM baremes"
+            f" WHERE annee IN ({','.join('?' * len(tables))}) AND ordinal IS NOT NULL AND typeof(montant_eur) IN ('real', 'integer')"
+            f" GROUP BY annee, UPPER(TRIM(code)), ordinal ORDER BY annee, UPPER(TRIM(code)), ordinal",
+            [int(annee) for annee in tables])
+        for annee, code, ordinal, montant, _ in curseur:
+            ordinaux, montants = tables[str(annee)].setdefault(code, ([], []))
+            ordinaux.append(ordinal)
+            montants.append(montant)
+    finally:
+        con.close()
+    return tables
+
+
+def _format_taux(taux):
+    return f"{taux:.6f}" if isinstance(taux, float) else ("N/A" if taux is None else taux)
+
+
+def ecrire_csv(annee_str, lignes, chemin_csv):
+    """Écrit des lignes de barème (valeurs brutes) au format dgfip_indemnites_AAAA.csv."""
+    dossier_parent = os.path.dirname(chemin_csv)
+    if dossier_parent and not os.path.exists(dossier_parent) and dossier_parent != ".":
+        os.makedirs(dossier_parent, exist_ok=True)
+    with open(chemin_csv, 'w', newline='', encoding='utf-8-sig') as f_csv:
+        writer = csv.writer(f_csv, delimiter=';')
+        writer.writerow(entetes_csv(annee_str))
+        writer.writerows(
+            [code, nom, date_validite, "N/A" if montant is None else montant, devise,
+             _format_taux(taux_debut), _format_taux(taux_fin), _format_taux(taux_moyen),
+             "N/A" if montant_eur is None else montant_eur]
+            for code, nom, date_validite, montant, devise, taux_debut, taux_fin, taux_moyen, montant_eur in lignes)
+    return len(lignes)
+
+
+def exporter_csv(annee_str, chemin_csv, chemin=None):
+    """
+    Exporte une année de la base au format dgfip_indemnites_AAAA.csv ; retourne le nombre de lignes.
+    Le fichier prend la date de mise à jour de l'année : il n'est pas réimporté comme un CSV plus récent.
+    """
+    con = connexion(chemin)
+    if con is None:
+        raise ValueError(f"Base des barèmes absente ou d'une autre version de schéma : {chemin or CHEMIN_BASE}")
+    try:
+        lignes = con.execute(f"SELECT {', '.join(COLONNES)} FROM baremes WHERE annee = ? ORDER BY rang",
+                             (int(annee_str),)).fetchall()
+        mise_a_jour = con.execute("SELECT mis_a_jour FROM annees WHERE annee = ?", (int(annee_str),)).fetchone()
+    finally:
+        con.close()
+    nb_lignes = ecrire_csv(annee_str, lignes, chemin_csv)
+    if mise_a_jour:
+        horodatage = datetime.fromisoformat(mise_a_jour[0]).timestamp()
+        os.utime(chemin_csv, (horodatage, horodatage))
+    return nb_lignes
@@ -0,0 +1,211 @@
+"""
+Benchmark des trois analyseurs sur des corpus PDF synthétiques.
+
+    python benchmarks/bench_analyses.py --tailles 1,10,100,1000 --sortie bench.json
+    python benchmarks/bench_analyses.py --comparer ancien.json --sortie nouveau.json
+
+Chaque cas (analyseur, nombre de pages) s'exécute dans un processus neuf, cache disque désactivé :
+- temps de bout en bout de analyse_* (pool d'extraction par défaut) et pages/s ;
+- pic de mémoire résidente du processus et des workers d'extraction ;
+- décomposition séquentielle par étape : ouverture, pré-filtre, extract_text, regex,
+  tarification (EP5) et construction des DataFrame.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["IMPOT_CALC_CACHE"] = "0"
+sys.path.insert(0, RACINE)
+
+ANALYSEURS = ("paie", "ep5", "attestation")
+
+
+def _rss_max_mo(qui):
+    import resource
+    rss = resource.getrusage(qui).ru_maxrss
+    # Linux : kio ; macOS : octets
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _chrono(etapes, nom, debut):
+    etapes[nom] = etapes.get(nom, 0.0) + time.perf_counter() - debut
+
+
+def _etapes_extraction(fichiers, etapes, pages_max=None, filtre=None, arret=None):
+    """Ouverture, pré-filtre et extract_text mesurés séparément, sur un seul processus."""
+    import io
+    import pdfplumber
+    from extraction_pdf import page_pertinente
+    textes_par_fichier = []
+    for fichier in fichiers:
+        t = time.perf_counter()
+        pdf = pdfplumber.open(io.BytesIO(fichier.getvalue()))
+        pages = pdf.pages[:pages_max]
+        _chrono(etapes, "ouverture", t)
+        textes = []
+        for page in pages:
+            if filtre is not None:
+                t = time.perf_counter()
+                pertinente = page_pertinente(pdf, page, filtre)
+                _chrono(etapes, "prefiltre", t)
+                if not pertinente:
+                    textes.append(None)
+                    continue
+            t = time.perf_counter()
+            texte = page.extract_text()
+            _chrono(etapes, "extract_text", t)
+            textes.append(texte)
+            if arret is not None and texte and arret.search(texte):
+                break
+        pdf.close()
+        textes_par_fichier.append(textes)
+    return textes_par_fichier
+
+
+def _cas_paie(fichiers, etapes):
+    import paie_app
+    textes = _etapes_extraction(fichiers, etapes, pages_max=1)
+    t = time.perf_counter()
+    for pages in textes:
+        paie_app.analyser_texte_bulletin(pages[0] if pages else None, paie_app.LIBELLES_PAIE)
+    _chrono(etapes, "regex", t)
+
+    t = time.perf_counter()
+    etat = paie_app.ajouter_bulletins(paie_app.nouvel_etat_paie(), fichiers)
+    debut_synthese = time.perf_counter()
+    paie_app.synthese_bulletins(etat)
+    _chrono(etapes, "dataframe", debut_synthese)
+    return time.perf_counter() - t
+
+
+def _cas_ep5(fichiers, etapes):
+    import ep5_app
+    from extraction_pdf import nom_fichier
+    textes = _etapes_extraction(fichiers, etapes, filtre="EP5")
+    t = time.perf_counter()
+    segments_par_mois = []
+    for fichier, pages in zip(fichiers, textes):
+        mois, annee = map(int, nom_fichier(fichier)[4:11].split("-"))
+        segments_par_mois.append(((annee, mois), ep5_app.analyser_pages_ep5(pages, annee, mois, nom_fichier(fichier))))
+    _chrono(etapes, "regex", t)
+
+    t = time.perf_counter()
+    contexte = ep5_app.nouveau_contexte_missions()
+    for annee in sorted({str(m[0]) for m, _ in segments_par_mois}):
+        contexte["indemnity_data_par_annee"][annee] = ep5_app.load_indemnity_data(annee)[0]
+    for (annee, mois), segments in sorted(segments_par_mois, key=lambda ms: ms[0]):
+        ep5_app._integrer_mois(contexte, (annee, mois), segments)
+    _chrono(etapes, "tarification", t)
+
+    t = time.perf_counter()
+    contexte = ep5_app.ajouter_missions(ep5_app.nouveau_contexte_missions(), fichiers)
+    debut_synthese = time.perf_counter()
+    ep5_app.synthese_missions(contexte)
+    _chrono(etapes, "dataframe", debut_synthese)
+    return time.perf_counter() - t
+
+
+def _cas_attestation(fichiers, etapes):
+    import attestation_app
+    textes = _etapes_extraction(fichiers, etapes, filtre="ATTESTATIONDEDECOMPTEDESNUITEES",
+                                arret=attestation_app.pattern_titre_attestation)
+    t = time.perf_counter()
+    for pages in textes:
+        attestation_app.analyser_pages_attestation(pages)
+    _chrono(etapes, "regex", t)
+
+    t = time.perf_counter()
+    etat = attestation_app.ajouter_attestations(attestation_app.nouvel_etat_attestations(), fichiers)
+    debut_synthese = time.perf_counter()
+    attestation_app.synthese_attestations(etat)
+    _chrono(etapes, "dataframe", debut_synthese)
+    return time.perf_counter() - t
+
+
+def executer_cas(analyseur, nb_pages):
+    """Exécuté dans un processus dédié : le pic de mémoire mesuré est celui de ce seul cas."""
+    import resource
+    os.chdir(RACINE)
+    import pdf_synthetique
+    import extraction_pdf
+    fichiers = getattr(pdf_synthetique, f"corpus_{analyseur}")(nb_pages)
+    etapes = {}
+    duree = {"paie": _cas_paie, "ep5": _cas_ep5, "attestation": _cas_attestation}[analyseur](fichiers, etapes)
+    if extraction_pdf._pool is not None:
+        extraction_pdf._pool.shutdown(wait=True)
+    return {
+        "analyseur": analyseur,
+        "pages": nb_pages,
+        "fichiers": len(fichiers),
+        "octets": sum(len(f.getvalue()) for f in fichiers),
+        "workers": extraction_pdf.nombre_workers(),
+        "temps_s": round(duree, 4),
+        "pages_par_s": round(nb_pages / duree, 1) if duree else None,
+        "rss_max_mo": _rss_max_mo(resource.RUSAGE_SELF),
+        "rss_max_workers_mo": _rss_max_mo(resource.RUSAGE_CHILDREN),
+        "etapes_s": {nom: round(valeur, 4) for nom, valeur in etapes.items()},
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparer(ancien, nouveau):
+    """Affiche le rapport de temps nouveau/ancien pour chaque cas commun aux deux fichiers."""
+    anciens = {(r["analyseur"], r["pages"]): r for r in ancien["resultats"]}
+    print(f"\nComparaison avec {ancien.get('commit')} :")
+    for r in nouveau["resultats"]:
+        a = anciens.get((r["analyseur"], r["pages"]))
+        if a and a["temps_s"]:
+            print(f"  {r['analyseur']:<12} {r['pages']:>6} p.  {a['temps_s']:>9.3f}s -> {r['temps_s']:>9.3f}s"
+                  f"  x{r['temps_s'] / a['temps_s']:.2f}   RSS {a['rss_max_mo']} -> {r['rss_max_mo']} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tailles", default="1,10,100,1000", help="nombres de pages, séparés par des virgules")
+    parser.add_argument("--analyseurs", default=",".join(ANALYSEURS))
+    parser.add_argument("--sortie", help="fichier JSON de résultats")
+    parser.add_argument("--comparer", help="fichier JSON d'une exécution précédente")
+    args = parser.parse_args()
+
+    resultats = []
+    for analyseur in args.analyseurs.split(","):
+        for nb_pages in map(int, args.tailles.split(",")):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executeur:
+                r = executeur.submit(executer_cas, analyseur, nb_pages).result()
+            etapes = " ".join(f"{nom}={valeur:.3f}" for nom, valeur in r["etapes_s"].items())
+            print(f"{analyseur:<12} {nb_pages:>6} p.  {r['temps_s']:>9.3f}s  {r['pages_par_s']:>8} p/s  "
+                  f"RSS {r['rss_max_mo']} Mo (+{r['rss_max_workers_mo']} workers)  [{etapes}]")
+            resultats.append(r)
+
+    rapport = {
+        "commit": _commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plateforme": platform.platform(),
+        "cpu": os.cpu_count(),
+        "resultats": resultats,
+    }
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+    if args.comparer:
+        with open(args.comparer, encoding="utf-8") as f:
+            comparer(json.load(f), rapport)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark du démarrage à froid de impot_calc.py : imports réalisés par le premier rendu (écran d'accueil).
+
+    python benchmarks/bench_demarrage.py                    # rapport et contrôle du budget
+    python benchmarks/bench_demarrage.py --budget-ms 300    # budget d'imports du script (hors streamlit)
+    python benchmarks/bench_demarrage.py --top 25           # nombre d'imports détaillés
+
+Le script est rendu par le lanceur de test de streamlit (AppTest) dans un processus neuf sous
+`python -X importtime`, après l'import de streamlit (incompressible). Le benchmark échoue si les
+imports du script dépassent le budget ou si un module à chargement différé (analyseurs, pdfplumber,
+pandas) est importé.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules qui ne doivent être chargés qu'à la première utilisation d'un menu
+CHARGEMENT_DIFFERE = ("paie_app", "ep5_app", "attestation_app", "extraction_pdf", "pdfplumber", "pdfminer", "pandas")
+
+_ENFANT = """
+import sys, time, json
+from streamlit.testing.v1 import AppTest
+print("--- impot_calc ---", file=sys.stderr, flush=True)
+debut = time.perf_counter()
+rendu = AppTest.from_file("impot_calc.py", default_timeout=120).run()
+print(json.dumps({"duree_s": time.perf_counter() - debut, "exceptions": [e.value for e in rendu.exception],
+                  "differes": sorted(m for m in %r if m in sys.modules)}))
+""" % (CHARGEMENT_DIFFERE,)
+
+
+def lire_importtime(sortie_erreur):
+    """Imports de premier niveau réalisés après le repère, [(module, cumul en µs)], du plus coûteux au moins coûteux."""
+    imports, apres_repere = [], False
+    for ligne in sortie_erreur.splitlines():
+        if ligne.startswith("--- impot_calc ---"):
+            apres_repere = True
+            continue
+        if not apres_repere or not ligne.startswith("import time:") or "|" not in ligne:
+            continue
+        _, cumul, nom = ligne.split("|", 2)
+        # Premier niveau : un seul espace avant le nom (les imports imbriqués sont indentés)
+        if cumul.strip().isdigit() and not nom.startswith("  "):
+            imports.append((nom.strip(), int(cumul)))
+    return sorted(imports, key=lambda i: i[1], reverse=True)
+
+
+def mesurer_demarrage():
+    env = dict(os.environ, IMPOT_CALC_PRECHAUFFAGE="0")
+    processus = subprocess.run([sys.executable, "-X", "importtime", "-c", _ENFANT], cwd=RACINE, env=env,
+                               capture_output=True, text=True)
+    if processus.returncode != 0:
+        sys.exit(f"Échec de l'exécution de impot_calc.py :\n{processus.stderr[-2000:]}")
+    resultat = json.loads(processus.stdout.strip().splitlines()[-1])
+    resultat["imports"] = lire_importtime(processus.stderr)
+    return resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="durée maximale des imports du script (ms)")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    resultat = mesurer_demarrage()
+    total_ms = sum(cumul for _, cumul in resultat["imports"]) / 1000
+    print(f"Premier rendu de impot_calc.py : {resultat['duree_s'] * 1000:.1f} ms, dont imports {total_ms:.1f} ms "
+          f"({len(resultat['imports'])} modules de premier niveau, hors streamlit)")
+    for nom, cumul in resultat["imports"][:args.top]:
+        print(f"  {cumul / 1000:>9.1f} ms  {nom}")
+    erreurs = [f"exception au rendu : {e}" for e in resultat["exceptions"]]
+    if resultat["differes"]:
+        erreurs.append(f"modules à chargement différé importés au démarrage : {', '.join(resultat['differes'])}")
+    if total_ms > args.budget_ms:
+        erreurs.append(f"imports du script {total_ms:.1f} ms > budget {args.budget_ms:.0f} ms")
+    if erreurs:
+        sys.exit("ÉCHEC : " + " ; ".join(erreurs))
+    print(f"OK : budget de {args.budget_ms:.0f} ms respecté, aucun analyseur chargé.")
+
+
+if __name__ == "__main__":
+    main()
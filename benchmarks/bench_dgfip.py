@@ -0,0 +1,140 @@
+"""
+Benchmark de la lecture de Webmiss et Webtaux : parseur en colonnes de dgfip_data
+face à la lecture ligne à ligne qu'il remplace (conservée ici comme référence).
+
+    python benchmarks/bench_dgfip.py                      # fichiers DGFiP complets (copie locale, sinon téléchargés)
+    python benchmarks/bench_dgfip.py --dossier DOSSIER    # Webmiss / Webtaux déjà présents dans DOSSIER
+    python benchmarks/bench_dgfip.py --synthetique 200000 # fichiers générés de N lignes
+
+Les deux lectures doivent produire exactement le même historique : le benchmark échoue sinon.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+import dgfip_data
+import telechargement_dgfip
+
+
+def lire_webmiss_lignes(contenu_webmiss):
+    """Lecture ligne à ligne de référence (split, strptime et formater_montant_webmiss par ligne)."""
+    historique = {}
+    for num_ligne, ligne in enumerate(contenu_webmiss.splitlines()):
+        parts = ligne.strip().split('\t')
+        if len(parts) < 5:
+            continue
+        code = parts[0].strip(); date_str = parts[1].strip(); devise = parts[2].strip().upper(); montant = parts[4].strip()
+        if not code or not date_str or not devise or not montant:
+            continue
+        code = dgfip_data.MAPPING_CODES_DGFiP_VERS_STOCKAGE.get(code, code)
+        try:
+            date_obj = datetime.strptime(date_str, "%d/%m/%Y").date()
+        except ValueError:
+            continue
+        entree = historique.setdefault(code, {"a": [], "lignes": {}})
+        entree["a"].append([date_obj.strftime("%Y-%m-%d"), devise, dgfip_data.formater_montant_webmiss(montant)])
+        entree["lignes"].setdefault(date_obj.year, num_ligne)
+    for entree in historique.values():
+        entree["a"] = dgfip_data._dedoublonner_baremes(entree["a"])
+    return historique
+
+
+def lire_webtaux_lignes(contenu_webtaux):
+    """Lecture ligne à ligne de référence (split, strptime et formater_taux_webtaux par ligne)."""
+    taux_data = {}
+    for ligne in contenu_webtaux.splitlines():
+        parts = ligne.strip().split('\t')
+        if len(parts) < 3:
+            continue
+        devise = parts[0].strip().upper(); date_str = parts[1].strip(); valeur = parts[2].strip()
+        if not devise or not date_str or not valeur or devise == "ZWR":
+            continue
+        try:
+            date_iso = datetime.strptime(date_str, "%d/%m/%Y").date().strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+        taux = dgfip_data.formater_taux_webtaux(valeur)
+        if taux is not None:
+            taux_data.setdefault(devise, []).append([date_iso, taux])
+    for liste_taux in taux_data.values():
+        liste_taux.sort(key=lambda x: x[0], reverse=True)
+    return taux_data
+
+
+def fichiers_synthetiques(nb_lignes, graine=0):
+    """Webmiss et Webtaux de nb_lignes lignes, au format DGFiP, avec doublons et quelques lignes invalides."""
+    alea = random.Random(graine)
+    codes = [f"{a}{b}" for a in "ABCDEFGHIJ" for b in "KLMNOPQRST"]
+    devises = ["EUR", "USD", "CAD", "JPY", "GBP", "CHF", "XOF", "BRL", "CNY", "INR"]
+
+    def date():
+        return f"{alea.randint(1, 31):02d}/{alea.randint(1, 12):02d}/{alea.randint(1990, 2035)}"
+
+    webmiss = [f"{alea.choice(codes)}\t{date()}\t{alea.choice(devises)}\tG1\t{alea.randint(100000, 9999999)}"
+               for _ in range(nb_lignes)]
+    webtaux = [f"{alea.choice(devises)}\t{date()}\t{alea.randint(1, 99999999):08d}" for _ in range(nb_lignes)]
+    for lignes in (webmiss, webtaux):
+        lignes.extend(alea.sample(lignes, nb_lignes // 20))
+        lignes.extend(["", "ligne invalide", "XX\t31/02/2024\tEUR\tG1\t1000000"])
+        alea.shuffle(lignes)
+    return "\n".join(webmiss), "\n".join(webtaux)
+
+
+def fichiers_dgfip(dossier):
+    """Contenu de Webmiss et Webtaux : depuis `dossier`, sinon depuis les copies locales (téléchargées si besoin)."""
+    if dossier:
+        contenus = []
+        for nom in ("Webmiss", "Webtaux"):
+            with open(os.path.join(dossier, nom), "rb") as f:
+                contenus.append(telechargement_dgfip.decoder(f.read(), nom))
+        return tuple(contenus)
+    sources = telechargement_dgfip.telecharger_sources({"Webmiss": dgfip_data.WEBMISS_URL, "Webtaux": dgfip_data.WEBTAUX_URL})
+    if sources["Webmiss"] is None or sources["Webtaux"] is None:
+        sys.exit("Fichiers DGFiP indisponibles : utiliser --dossier ou --synthetique.")
+    return sources["Webmiss"], sources["Webtaux"]
+
+
+def mesurer(fonction, contenu, repetitions):
+    meilleur, resultat = None, None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction(contenu)
+        duree = time.perf_counter() - debut
+        meilleur = duree if meilleur is None else min(meilleur, duree)
+    return meilleur, resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dossier", help="dossier contenant Webmiss et Webtaux")
+    parser.add_argument("--synthetique", type=int, help="nombre de lignes des fichiers générés")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    webmiss, webtaux = fichiers_synthetiques(args.synthetique) if args.synthetique else fichiers_dgfip(args.dossier)
+    cas = (("Webmiss", webmiss, lire_webmiss_lignes, dgfip_data.lire_webmiss),
+           ("Webtaux", webtaux, lire_webtaux_lignes, dgfip_data.lire_webtaux))
+    for nom, contenu, reference, colonnes in cas:
+        # Les messages de progression de dgfip_data ne font pas partie de la mesure
+        sortie, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            t_reference, attendu = mesurer(reference, contenu, args.repetitions)
+            t_colonnes, obtenu = mesurer(colonnes, contenu, args.repetitions)
+        finally:
+            sys.stdout.close()
+            sys.stdout = sortie
+        identique = attendu == obtenu
+        print(f"{nom:<8} {len(contenu.splitlines()):>8} lignes  ligne à ligne {t_reference:>8.3f}s  "
+              f"colonnes {t_colonnes:>8.3f}s  x{t_reference / t_colonnes:.1f}  {'identique' if identique else 'DIFFÉRENT'}")
+        if not identique:
+            sys.exit(f"{nom} : la lecture en colonnes ne donne pas le même historique que la lecture ligne à ligne.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark du découpage des lignes de vol EP5 : ep5_app.decouper_page_ep5 (un parcours par page)
+face à pattern_ep5_line appliqué à chaque ligne (ancienne lecture, conservée ici comme référence).
+
+    python benchmarks/bench_ep5_lignes.py                       # 2 000 pages synthétiques
+    python benchmarks/bench_ep5_lignes.py --pages 20000 --repetitions 5
+    python benchmarks/bench_ep5_lignes.py --variantes 500000    # test différentiel élargi
+
+Test différentiel : les pages synthétiques et des pages de lignes altérées (séparateurs collés ou
+doublés, blancs inhabituels, minuscules, chiffres non ASCII, colonnes manquantes, heures hors
+format...) doivent donner exactement les mêmes colonnes par les deux lectures ; le benchmark
+échoue sinon.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ep5_app
+from pdf_synthetique import AVIONS, ESCALES
+
+ENTETES = ["RELEVE EP5 - ACTIVITE PERSONNEL NAVIGANT", "No Type Immat Vol Dep J|H Arr J|H", "TOTAL HEURES DE VOL",
+           "Page 1 / 3", "EDITE LE 01/02/2025 A 06:12", "SOL REPOS 12/01", "RESERVE 14/01 | 06.00 | 18.00", ""]
+
+
+def decouper_page_regex(texte_page):
+    """Lecture de référence : pattern_ep5_line sur chaque ligne."""
+    return [match.groups() for ligne in texte_page.split("\n")
+            if (match := ep5_app.pattern_ep5_line.search(ligne.strip()))]
+
+
+def ligne_vol(alea, numero):
+    type_avion, immat = alea.choice(AVIONS)
+    depart, arrivee = alea.sample(["CDG", "ORY"] + ESCALES, 2)
+    jour = alea.randint(1, 31)
+    return (f"{numero} {type_avion} {immat} AF{alea.randint(1, 9999):04d} {depart} {jour} | {alea.randint(0, 23)}.{alea.randint(0, 99):02d} "
+            f"{arrivee} {min(31, jour + alea.randint(0, 1))} | {alea.randint(0, 23)}.{alea.randint(0, 99):02d}")
+
+
+def pages_synthetiques(nb_pages, graine=0):
+    """Pages de relevé : en-têtes, lignes de vol et lignes d'activité au sol, dans les proportions d'un EP5."""
+    alea = random.Random(graine)
+    pages = []
+    for _ in range(nb_pages):
+        lignes = ENTETES[:2] + [ligne_vol(alea, numero) for numero in range(1, alea.randint(10, 30))]
+        lignes += [alea.choice(ENTETES[2:]) for _ in range(alea.randint(10, 25))]
+        alea.shuffle(lignes)
+        pages.append("\n".join(lignes))
+    return pages
+
+
+def _alterer(alea, ligne):
+    """Variante d'une ligne, proche de la forme d'une ligne de vol (cas ambigus du chemin rapide)."""
+    alterations = [
+        lambda l: l.replace(" | ", "|"), lambda l: l.replace(" | ", " |"), lambda l: l.replace(" | ", "| "),
+        lambda l: l.replace(" | ", " || "), lambda l: l.replace(" ", "  "), lambda l: l.replace(" ", "\t"),
+        lambda l: l.replace(" ", " "), lambda l: l.lower(), lambda l: "  " + l + "  ", lambda l: l + " EXTRA 12",
+        lambda l: l.replace(".", ""), lambda l: l.replace(".", "..", 1), lambda l: l.replace("1", "١"),
+        lambda l: l.replace("2", "²"), lambda l: l.replace("CDG", "CD"), lambda l: l.replace("CDG", "CDGX"),
+        lambda l: l.replace("AF", "A-F"), lambda l: l.replace("AF", "A|F"), lambda l: l.replace("A3", "a3"),
+        lambda l: l + "|", lambda l: l + "7.5", lambda l: l.rstrip("0123456789"), lambda l: l[:alea.randint(0, len(l))],
+        lambda l: "X" + l, lambda l: "|" + l, lambda l: l.replace(" ", "", 1),
+        lambda l: " ".join(l.split()[:alea.randint(1, 12)]),
+        lambda l: l.replace(".", str(alea.randint(100, 99999)), 1),
+        lambda l: l.replace(" | ", f" | {alea.randint(0, 99999)}", 1),
+        lambda l: l.replace(" | ", f"{alea.choice('0123456789')} | ", 1),
+    ]
+    for _ in range(alea.randint(1, 3)):
+        ligne = alea.choice(alterations)(ligne)
+    return ligne
+
+
+def pages_variantes(nb_lignes, graine=1, lignes_par_page=30):
+    """Pages de lignes de vol altérées (une sur cinq laissée intacte), entre des lignes d'en-tête."""
+    alea = random.Random(graine)
+    lignes = [ligne_vol(alea, alea.randint(1, 999)) for _ in range(nb_lignes)]
+    lignes = [ligne if alea.random() < 0.2 else _alterer(alea, ligne) for ligne in lignes]
+    lignes += [alea.choice(ENTETES) for _ in range(nb_lignes // 10)]
+    alea.shuffle(lignes)
+    return ["\n".join(lignes[i:i + lignes_par_page]) for i in range(0, len(lignes), lignes_par_page)]
+
+
+def verifier(pages):
+    """Pages pour lesquelles les deux lectures diffèrent."""
+    return [(page, decouper_page_regex(page), ep5_app.decouper_page_ep5(page))
+            for page in pages if decouper_page_regex(page) != ep5_app.decouper_page_ep5(page)]
+
+
+def mesurer(decouper, pages, repetitions):
+    meilleur = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        for page in pages:
+            decouper(page)
+        duree = time.perf_counter() - debut
+        meilleur = duree if meilleur is None else min(meilleur, duree)
+    return meilleur
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--variantes", type=int, default=50000, help="lignes altérées du test différentiel")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = pages_synthetiques(args.pages)
+    alterees = pages_variantes(args.variantes)
+    ecarts = verifier(pages + alterees)
+    nb_vols = sum(len(decouper_page_regex(page)) for page in pages)
+    nb_variantes_vols = sum(len(decouper_page_regex(page)) for page in alterees)
+    print(f"Test différentiel : {len(pages)} pages ({nb_vols} vols) et {len(alterees)} pages altérées "
+          f"({args.variantes} lignes de vol, {nb_variantes_vols} reconnues) : {len(ecarts)} écart(s)")
+    for page, attendu, obtenu in ecarts[:5]:
+        print(f"  {page!r}\n    par ligne {attendu}\n    par page  {obtenu}")
+    if ecarts:
+        sys.exit("decouper_page_ep5 ne découpe pas les lignes comme pattern_ep5_line.")
+
+    nb_lignes = sum(page.count("\n") + 1 for page in pages)
+    t_ligne = mesurer(decouper_page_regex, pages, args.repetitions)
+    t_page = mesurer(ep5_app.decouper_page_ep5, pages, args.repetitions)
+    print(f"{len(pages)} pages, {nb_lignes} lignes : par ligne {t_ligne:.3f}s  par page {t_page:.3f}s  "
+          f"x{t_ligne / t_page:.2f}  ({t_page / nb_lignes * 1e9:.0f} ns/ligne)")
+    debut = time.perf_counter()
+    for page in pages:
+        for _ in ep5_app.iterer_segments_ep5(page, 2025, 1, "EP5_01-2025.pdf"):
+            pass
+    print(f"iterer_segments_ep5 : {len(pages)} pages en {time.perf_counter() - debut:.3f}s")
+
+if __name__ == "__main__":
+    main()
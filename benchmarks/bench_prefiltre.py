@@ -0,0 +1,92 @@
+"""
+Benchmark du pré-filtre des pages EP5 : extraction sans pré-filtre, avec pré-filtre systématique sur le
+flux brut, et avec le pré-filtre adaptatif d'extraction_pdf (suspendu après une longue série de pages pertinentes).
+
+    python benchmarks/bench_prefiltre.py                            # 200 pages par corpus
+    python benchmarks/bench_prefiltre.py --pages 400 --parts 1,0.99,0.5,0.1 --repetitions 5
+
+Chaque corpus contient une part donnée de pages de relevé EP5, les autres pages étant des récapitulatifs
+de même volume sans le marqueur. L'extraction est séquentielle (un processus) ; les trois variantes sont
+alternées à chaque répétition et la meilleure durée de chacune est retenue. Le benchmark échoue si le
+pré-filtre adaptatif ne donne pas les mêmes textes que le pré-filtre systématique.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import extraction_pdf
+from pdf_synthetique import ecrire_pdf, _lignes_rotation, LIGNES_PAR_PAGE
+
+PAGES_PAR_FICHIER = 20
+
+
+def corpus(nb_pages, part_pertinente, graine=0):
+    """PDF (octets) de PAGES_PAR_FICHIER pages, dont `part_pertinente` de pages de relevé, réparties au hasard."""
+    alea = random.Random(graine)
+    pertinentes = set(alea.sample(range(nb_pages), round(nb_pages * part_pertinente)))
+    pages = []
+    for i in range(nb_pages):
+        if i in pertinentes:
+            lignes = ["RELEVE EP5 - ACTIVITE PERSONNEL NAVIGANT"]
+            for jour in range(1, (LIGNES_PAR_PAGE - 1) // 2 + 1):
+                lignes += _lignes_rotation(alea, 2 * jour - 1, 2 * jour, jour)
+        else:
+            lignes = ["RECAPITULATIF DES HEURES"] + [f"SOL {alea.choice(['REPOS', 'RESERVE', 'FORMATION'])} {alea.randint(1, 28)}/01"
+                                                    f" | {alea.randint(0, 23)}.{alea.randint(0, 99):02d}" for _ in range(LIGNES_PAR_PAGE - 1)]
+        pages.append(lignes)
+    return [ecrire_pdf(pages[i:i + PAGES_PAR_FICHIER]) for i in range(0, nb_pages, PAGES_PAR_FICHIER)]
+
+
+def extraire(fichiers, filtre, suspension):
+    """(textes de toutes les pages, pages extraites, pages ignorées, durée) ; suspension : PAGES_AVANT_SUSPENSION appliqué."""
+    extraction_pdf.PAGES_AVANT_SUSPENSION = suspension
+    extraction_pdf._series_avec_marqueur.clear()
+    textes, extraites, ignorees = [], 0, 0
+    debut = time.perf_counter()
+    for contenu in fichiers:
+        pages, erreur, stats = extraction_pdf._extraire_pages(contenu, filtre=filtre)
+        if erreur:
+            sys.exit(erreur)
+        textes += pages
+        extraites += stats["pages_extraites"]
+        ignorees += stats["pages_ignorees"]
+    return textes, extraites, ignorees, time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--parts", default="1,0.9,0.25", help="parts de pages de relevé EP5 des corpus")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    suspension = extraction_pdf.PAGES_AVANT_SUSPENSION
+    variantes = {"sans": (None, suspension), "systematique": ("EP5", float("inf")), "adaptatif": ("EP5", suspension)}
+    for part in (float(p) for p in args.parts.split(",")):
+        fichiers = corpus(args.pages, part)
+        resultats = {}
+        for _ in range(args.repetitions):
+            for nom, (filtre, pages_suspension) in variantes.items():
+                resultat = extraire(fichiers, filtre, pages_suspension)
+                if nom not in resultats or resultat[3] < resultats[nom][3]:
+                    resultats[nom] = resultat
+        *_, sans = resultats["sans"]
+        textes_systematique, _, ignorees_systematique, systematique = resultats["systematique"]
+        textes_adaptatif, extraites, ignorees, adaptatif = resultats["adaptatif"]
+        print(f"{part:>5.0%} de pages EP5, {args.pages} pages : sans pré-filtre {sans:.2f}s  "
+              f"systématique {systematique:.2f}s ({ignorees_systematique} ignorées)  "
+              f"adaptatif {adaptatif:.2f}s ({extraites} extraites, {ignorees} ignorées)  "
+              f"adaptatif / sans {adaptatif / sans:.3f}  adaptatif / systématique {adaptatif / systematique:.3f}")
+        if textes_adaptatif != textes_systematique:
+            sys.exit("Le pré-filtre adaptatif ne donne pas les mêmes textes que le pré-filtre systématique.")
+    print("OK : textes identiques.")
+
+
+if __name__ == "__main__":
+    main()
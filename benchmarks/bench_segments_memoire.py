@@ -0,0 +1,153 @@
+"""
+Benchmark mémoire des segments et rotations EP5 : enregistrements ep5_app.Segment / Rotation
+face à l'ancienne disposition (un dictionnaire par segment, rotations en listes de ces dictionnaires),
+reconstituée ici à partir des mêmes colonnes.
+
+    python benchmarks/bench_segments_memoire.py                    # 100 000 segments
+    python benchmarks/bench_segments_memoire.py --segments 500000 --repetitions 5
+
+Mesure (tracemalloc) la mémoire allouée par les segments d'une archive multi-années et par leurs
+rotations, ramenée à 100 000 segments, ainsi que la durée de construction et d'un parcours complet.
+Les durées de construction des deux dispositions sont mesurées avant d'en conserver aucune : des
+segments encore en vie alourdissent chaque passage du ramasse-miettes et pénaliseraient la seconde.
+Le benchmark échoue si les deux dispositions ne donnent pas les mêmes rotations.
+"""
+import os
+import sys
+import time
+import gc
+import random
+import argparse
+import tracemalloc
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ep5_app
+from pdf_synthetique import _lignes_rotation
+
+
+def pages_archive(nb_segments, graine=0):
+    """Relevés mensuels consécutifs depuis janvier 2000 : une rotation CDG -> escale -> CDG par jour."""
+    alea = random.Random(graine)
+    pages, annee, mois, restantes = [], 2000, 1, (nb_segments + 1) // 2
+    while restantes > 0:
+        nb_rotations = min(28, restantes)
+        lignes = ["RELEVE EP5 - ACTIVITE PERSONNEL NAVIGANT"]
+        for jour in range(1, nb_rotations + 1):
+            lignes += _lignes_rotation(alea, 2 * jour - 1, 2 * jour, jour)
+        pages.append(("\n".join(lignes), annee, mois))
+        restantes -= nb_rotations
+        annee, mois = (annee + 1, 1) if mois == 12 else (annee, mois + 1)
+    return pages
+
+
+def segments_dictionnaires(texte, annee, mois, nom_fichier):
+    """Ancienne disposition : un dictionnaire par segment, complété de l'année du PDF."""
+    segments = []
+    for avion_type, avion_immat, vol, dep_airport, jour_dep, heure_dep, arr_airport, jour_arr, heure_arr in ep5_app.decouper_page_ep5(texte):
+        date_dep = ep5_app.calculer_date_segment(jour_dep, annee, mois)
+        date_arr = ep5_app.calculer_date_segment(jour_arr, annee, mois, date_depart_ref=date_dep)
+        segments.append({
+            'avion_type': avion_type, 'avion_immat': avion_immat, 'vol': vol,
+            'dep_airport': dep_airport, 'dep_date': date_dep,
+            'arr_airport': arr_airport, 'arr_date': date_arr,
+            'dep_dt': ep5_app.calculer_horodatage(date_dep, heure_dep),
+            'arr_dt': ep5_app.calculer_horodatage(date_arr, heure_arr),
+            'nom_fichier': nom_fichier
+        })
+    segments.sort(key=lambda s: s['dep_dt'])
+    for seg in segments:
+        seg["Année_PDF"] = str(annee)
+    return segments
+
+
+def rotations_dictionnaires(segments):
+    rotations, en_cours = [], []
+    for seg in segments:
+        en_cours.append(seg)
+        if seg['arr_airport'] in ep5_app.BASES_FR:
+            if en_cours[0]['dep_airport'] in ep5_app.BASES_FR:
+                rotations.append(list(en_cours))
+            del en_cours[:]
+    return rotations
+
+
+def construire_dictionnaires(pages):
+    segments = []
+    for texte, annee, mois in pages:
+        segments.extend(segments_dictionnaires(texte, annee, mois, f"EP5_{mois:02d}-{annee}.pdf"))
+    return segments, rotations_dictionnaires(segments)
+
+
+def construire_enregistrements(pages):
+    segments = []
+    for texte, annee, mois in pages:
+        segments.extend(ep5_app.analyser_pages_ep5([texte], annee, mois, f"EP5_{mois:02d}-{annee}.pdf"))
+    return segments, list(ep5_app.iterer_rotations(segments))
+
+
+def chronometrer(construire, pages, repetitions):
+    """Meilleure durée de construction, hors tracemalloc, chaque résultat étant libéré avant la suivante."""
+    meilleure = None
+    for _ in range(repetitions):
+        gc.collect()
+        debut = time.perf_counter()
+        construire(pages)
+        duree = time.perf_counter() - debut
+        meilleure = duree if meilleure is None else min(meilleure, duree)
+    return meilleure
+
+
+def mesurer(construire, pages):
+    """(segments, rotations, octets alloués)."""
+    gc.collect()
+    tracemalloc.start()
+    segments, rotations = construire(pages)
+    octets = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return segments, rotations, octets
+
+
+def parcourir(rotations, lire):
+    """Parcours complet : temps de vol et itinéraire de chaque rotation."""
+    debut = time.perf_counter()
+    for rot in rotations:
+        sum((lire(seg, "arr_dt") - lire(seg, "dep_dt")).total_seconds() for seg in rot)
+        [lire(rot[0], "dep_airport")] + [lire(seg, "arr_airport") for seg in rot]
+    return time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=100000)
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = pages_archive(args.segments)
+    dispositions = (("dictionnaires", construire_dictionnaires, lambda seg, cle: seg[cle]),
+                    ("Segment/Rotation", construire_enregistrements, getattr))
+    durees = {nom: chronometrer(construire, pages, args.repetitions) for nom, construire, _ in dispositions}
+    resultats = {}
+    for nom, construire, lire in dispositions:
+        segments, rotations, octets = mesurer(construire, pages)
+        duree = durees[nom]
+        resultats[nom] = (segments, rotations)
+        par_100k = octets * 100000 / len(segments)
+        print(f"{nom:<17} {len(segments):>8} segments  {len(rotations):>7} rotations  "
+              f"{par_100k / 1024 ** 2:>7.1f} Mo / 100k segments  construction {duree:.3f}s  "
+              f"parcours {parcourir(rotations, lire):.3f}s")
+        del segments, rotations
+
+    (_, rot_dict), (_, rot_enr) = resultats["dictionnaires"], resultats["Segment/Rotation"]
+    identiques = len(rot_dict) == len(rot_enr) and all(
+        [(s['vol'], s['dep_dt'], s['arr_dt'], s['Année_PDF']) for s in a] == [(s.vol, s.dep_dt, s.arr_dt, s.annee_pdf) for s in b]
+        for a, b in zip(rot_dict, rot_enr))
+    if not identiques:
+        sys.exit("Les deux dispositions ne donnent pas les mêmes rotations.")
+    print("OK : rotations identiques.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Génération de PDF synthétiques pour les benchmarks, sans dépendance externe.
+Les mises en page reprennent ce qu'attendent les analyseurs : lignes « IR EXONEREES »
+des bulletins, lignes de vol de pattern_ep5_line, titre des attestations de nuitées.
+"""
+import io
+import random
+import calendar
+
+HAUTEUR_PAGE = 842
+INTERLIGNE = 14
+LIGNES_PAR_PAGE = 52
+
+# Escales présentes à la fois dans airport-codes.csv et dans les barèmes DGFiP
+ESCALES = ["JFK", "NRT", "YUL", "LOS", "YYZ", "EWR", "BCN", "DXB", "GRU", "PEK", "SIN", "JNB"]
+AVIONS = [("A350-900", "FHTYA"), ("B777-300", "FGSQA"), ("B787-9", "FHRBA"), ("A330-200", "FGZCA")]
+
+
+def _echapper(ligne):
+    return ligne.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("cp1252", "replace")
+
+
+def ecrire_pdf(pages):
+    """PDF minimal (Helvetica, WinAnsiEncoding) : une liste de lignes de texte par page. Retourne les octets."""
+    objets = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+              b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    refs_pages = []
+    for lignes in pages:
+        flux = io.BytesIO()
+        flux.write(b"BT /F1 10 Tf %d TL 40 %d Td\n" % (INTERLIGNE, HAUTEUR_PAGE - 40))
+        for ligne in lignes:
+            flux.write(b"(" + _echapper(ligne) + b") Tj T*\n")
+        flux.write(b"ET")
+        contenu = flux.getvalue()
+        objets.append(b"<< /Length %d >>\nstream\n" % len(contenu) + contenu + b"\nendstream")
+        objets.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 %d] /Contents %d 0 R "
+                      b"/Resources << /Font << /F1 3 0 R >> >> >>" % (HAUTEUR_PAGE, len(objets)))
+        refs_pages.append(b"%d 0 R" % len(objets))
+    objets[1] = b"<< /Type /Pages /Kids [" + b" ".join(refs_pages) + b"] /Count %d >>" % len(refs_pages)
+
+    sortie = io.BytesIO()
+    sortie.write(b"%PDF-1.4\n")
+    positions = []
+    for numero, objet in enumerate(objets, start=1):
+        positions.append(sortie.tell())
+        sortie.write(b"%d 0 obj\n" % numero + objet + b"\nendobj\n")
+    debut_xref = sortie.tell()
+    sortie.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objets) + 1))
+    for position in positions:
+        sortie.write(b"%010d 00000 n \n" % position)
+    sortie.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objets) + 1, debut_xref))
+    return sortie.getvalue()
+
+
+def fichier_memoire(nom, contenu):
+    """Imite un UploadedFile de Streamlit (attribut name, méthode getvalue)."""
+    fichier = io.BytesIO(contenu)
+    fichier.name = nom
+    return fichier
+
+
+# --- Corpus ---
+
+def _mois_successifs(nombre, annee=2025):
+    """`nombre` mois consécutifs (annee, mois) se terminant en décembre de `annee`."""
+    mois = []
+    for i in range(nombre):
+        a, m = divmod(annee * 12 + 11 - i, 12)
+        mois.append((a, m + 1))
+    return mois[::-1]
+
+
+def corpus_paie(nb_pages, graine=0):
+    """Un bulletin d'une page par mois ; le montant est en fin de ligne comme sur les vrais bulletins."""
+    alea = random.Random(graine)
+    fichiers = []
+    for annee, mois in _mois_successifs(nb_pages):
+        lignes = ["BULLETIN DE PAIE", f"PERIODE DU 01/{mois:02d}/{annee} AU {calendar.monthrange(annee, mois)[1]}/{mois:02d}/{annee}"]
+        lignes += [f"LIGNE DE PAIE {i:02d}   {alea.randint(10, 999)},{alea.randint(0, 99):02d}" for i in range(20)]
+        lignes.insert(8, f"IR EXONEREES   151,67  {alea.randint(100, 900)},{alea.randint(0, 99):02d}")
+        lignes.insert(12, f"IR NON EXONEREES   {alea.randint(100, 900)},{alea.randint(0, 99):02d}")
+        lignes.insert(16, f"REMB.CARTE NAVIGO   {alea.randint(40, 90)},{alea.randint(0, 99):02d}")
+        lignes.append("NET A PAYER   3 210,00")
+        fichiers.append(fichier_memoire(f"paie_{mois:02d}{annee}.pdf", ecrire_pdf([lignes])))
+    return fichiers
+
+
+def _lignes_rotation(alea, numero, vol, jour):
+    """Rotation d'une journée CDG -> escale -> CDG (deux lignes de relevé)."""
+    type_avion, immat = alea.choice(AVIONS)
+    escale = alea.choice(ESCALES)
+    return [f"{numero} {type_avion} {immat} AF{vol:04d} CDG {jour} | 6.{alea.randint(0, 59):02d} {escale} {jour} | 9.{alea.randint(0, 59):02d}",
+            f"{numero + 1} {type_avion} {immat} AF{vol + 1:04d} {escale} {jour} | 11.{alea.randint(0, 59):02d} CDG {jour} | 14.{alea.randint(0, 59):02d}"]
+
+
+def corpus_ep5(nb_pages, graine=0):
+    """
+    Relevés mensuels EP5 (nom MM-YYYY) sur 2024-2025, années couvertes par les barèmes livrés.
+    Une rotation au plus par jour (au-delà, les rotations seraient dédoublonnées) : les rotations
+    du mois sont réparties sur ses pages de vols, complétées de lignes d'activité hors vol.
+    Une page sur quatre ne contient pas de relevé.
+    """
+    alea = random.Random(graine)
+    nb_fichiers = min(24, nb_pages)
+    fichiers = []
+    for k, (annee, mois) in enumerate(_mois_successifs(nb_fichiers)):
+        nb = nb_pages // nb_fichiers + (k < nb_pages % nb_fichiers)
+        nb_jours = calendar.monthrange(annee, mois)[1]
+        pages_vols = [i for i in range(nb) if i % 4 != 3] or [0]
+        jours = iter(range(1, nb_jours + 1))
+        pages, numero = [], 1
+        for i in range(nb):
+            if i not in pages_vols:
+                pages.append(["RECAPITULATIF DES HEURES", "Aucune ligne de vol sur cette page"])
+                continue
+            lignes = ["RELEVE EP5 - ACTIVITE PERSONNEL NAVIGANT", "No Type Immat Vol Dep J|H Arr J|H"]
+            part = nb_jours // len(pages_vols) + (pages_vols.index(i) < nb_jours % len(pages_vols))
+            for jour in (next(jours) for _ in range(part)):
+                lignes += _lignes_rotation(alea, numero, 2 * jour, jour)
+                numero += 2
+            while len(lignes) < LIGNES_PAR_PAGE - 1:
+                lignes.append(f"SOL {alea.choice(['REPOS', 'RESERVE', 'SIMULATEUR', 'FORMATION'])} {alea.randint(1, nb_jours)}/{mois:02d}")
+            lignes.append("TOTAL HEURES DE VOL")
+            pages.append(lignes)
+        fichiers.append(fichier_memoire(f"EP5_{mois:02d}-{annee}.pdf", ecrire_pdf(pages)))
+    return fichiers
+
+
+def corpus_attestation(nb_pages, pages_par_fichier=20, graine=0):
+    """Attestations de nuitées ; le titre est sur la dernière page de chaque fichier (pire cas)."""
+    alea = random.Random(graine)
+    nb_fichiers = max(1, -(-nb_pages // pages_par_fichier))
+    fichiers, restantes = [], nb_pages
+    for k in range(nb_fichiers):
+        nb = min(pages_par_fichier, restantes)
+        pages = [[f"DETAIL DES NUITEES - PAGE {i + 1}"] + [f"NUITEE {j:02d} ESCALE {alea.choice(ESCALES)}" for j in range(30)]
+                 for i in range(nb - 1)]
+        pages.append([f"ATTESTATION DE DECOMPTE DES NUITEES POUR L'ANNEE {2025 - k}",
+                      f"Le montant total s'élève à {alea.randint(1, 9)} {alea.randint(100, 999)},{alea.randint(0, 99):02d} Euros"])
+        restantes -= nb
+        fichiers.append(fichier_memoire(f"attestation_{2025 - k}.pdf", ecrire_pdf(pages)))
+    return fichiers
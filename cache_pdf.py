@@ -0,0 +1,115 @@
+import os
+import pickle
+import hashlib
+import threading
+import traces
+
+# Cache disque des textes extraits et des résultats d'analyse, indexé par l'empreinte du PDF
+CACHE_DIR = os.environ.get("IMPOT_CALC_CACHE_DIR", ".cache_impot_calc")
+CACHE_ACTIF = os.environ.get("IMPOT_CALC_CACHE", "1") != "0"
+try:
+    CACHE_TAILLE_MAX = int(os.environ.get("IMPOT_CALC_CACHE_MAX_MO", "200")) * 1024 * 1024
+except ValueError:
+    CACHE_TAILLE_MAX = 200 * 1024 * 1024
+# Une éviction ramène le cache à cette fraction de sa limite, pour que les écritures suivantes
+# ne déclenchent pas chacune un nouveau parcours
+CACHE_TAILLE_APRES_EVICTION = 0.9
+
+# Taille du cache estimée par ce processus : établie par un parcours complet (evincer) puis tenue à jour
+# à chaque écriture, pour ne reparcourir le dossier que lorsque l'estimation dépasse la limite
+_taille_estimee = None
+_verrou_taille = threading.Lock()
+
+
+def empreinte(contenu):
+    """Empreinte SHA-256 du contenu binaire d'un fichier."""
+    return hashlib.sha256(contenu).hexdigest()
+
+
+def cle_cache(*parties):
+    """Clé de cache combinant l'empreinte du fichier, la version du parseur et ses paramètres."""
+    return hashlib.sha256("|".join(str(p) for p in parties).encode("utf-8")).hexdigest()
+
+
+def _chemin(espace, cle):
+    return os.path.join(CACHE_DIR, espace, cle[:2], cle + ".pickle")
+
+
+def lire(espace, cle):
+    """Retourne la valeur en cache, ou None. Un accès rafraîchit l'entrée pour l'éviction LRU."""
+    if not CACHE_ACTIF:
+        return None
+    chemin = _chemin(espace, cle)
+    try:
+        with open(chemin, "rb") as f:
+            valeur = pickle.load(f)
+        os.utime(chemin)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        traces.compter(f"cache_{espace}_absent")
+        return None
+    traces.compter(f"cache_{espace}_trouve")
+    return valeur
+
+
+def ecrire(espace, cle, valeur):
+    """
+    Enregistre une valeur (écriture atomique) puis applique la limite de taille du cache : le dossier
+    n'est parcouru (evincer) qu'à la première écriture du processus et quand la taille estimée dépasse la limite.
+    """
+    global _taille_estimee
+    if not CACHE_ACTIF:
+        return
+    chemin = _chemin(espace, cle)
+    try:
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, "wb") as f:
+            pickle.dump(valeur, f, protocol=pickle.HIGHEST_PROTOCOL)
+        taille = os.path.getsize(temporaire)
+        try:
+            taille -= os.path.getsize(chemin)  # entrée remplacée
+        except OSError:
+            pass
+        os.replace(temporaire, chemin)
+    except OSError:
+        return
+    with _verrou_taille:
+        if _taille_estimee is not None:
+            _taille_estimee += taille
+            if _taille_estimee <= CACHE_TAILLE_MAX:
+                return
+    evincer()
+
+
+def evincer(taille_max=None):
+    """
+    Si le cache dépasse sa taille maximale, supprime les entrées les moins récemment utilisées jusqu'à
+    revenir à CACHE_TAILLE_APRES_EVICTION de cette taille. Retourne la taille restante, qui devient la taille estimée du cache.
+    """
+    global _taille_estimee
+    taille_max = CACHE_TAILLE_MAX if taille_max is None else taille_max
+    entrees, total = [], 0
+    for dossier, _, noms in os.walk(CACHE_DIR):
+        for nom in noms:
+            if not nom.endswith(".pickle"):
+                continue
+            chemin = os.path.join(dossier, nom)
+            try:
+                stat = os.stat(chemin)
+            except OSError:
+                continue
+            entrees.append((stat.st_mtime, stat.st_size, chemin))
+            total += stat.st_size
+    if total > taille_max:
+        taille_max *= CACHE_TAILLE_APRES_EVICTION
+        for _, taille, chemin in sorted(entrees):
+            try:
+                os.remove(chemin)
+            except OSError:
+                continue
+            total -= taille
+            if total <= taille_max:
+                break
+    with _verrou_taille:
+        _taille_estimee = total
+    return total
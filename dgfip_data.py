@@ -1,14 +1,21 @@
-import requests
 import re 
 import json 
 from datetime import datetime, date 
 import csv 
+import io
 import os
+import functools
+import numpy as np
+import pandas as pd
+import traces
+import telechargement_dgfip
+import baremes_dgfip
 
-# URLs de la DGFiP
-WEBPAYS_URL = "https://www.economie.gouv.fr/dgfip/fichiers_taux_chancellerie/txt/Webpays"
-WEBMISS_URL = "https://www.economie.gouv.fr/dgfip/fichiers_taux_chancellerie/txt/Webmiss"
-WEBTAUX_URL = "https://www.economie.gouv.fr/dgfip/fichiers_taux_chancellerie/txt/Webtaux"
+# URLs de la DGFiP (IMPOT_CALC_DGFIP_URL : autre serveur, par exemple un serveur HTTP local de test)
+DGFIP_URL_BASE = os.environ.get("IMPOT_CALC_DGFIP_URL", "https://www.economie.gouv.fr/dgfip/fichiers_taux_chancellerie/txt").rstrip("/")
+WEBPAYS_URL = f"{DGFIP_URL_BASE}/Webpays"
+WEBMISS_URL = f"{DGFIP_URL_BASE}/Webmiss"
+WEBTAUX_URL = f"{DGFIP_URL_BASE}/Webtaux"
 
 # --- CONFIGURATION SPÉCIFIQUE ---
 PAYS_INITIAUX_ET_CORRECTIONS = {
@@ -56,18 +63,9 @@ INDEMNITES_MANUELLES_SPECIFIQUES = {}
 
 def telecharger_fichier_dgfip(url):
     print(f"Tentative de téléchargement de : {url}")
-    try:
-        response = requests.get(url, timeout=10); response.raise_for_status() 
-        try: text_content = response.content.decode('utf-8'); print(f"  > Fichier décodé avec utf-8."); return text_content
-        except UnicodeDecodeError:
-            print(f"  > Échec utf-8, autres encodages..."); encodings_to_try = ['latin-1', 'cp1252']
-            for enc in encodings_to_try:
-                try: text_content = response.content.decode(enc); print(f"  > Fichier décodé avec {enc}."); return text_content
-                except UnicodeDecodeError: print(f"  > Échec avec {enc}...")
-            print(f"  > ERREUR : Impossible de décoder {url}."); return response.text
-    except requests.exceptions.Timeout: print(f"ERREUR téléchargement {url}: Timeout."); return None
-    except requests.exceptions.RequestException as e: print(f"ERREUR téléchargement {url}: {e}"); return None
+    return telechargement_dgfip.telecharger_sources({os.path.basename(url): url})[os.path.basename(url)]
 
+@traces.trace("dgfip.webpays")
 def traiter_webpays(contenu_webpays, donnees_pays_initiales):
     pays_data = {k: v.copy() for k, v in donnees_pays_initiales.items()} 
     if not contenu_webpays: print("  > Contenu Webpays vide."); return pays_data
@@ -97,52 +95,144 @@ def formater_montant_webmiss(montant_str):
     try: return float(montant_avec_point)
     except ValueError: return 0.0
 
-def traiter_webmiss(contenu_webmiss, pays_data_existant, annee_actuelle_str, indemnites_manuelles_pour_annee):
-    print("\n--- Début du traitement de Webmiss ---")
+def _dedoublonner_baremes(baremes):
+    """Barèmes [date, devise, montant] sans doublons, du plus récent au plus ancien (à date égale, montant le plus élevé d'abord)."""
+    baremes_uniques = []; vus = set()
+    for b_item in baremes: # Assurer que b_item est bien une liste/tuple avant de dépacker
+        if isinstance(b_item, (list, tuple)) and len(b_item) == 3:
+            b_date, b_devise, b_montant = b_item
+            identifiant_bareme = (str(b_date), str(b_devise), float(b_montant)) 
+            if identifiant_bareme not in vus:
+                baremes_uniques.append([b_date, b_devise, b_montant]); vus.add(identifiant_bareme)
+    baremes_uniques.sort(key=lambda x: (x[0], -float(x[2] if x[2] is not None else 0)), reverse=True) 
+    return baremes_uniques
+
+# Au-delà, un entier ne tient plus exactement dans un float : ces valeurs passent par les formateurs ligne à ligne
+_CHIFFRES_MAX = 15
+
+def _colonnes_tsv(contenu, nb_colonnes):
+    """
+    Les nb_colonnes premiers champs (nettoyés, "" si absents) de chaque ligne, lus en une fois
+    par le parseur C de pandas. L'index est le numéro de la ligne, comme avec splitlines().
+    """
+    if not contenu:
+        return pd.DataFrame({col: pd.Series(dtype=str) for col in range(nb_colonnes)})
+    # Mêmes lignes que splitlines(), sans les blancs de tête qui décaleraient les colonnes (la lecture ligne à ligne faisait strip())
+    texte = re.sub(r"(?m)^[^\S\n]+", "", "\n".join(contenu.splitlines()))
+    champs = pd.read_csv(io.StringIO(texte), sep="\t", header=None, names=range(nb_colonnes), usecols=range(nb_colonnes),
+                         dtype=str, quoting=csv.QUOTE_NONE, skip_blank_lines=False, na_filter=False)
+    return pd.DataFrame({col: champs[col].str.strip() for col in range(nb_colonnes)})
+
+def _dates_dgfip(dates):
+    """
+    Dates JJ/MM/AAAA en entiers AAAAMMJJ, pour les seules lignes que datetime.strptime(date, "%d/%m/%Y") accepte.
+    Les fichiers répètent les mêmes dates : strptime n'est appelé qu'une fois par date distincte.
+    """
+    position, distinctes = pd.factorize(dates)
+    valeurs = np.full(len(distinctes), -1, dtype=np.int64)
+    for i, date_str in enumerate(distinctes.tolist()):
+        try: d = datetime.strptime(date_str, "%d/%m/%Y").date()
+        except ValueError: continue
+        valeurs[i] = d.year * 10000 + d.month * 100 + d.day
+    date_num = pd.Series(valeurs[position], index=dates.index)
+    return date_num[date_num >= 0]
+
+def _dates_iso(date_num):
+    """
+    AAAAMMJJ -> ("AAAA-MM-JJ" par strftime, sur les seules dates distinctes ; rang de cette chaîne dans l'ordre
+    alphabétique, qui est l'ordre de tri de l'historique).
+    """
+    distinctes, position = np.unique(date_num, return_inverse=True)
+    iso = np.array([date(n // 10000, n // 100 % 100, n % 100).strftime("%Y-%m-%d") for n in distinctes.tolist()], dtype=object)
+    rang = np.empty(len(iso), dtype=np.int64)
+    rang[np.argsort(iso, kind="stable")] = np.arange(len(iso))
+    return iso[position], rang[position]
+
+def _virgule_fixe(chiffres, decimales):
+    """
+    Chaînes de chiffres en virgule fixe (entier / 10**decimales, le même float que float("entier.decimales")).
+    Retourne (valeurs, masque des lignes converties) ; les autres (trop courtes, signe, espaces, trop longues)
+    sont laissées aux formateurs ligne à ligne.
+    """
+    longueurs = chiffres.str.len().to_numpy()
+    decimales = np.broadcast_to(decimales, longueurs.shape)
+    simples = (chiffres.str.fullmatch("[0-9]+").to_numpy(dtype=bool) & (decimales >= 0)
+               & (longueurs >= decimales) & (longueurs <= _CHIFFRES_MAX))
+    valeurs = np.full(len(chiffres), np.nan)
+    valeurs[simples] = chiffres[simples].astype(np.int64).to_numpy() / 10.0 ** decimales[simples]
+    return valeurs, simples
+
+@traces.trace("dgfip.webmiss")
+def lire_webmiss(contenu_webmiss):
+    """
+    Historique complet de Webmiss, toutes années confondues : {code: {"a": barèmes dédoublonnés et triés,
+    "lignes": {année: première ligne du fichier}}}. Les lignes servent à rendre aux pays absents de Webpays
+    leur ordre d'apparition une fois l'historique restreint à une année (voir baremes_annee).
+    Lecture en colonnes : découpage, dates, montants, dédoublonnage et tri sur tout le fichier à la fois.
+    """
+    print("\n--- Début de la lecture de Webmiss ---")
     if not contenu_webmiss: print("  > Contenu Webmiss vide."); 
-    lignes = contenu_webmiss.splitlines() if contenu_webmiss else []
-    barèmes_ajoutes_dgfip_count = 0
-    for i, ligne in enumerate(lignes):
-        ligne_traitee = ligne.strip();
-        if not ligne_traitee: continue
-        parts = ligne_traitee.split('\t')
-        if len(parts) >= 5: 
-            code_pays_brut_webmiss = parts[0].strip(); date_str = parts[1].strip()
-            devise = parts[2].strip().upper(); montant_g1_str = parts[4].strip()
-            if not code_pays_brut_webmiss or not date_str or not devise or not montant_g1_str: continue
-            code_a_utiliser = MAPPING_CODES_DGFiP_VERS_STOCKAGE.get(code_pays_brut_webmiss, code_pays_brut_webmiss)
-            try:
-                date_obj = datetime.strptime(date_str, "%d/%m/%Y").date(); date_iso = date_obj.strftime("%Y-%m-%d")
-                if date_obj.year > int(annee_actuelle_str) + 5: continue
-                montant_final = formater_montant_webmiss(montant_g1_str)
-                if code_a_utiliser not in pays_data_existant:
-                    pays_data_existant[code_a_utiliser] = {"n": PAYS_INITIAUX_ET_CORRECTIONS.get(code_a_utiliser, {}).get("n", code_a_utiliser), "a": []}
-                if "a" not in pays_data_existant[code_a_utiliser]: pays_data_existant[code_a_utiliser]["a"] = []
-                pays_data_existant[code_a_utiliser]["a"].append([date_iso, devise, montant_final])
-                barèmes_ajoutes_dgfip_count += 1
-            except (ValueError, Exception): pass
-            
+    champs = _colonnes_tsv(contenu_webmiss, 5)
+    champs = champs[(champs[0] != "") & (champs[1] != "") & (champs[2] != "") & (champs[4] != "")]
+    date_num = _dates_dgfip(champs[1])
+    champs = champs.loc[date_num.index]
+    # Montant G1 sur 4 décimales
+    montants, simples = _virgule_fixe(champs[4], 4)
+    montants[~simples] = [formater_montant_webmiss(m) for m in champs[4][~simples]]
+    baremes = pd.DataFrame({
+        "code": champs[0].replace(MAPPING_CODES_DGFiP_VERS_STOCKAGE), "devise": champs[2].str.upper(),
+        "montant": montants, "date_num": date_num, "annee": date_num // 10000, "ligne": champs.index})
+
+    premieres_lignes = baremes.groupby(["code", "annee"], sort=False)["ligne"].min()
+    baremes = baremes.drop_duplicates(["code", "date_num", "devise", "montant"])
+    # Pays dans leur ordre d'apparition ; date décroissante, puis montant croissant, ordre du fichier à égalité
+    rang_code, codes = pd.factorize(baremes["code"])
+    iso, rang_date = _dates_iso(baremes["date_num"].to_numpy())
+    ordre = np.lexsort((baremes["montant"].to_numpy(), -rang_date, rang_code))
+    rang_code = rang_code[ordre]
+    debuts = np.searchsorted(rang_code, np.arange(len(codes) + 1)).tolist()
+    lignes = list(map(list, zip(iso[ordre].tolist(), baremes["devise"].to_numpy()[ordre].tolist(), baremes["montant"].to_numpy()[ordre].tolist())))
+
+    historique = {code: {"a": lignes[debuts[i]:debuts[i + 1]], "lignes": {}} for i, code in enumerate(codes)}
+    for (code, annee), ligne in premieres_lignes.items():
+        historique[code]["lignes"][int(annee)] = int(ligne)
+    print(f"--- Fin lecture Webmiss. {len(date_num)} barèmes DGFiP lus pour {len(historique)} codes pays. ---")
+    return historique
+
+def baremes_annee(historique_webmiss, pays_data_existant, annee_actuelle_str, indemnites_manuelles_pour_annee):
+    """
+    Barèmes de chaque pays pour une année de traitement : historique de Webmiss jusqu'à annee + 5,
+    ajouté aux pays existants (copiés), puis barèmes manuels/forfaits de l'année.
+    """
+    limite_annee = int(annee_actuelle_str) + 5
+    pays_data = {code: {**data, "a": list(data.get("a", []))} for code, data in pays_data_existant.items()}
+    # Pays inconnus de Webpays : dans l'ordre de leur première ligne retenue, comme lors d'une lecture ligne à ligne
+    nouveaux_codes = []
+    for code, entree in historique_webmiss.items():
+        lignes_retenues = [num for annee, num in entree["lignes"].items() if annee <= limite_annee]
+        if lignes_retenues and code not in pays_data: nouveaux_codes.append((min(lignes_retenues), code))
+    for _, code in sorted(nouveaux_codes):
+        pays_data[code] = {"n": PAYS_INITIAUX_ET_CORRECTIONS.get(code, {}).get("n", code), "a": []}
+
+    a_dedoublonner = set()
+    for code, entree in historique_webmiss.items():
+        retenus = [b for b in entree["a"] if int(b[0][:-6]) <= limite_annee]
+        if not retenus: continue
+        if pays_data[code]["a"]: a_dedoublonner.add(code)
+        pays_data[code]["a"].extend(retenus)
     for code_pays_manuel, liste_baremes_manuels in indemnites_manuelles_pour_annee.items():
         cible_code_pays = MAPPING_CODES_DGFiP_VERS_STOCKAGE.get(code_pays_manuel, code_pays_manuel)
-        if cible_code_pays not in pays_data_existant:
-            pays_data_existant[cible_code_pays] = {"n": PAYS_INITIAUX_ET_CORRECTIONS.get(cible_code_pays, {}).get("n", cible_code_pays), "a": []}
+        if cible_code_pays not in pays_data:
+            pays_data[cible_code_pays] = {"n": PAYS_INITIAUX_ET_CORRECTIONS.get(cible_code_pays, {}).get("n", cible_code_pays), "a": []}
         print(f"  > Application des barèmes manuels/forfait pour {cible_code_pays} (source: {code_pays_manuel})")
-        pays_data_existant[cible_code_pays]["a"].extend(liste_baremes_manuels)
-
-    for code_p, data_p in pays_data_existant.items():
-        if "a" in data_p and data_p["a"]: 
-            baremes_uniques = []; vus = set()
-            for b_item in data_p["a"]: # Assurer que b_item est bien une liste/tuple avant de dépacker
-                if isinstance(b_item, (list, tuple)) and len(b_item) == 3:
-                    b_date, b_devise, b_montant = b_item
-                    identifiant_bareme = (str(b_date), str(b_devise), float(b_montant)) 
-                    if identifiant_bareme not in vus:
-                        baremes_uniques.append([b_date, b_devise, b_montant]); vus.add(identifiant_bareme)
-                # else: print(f"  Avertissement: Barème malformé ignoré pour {code_p}: {b_item}")
-            baremes_uniques.sort(key=lambda x: (x[0], -float(x[2] if x[2] is not None else 0)), reverse=True) 
-            data_p["a"] = baremes_uniques
-    print(f"--- Fin traitement Webmiss. {barèmes_ajoutes_dgfip_count} barèmes DGFiP lus. Barèmes manuels/forfaits appliqués et listes triées/dédoublonnées. ---")
-    return pays_data_existant
+        pays_data[cible_code_pays]["a"].extend(liste_baremes_manuels); a_dedoublonner.add(cible_code_pays)
+    # Les listes issues de l'historique sont déjà dédoublonnées et triées
+    for code in a_dedoublonner:
+        pays_data[code]["a"] = _dedoublonner_baremes(pays_data[code]["a"])
+    return pays_data
+
+def traiter_webmiss(contenu_webmiss, pays_data_existant, annee_actuelle_str, indemnites_manuelles_pour_annee):
+    return baremes_annee(lire_webmiss(contenu_webmiss), pays_data_existant, annee_actuelle_str, indemnites_manuelles_pour_annee)
 
 def formater_taux_webtaux(taux_str_brut):
     """
@@ -160,36 +250,89 @@ def formater_taux_webtaux(taux_str_brut):
         return taux_eur_par_devise
     except ValueError: return None
 
-def traiter_webtaux(contenu_webtaux, annee_actuelle_str):
-    taux_data = {}; print("\n--- Début du traitement de Webtaux ---") 
+@traces.trace("dgfip.webtaux")
+def lire_webtaux(contenu_webtaux):
+    """
+    Historique complet de Webtaux, toutes années confondues : {devise: [[date, taux EUR/Devise]] du plus récent au plus ancien}.
+    Lecture en colonnes, comme lire_webmiss.
+    """
+    taux_data = {}; print("\n--- Début de la lecture de Webtaux ---") 
     if not contenu_webtaux: print("  > Contenu Webtaux vide."); return taux_data
-    lignes = contenu_webtaux.splitlines(); taux_ajoutes_count = 0
-    for i, ligne in enumerate(lignes):
-        ligne_traitee = ligne.strip();
-        if not ligne_traitee: continue
-        parts = ligne_traitee.split('\t')
-        if len(parts) >= 3:
-            devise = parts[0].strip().upper(); date_str = parts[1].strip(); valeur_taux_brute_str = parts[2].strip()
-            if not devise or not date_str or not valeur_taux_brute_str or devise == "ZWR": continue
-            try:
-                date_obj = datetime.strptime(date_str, "%d/%m/%Y").date(); date_iso = date_obj.strftime("%Y-%m-%d")
-                if date_obj.year > int(annee_actuelle_str) + 5 : continue
-                taux_eur_par_devise = formater_taux_webtaux(valeur_taux_brute_str) # Maintenant EUR/Devise
-                if taux_eur_par_devise is not None:
-                    if devise not in taux_data: taux_data[devise] = []
-                    taux_data[devise].append([date_iso, taux_eur_par_devise]); taux_ajoutes_count += 1
-            except (ValueError, Exception): pass
-    for devise_k, liste_taux in taux_data.items(): liste_taux.sort(key=lambda x: x[0], reverse=True)
-    print(f"--- Fin Webtaux. {taux_ajoutes_count} entrées. {len(taux_data)} devises (taux en EUR/Devise). ---"); return taux_data
-
-def find_applicable_rate(liste_taux_par_date_eur_par_devise, date_cible_str): # Renommé pour clarté
-    if not liste_taux_par_date_eur_par_devise: return None
-    for date_taux_str, taux in liste_taux_par_date_eur_par_devise: 
-        if date_taux_str <= date_cible_str: return taux
-    return None
-
-def calculer_taux_annuels(donnees_taux_historique_eur_par_devise, annee_str):
-    taux_annuels = {}; date_debut_annee = f"{annee_str}-01-01"; date_fin_annee = f"{annee_str}-12-31"
+    champs = _colonnes_tsv(contenu_webtaux, 3)
+    champs[0] = champs[0].str.upper()
+    champs = champs[(champs[0] != "") & (champs[1] != "") & (champs[2] != "") & (champs[0] != "ZWR")]
+    date_num = _dates_dgfip(champs[1])
+    champs = champs.loc[date_num.index]
+    # Valeur XXX.YYYYY (3 chiffres avant la virgule) en Devise/EUR, inversée en EUR/Devise ; 0 ou illisible : ignorée
+    valeurs, simples = _virgule_fixe(champs[2], champs[2].str.len().to_numpy() - 3)
+    taux_eur_par_devise = np.full(len(champs), np.nan)
+    inversibles = simples & (valeurs != 0)
+    taux_eur_par_devise[inversibles] = 1.0 / valeurs[inversibles]
+    taux_eur_par_devise[~simples] = [np.nan if t is None else t for t in map(formater_taux_webtaux, champs[2][~simples])]
+    taux = pd.DataFrame({"devise": champs[0], "date_num": date_num, "taux": taux_eur_par_devise}).dropna(subset=["taux"])
+
+    rang_devise, devises = pd.factorize(taux["devise"])
+    iso, rang_date = _dates_iso(taux["date_num"].to_numpy())
+    ordre = np.lexsort((-rang_date, rang_devise))
+    rang_devise = rang_devise[ordre]
+    debuts = np.searchsorted(rang_devise, np.arange(len(devises) + 1)).tolist()
+    lignes = list(map(list, zip(iso[ordre].tolist(), taux["taux"].to_numpy()[ordre].tolist())))
+    for i, devise in enumerate(devises):
+        taux_data[devise] = lignes[debuts[i]:debuts[i + 1]]
+    print(f"--- Fin Webtaux. {len(taux)} entrées. {len(taux_data)} devises (taux en EUR/Devise). ---"); return taux_data
+
+def taux_annee(historique_webtaux, annee_actuelle_str):
+    """Historique des taux restreint aux dates jusqu'à annee + 5 (ordre des listes conservé)."""
+    limite_annee = int(annee_actuelle_str) + 5
+    taux_data = {}
+    for devise, liste_taux in historique_webtaux.items():
+        retenus = [t for t in liste_taux if int(t[0][:-6]) <= limite_annee]
+        if retenus: taux_data[devise] = retenus
+    return taux_data
+
+def traiter_webtaux(contenu_webtaux, annee_actuelle_str):
+    return taux_annee(lire_webtaux(contenu_webtaux), annee_actuelle_str)
+
+@functools.lru_cache(maxsize=None)
+def _ordinal_iso(date_iso):
+    annee, mois, jour = date_iso.rsplit("-", 2)
+    return date(int(annee), int(mois), int(jour)).toordinal()
+
+def table_historique(historique):
+    """
+    Historique [[date ISO, ...]] du plus récent au plus ancien -> (ordinaux croissants, éléments dans le même ordre),
+    pour une recherche dichotomique. À date égale, bisect à droite retombe sur l'élément qui venait en premier
+    dans l'historique, celui que retenait l'ancien parcours linéaire.
+    """
+    elements = historique[::-1]
+    return np.array([_ordinal_iso(e[0]) for e in elements], dtype=np.int64), elements
+
+def tables_historiques(historiques):
+    """{clé: historique} -> {clé: table_historique}."""
+    return {cle: table_historique(historique) for cle, historique in historiques.items()}
+
+def valeurs_aux_dates(table, ordinaux):
+    """Élément en vigueur à chacune des dates (ordinaux), en une recherche groupée ; None avant le premier."""
+    positions = np.searchsorted(table[0], ordinaux, side="right") - 1
+    elements = table[1]
+    return [elements[i] if i >= 0 else None for i in positions.tolist()]
+
+def ordinaux_annee(annee_str, quotidien=False):
+    """Dates d'échantillonnage d'une année : le 15 de chaque mois, ou chaque jour."""
+    annee = int(annee_str)
+    if quotidien:
+        return list(range(date(annee, 1, 1).toordinal(), date(annee, 12, 31).toordinal() + 1))
+    return [date(annee, mois, 15).toordinal() for mois in range(1, 13)]
+
+@traces.trace("dgfip.taux_annuels")
+def calculer_taux_annuels(donnees_taux_historique_eur_par_devise, annee_str, tables_taux=None, quotidien=False):
+    """
+    Taux [début, fin, moyen] (EUR/Devise) de chaque devise pour l'année. Le taux moyen est la moyenne
+    du début et de la fin, ou avec `quotidien` la moyenne des taux en vigueur chaque jour de l'année.
+    `tables_taux` (voir tables_historiques) évite de reconstruire les tables à chaque année.
+    """
+    taux_annuels = {}; tables_taux = tables_taux or {}
+    jours = ordinaux_annee(annee_str, quotidien=True) if quotidien else [date(int(annee_str), 1, 1).toordinal(), date(int(annee_str), 12, 31).toordinal()]
     taux_annuels["EUR"] = [1.0, 1.0, 1.0]; 
     valeur_fixe_eur_pour_xaf_xof = 1.0 * 655.9570 # EUR/XOF ou EUR/XAF
     taux_fixes_eur_par_devise = {"XAF": valeur_fixe_eur_pour_xaf_xof, "XOF": valeur_fixe_eur_pour_xaf_xof}
@@ -197,58 +340,51 @@ def calculer_taux_annuels(donnees_taux_historique_eur_par_devise, annee_str):
          taux_annuels[devise_fixe] = [taux_fixe_eur_d, taux_fixe_eur_d, taux_fixe_eur_d]
     for devise, liste_taux in donnees_taux_historique_eur_par_devise.items(): # liste_taux est en EUR/Devise
         if devise in taux_annuels: continue 
-        taux_debut_eur_d = find_applicable_rate(liste_taux, date_debut_annee)
-        taux_fin_eur_d = find_applicable_rate(liste_taux, date_fin_annee)   
+        table = tables_taux.get(devise) or table_historique(liste_taux)
+        taux_jours = [t[1] if t is not None else None for t in valeurs_aux_dates(table, jours)]
+        taux_debut_eur_d, taux_fin_eur_d = taux_jours[0], taux_jours[-1]
         if taux_fin_eur_d is None and taux_debut_eur_d is not None: taux_fin_eur_d = taux_debut_eur_d
         elif taux_debut_eur_d is None and taux_fin_eur_d is not None: taux_debut_eur_d = taux_fin_eur_d
         if taux_debut_eur_d is not None and taux_fin_eur_d is not None:
-            taux_moyen_eur_d = (taux_debut_eur_d + taux_fin_eur_d) / 2.0
+            if quotidien:
+                taux_connus = [t for t in taux_jours if t is not None]
+                taux_moyen_eur_d = sum(taux_connus) / len(taux_connus)
+            else:
+                taux_moyen_eur_d = (taux_debut_eur_d + taux_fin_eur_d) / 2.0
             taux_annuels[devise] = [taux_debut_eur_d, taux_fin_eur_d, taux_moyen_eur_d]
-        elif taux_debut_eur_d is not None: 
-            taux_annuels[devise] = [taux_debut_eur_d, taux_debut_eur_d, taux_debut_eur_d]
         else:
             print(f"  Avertissement: Aucun taux EUR/Devise pour {devise} pour {annee_str}."); taux_annuels[devise] = [None,None,None] 
     print(f"\n--- Taux annuels (EUR/Devise) calculés pour {len(taux_annuels)} devises. ---"); return taux_annuels
 
-def find_applicable_indemnity_for_date(baremes_pays_tries_par_date_recente, target_date_obj):
-    if not baremes_pays_tries_par_date_recente: return None
-    target_date_str = target_date_obj.strftime("%Y-%m-%d") 
-    for bareme_item in baremes_pays_tries_par_date_recente:
-        if isinstance(bareme_item, (list, tuple)) and len(bareme_item) == 3:
-            date_bareme_str, devise_bareme, montant_bareme = bareme_item
-            if isinstance(date_bareme_str, str) and date_bareme_str <= target_date_str: 
-                return {"date_validite": date_bareme_str, "devise": devise_bareme, "montant": montant_bareme}
-    return None
-
-def calculer_moyenne_indemnites_europe(donnees_pays_complets, annee_str, liste_pays_europe_reference, taux_annuels_eur_par_devise):
+@traces.trace("dgfip.forfait_europe")
+def calculer_moyenne_indemnites_europe(donnees_pays_complets, annee_str, liste_pays_europe_reference, taux_annuels_eur_par_devise,
+                                       tables_baremes=None, quotidien=False):
+    """
+    Moyenne des indemnités (EUR) des pays de référence : barème en vigueur le 15 de chaque mois,
+    ou chaque jour de l'année avec `quotidien`.
+    """
     print(f"\n--- Calcul de l'indemnité moyenne européenne pour {annee_str} ---")
+    tables_baremes = tables_baremes or {}
+    jours = ordinaux_annee(annee_str, quotidien)
     moyennes_annuelles_par_pays_ref_eur = []
     for code_pays_ref in liste_pays_europe_reference:
         if code_pays_ref in donnees_pays_complets and donnees_pays_complets[code_pays_ref].get("a"):
-            baremes_du_pays = donnees_pays_complets[code_pays_ref]["a"] 
+            table = tables_baremes.get(code_pays_ref) or table_historique(donnees_pays_complets[code_pays_ref]["a"])
             indemnites_mensuelles_pour_ce_pays_eur = []
-            for mois in range(1, 13):
-                date_test_mois = date(int(annee_str), mois, 15) 
-                bareme_applicable_mois = find_applicable_indemnity_for_date(baremes_du_pays, date_test_mois)
-                if bareme_applicable_mois:
-                    montant_local = bareme_applicable_mois["montant"]
-                    devise_locale = bareme_applicable_mois["devise"]
+            for bareme_applicable in valeurs_aux_dates(table, jours):
+                if bareme_applicable:
+                    _, devise_locale, montant_local = bareme_applicable
                     if devise_locale == "EUR":
                         indemnites_mensuelles_pour_ce_pays_eur.append(montant_local)
                     # Utiliser les taux EUR/Devise pour multiplier
                     elif devise_locale in taux_annuels_eur_par_devise and \
                        taux_annuels_eur_par_devise[devise_locale][2] is not None: # Taux moyen EUR/Devise
                         taux_moyen_eur_d = taux_annuels_eur_par_devise[devise_locale][2] 
-                        montant_converti_eur = montant_local / taux_moyen_eur_d 
-                        indemnites_mensuelles_pour_ce_pays_eur.append(montant_converti_eur)
-                        # print(f"  Info: Pour {code_pays_ref}, mois {mois}, {montant_local} {devise_locale} converti en {montant_converti_eur:.2f} EUR (taux moyen {taux_moyen_eur_d:.6f} EUR/{devise_locale})")
-                    # else: print(f"  Avert.: Pas de taux EUR ou de taux de change moyen pour {devise_locale} ({code_pays_ref}, mois {mois}).")
+                        indemnites_mensuelles_pour_ce_pays_eur.append(montant_local / taux_moyen_eur_d)
             if indemnites_mensuelles_pour_ce_pays_eur:
                 moyenne_annuelle_pays = sum(indemnites_mensuelles_pour_ce_pays_eur) / len(indemnites_mensuelles_pour_ce_pays_eur)
                 moyennes_annuelles_par_pays_ref_eur.append(moyenne_annuelle_pays)
                 print(f"  Moyenne annuelle pour {code_pays_ref} (pays réf.): {moyenne_annuelle_pays:.2f} EUR")
-            # else: print(f"  Avert.: Pas de données d'indemnité EUR pour calculer moyenne de {code_pays_ref}.")
-        # else: print(f"  Avert.: Pays réf. {code_pays_ref} non trouvé ou sans barèmes pour calcul moyenne Europe.")
     if moyennes_annuelles_par_pays_ref_eur:
         moyenne_europe_finale = sum(moyennes_annuelles_par_pays_ref_eur) / len(moyennes_annuelles_par_pays_ref_eur)
         print(f"--- INDEMNITÉ MOYENNE EUROPÉENNE CALCULÉE POUR {annee_str}: {moyenne_europe_finale:.2f} EUR ---")
@@ -257,18 +393,13 @@ def calculer_moyenne_indemnites_europe(donnees_pays_complets, annee_str, liste_p
         print(f"--- ERREUR: Impossible de calculer l'indemnité moyenne européenne pour {annee_str}. ---")
         return None 
 
-def generer_csv_final(donnees_pays_complet, taux_annuels_eur_par_devise, annee_str, nom_fichier_sortie):
-    print(f"\n--- Génération CSV: {nom_fichier_sortie} ---")
-    lignes_csv = []
-    entetes = [
-        "Code Pays", "Nom Pays", "Date Validité Barème", "Montant Barème", "Devise Barème",
-        "Taux (EUR par Devise) Début " + annee_str, 
-        "Taux (EUR par Devise) Fin " + annee_str,
-        "Taux (EUR par Devise) Moyen " + annee_str, 
-        "Montant Barème (EUR)"
-    ]
-    lignes_csv.append(entetes)
-    lignes_ecrites_count = 0
+@traces.trace("dgfip.lignes_annee")
+def lignes_bareme_annee(donnees_pays_complet, taux_annuels_eur_par_devise, annee_str):
+    """
+    Lignes du barème d'une année (valeurs brutes, dans l'ordre de baremes_dgfip.COLONNES) : pour chaque pays,
+    les barèmes qui commencent dans l'année et celui en vigueur au 1er janvier.
+    """
+    lignes_bareme = []
 
     for code_pays, data_pays in donnees_pays_complet.items():
         nom_pays = data_pays.get("n", "N/A")
@@ -357,91 +488,139 @@ def generer_csv_final(donnees_pays_complet, taux_annuels_eur_par_devise, annee_s
             if montant_indemnite is not None and taux_moyen_eur_d is not None:
                 try: montant_eur = round(float(montant_indemnite) / taux_moyen_eur_d, 2) 
                 except (ValueError, TypeError): montant_eur = "Erreur Calc."
-            ligne = [code_pays, nom_pays, date_validite, montant_indemnite if montant_indemnite is not None else "N/A", 
-                devise_indemnite, 
-                f"{taux_debut_eur_d:.6f}" if taux_debut_eur_d is not None else "N/A",
-                f"{taux_fin_eur_d:.6f}" if taux_fin_eur_d is not None else "N/A",
-                f"{taux_moyen_eur_d:.6f}" if taux_moyen_eur_d is not None else "N/A",
-                montant_eur if montant_eur is not None else "N/A"]; 
-            lignes_csv.append(ligne); lignes_ecrites_count +=1
+            lignes_bareme.append((code_pays, nom_pays, date_validite, montant_indemnite, devise_indemnite,
+                                  taux_debut_eur_d, taux_fin_eur_d, taux_moyen_eur_d, montant_eur))
+    return lignes_bareme
+
+@traces.trace("dgfip.csv_final")
+def generer_csv_final(donnees_pays_complet, taux_annuels_eur_par_devise, annee_str, nom_fichier_sortie):
+    """Écrit directement le CSV d'une année (sans passer par la base des barèmes)."""
+    print(f"\n--- Génération CSV: {nom_fichier_sortie} ---")
     try:
-        # ... (logique d'écriture du fichier CSV) ...
-        nom_fichier_sortie_complet = nom_fichier_sortie 
-        dossier_parent = os.path.dirname(nom_fichier_sortie_complet)
-        if dossier_parent and not os.path.exists(dossier_parent) and dossier_parent != ".": # Ne pas essayer de créer si dossier_parent est vide (cas racine)
-            os.makedirs(dossier_parent, exist_ok=True)
-        with open(nom_fichier_sortie_complet, 'w', newline='', encoding='utf-8-sig') as f_csv: 
-            writer = csv.writer(f_csv, delimiter=';'); writer.writerows(lignes_csv)
-        print(f"--- Fichier CSV '{nom_fichier_sortie_complet}' généré ({lignes_ecrites_count} lignes). Emplacement: {os.path.abspath(nom_fichier_sortie_complet)} ---")
-    except IOError as e: print(f"ERREUR écriture CSV '{nom_fichier_sortie_complet}': {e}")
-    except Exception as ex_csv: print(f"ERREUR INATTENDUE CSV: {ex_csv}"); import traceback; print(traceback.format_exc())
+        lignes_ecrites_count = baremes_dgfip.ecrire_csv(annee_str, lignes_bareme_annee(donnees_pays_complet, taux_annuels_eur_par_devise, annee_str), nom_fichier_sortie)
+        print(f"--- Fichier CSV '{nom_fichier_sortie}' généré ({lignes_ecrites_count} lignes). Emplacement: {os.path.abspath(nom_fichier_sortie)} ---")
+    except IOError as e: print(f"ERREUR écriture CSV '{nom_fichier_sortie}': {e}")
+
+@traces.trace("dgfip.modele")
+def construire_modele(contenu_webpays, contenu_webmiss, contenu_webtaux):
+    """
+    Lit une seule fois les trois fichiers DGFiP en un modèle indépendant de l'année :
+    pays (initiaux + Webpays), historique des barèmes par pays, historique des taux par devise.
+    """
+    pays = {k: {**v, "a": list(v.get("a", []))} for k, v in PAYS_INITIAUX_ET_CORRECTIONS.items()}
+    if contenu_webpays: pays = traiter_webpays(contenu_webpays, pays)
+    else: print("Échec téléchargement Webpays.")
+    if not contenu_webtaux: print("Échec téléchargement Webtaux.")
+    baremes, taux = lire_webmiss(contenu_webmiss), lire_webtaux(contenu_webtaux)
+    return {"pays": pays, "baremes": baremes, "taux": taux,
+            # Tables de recherche sur l'historique complet : elles valent pour toutes les années, les dates
+            # recherchées (jours de l'année traitée) étant toujours antérieures à la limite annee + 5 des projections
+            "tables_baremes": tables_historiques({code: entree["a"] for code, entree in baremes.items()}),
+            "tables_taux": tables_historiques(taux)}
+
+@traces.trace("dgfip.projection_annee")
+def projeter_annee(modele, annee_str, indemnites_manuelles_pour_annee=None):
+    """(barèmes par pays, historique des taux EUR/Devise) pour une année, à partir du modèle."""
+    donnees_pays = baremes_annee(modele["baremes"], modele["pays"], annee_str, indemnites_manuelles_pour_annee or {})
+    return donnees_pays, taux_annee(modele["taux"], annee_str)
+
+def tables_annee(modele, donnees_pays, indemnites_manuelles_pour_annee=None):
+    """
+    Tables de recherche (barèmes par pays, taux par devise) pour les données projetées d'une année : celles
+    du modèle, reconstruites pour les pays dont les barèmes ne viennent pas que de Webmiss (initiaux, manuels).
+    """
+    completes = {code for code, data in modele["pays"].items() if data.get("a")}
+    completes |= {MAPPING_CODES_DGFiP_VERS_STOCKAGE.get(code, code) for code in (indemnites_manuelles_pour_annee or {})}
+    tables_baremes = dict(modele["tables_baremes"])
+    for code in completes & donnees_pays.keys():
+        tables_baremes[code] = table_historique(donnees_pays[code]["a"])
+    return tables_baremes, modele["tables_taux"]
+
+def _annees_demandees(arguments):
+    """Années passées en argument ("2024", "2016-2025") ; par défaut l'année précédente et l'année en cours."""
+    if not arguments:
+        annee_actuelle = datetime.now().year
+        return [str(annee_actuelle - 1), str(annee_actuelle)]
+    annees = []
+    for argument in arguments:
+        debut, _, fin = argument.partition("-")
+        annees.extend(str(a) for a in range(int(debut), int(fin or debut) + 1))
+    return annees
 
 # ---
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Génère dgfip_indemnites_AAAA.csv à partir des fichiers de la DGFiP.")
+    parser.add_argument("annees", nargs="*", help="années ou plages (ex. 2024 2016-2025) ; défaut : année précédente et année en cours")
+    parser.add_argument("--quotidien", action="store_true",
+                        help="taux moyens et forfait Europe calculés sur chaque jour de l'année (défaut : début/fin d'année et 15 de chaque mois)")
+    arguments = parser.parse_args()
+    annees_a_traiter = _annees_demandees(arguments.annees)
     print("Automatisation DGFiP"); print("===================\n")
-    annee_actuelle_dt = datetime.now()
-    annees_a_traiter = [str(annee_actuelle_dt.year - 1), str(annee_actuelle_dt.year)] 
-    # annees_a_traiter = ["2024"] 
-
-    for annee_en_cours in annees_a_traiter:
-        print(f"\n\n************************************************************")
-        print(f"*** DÉBUT DU TRAITEMENT POUR L'ANNÉE : {annee_en_cours} ***")
-        print(f"************************************************************\n")
+
+    diagnostics = traces.nouveaux_diagnostics()
+    with traces.collecte(diagnostics):
+        # Les trois fichiers ne dépendent pas de l'année : un seul téléchargement (conditionnel) par exécution
+        sources = telechargement_dgfip.telecharger_sources({"Webpays": WEBPAYS_URL, "Webmiss": WEBMISS_URL, "Webtaux": WEBTAUX_URL})
+        # Chaque fichier est lu une fois ; chaque année n'est ensuite qu'une projection de ce modèle
+        modele = construire_modele(sources["Webpays"], sources["Webmiss"], sources["Webtaux"])
+        for annee_en_cours in annees_a_traiter:
+            print(f"\n\n************************************************************")
+            print(f"*** DÉBUT DU TRAITEMENT POUR L'ANNÉE : {annee_en_cours} ***")
+            print(f"************************************************************\n")
         
-        if annee_en_cours not in INDEMNITES_MANUELLES_SPECIFIQUES:
-            INDEMNITES_MANUELLES_SPECIFIQUES[annee_en_cours] = {}
-        indemnites_manuelles_pour_annee_courante = INDEMNITES_MANUELLES_SPECIFIQUES[annee_en_cours]
-
-        donnees_pays = {k: v.copy() for k, v in PAYS_INITIAUX_ET_CORRECTIONS.items()}
-        for code_p in donnees_pays:
-            if "a" not in donnees_pays[code_p]: donnees_pays[code_p]["a"] = []
-
-        contenu_webpays_txt = telecharger_fichier_dgfip(WEBPAYS_URL)
-        if contenu_webpays_txt: donnees_pays = traiter_webpays(contenu_webpays_txt, donnees_pays)
-        else: print("Échec téléchargement Webpays.")
-
-        if donnees_pays: 
-            contenu_webmiss_txt = telecharger_fichier_dgfip(WEBMISS_URL)
-            donnees_pays = traiter_webmiss(contenu_webmiss_txt, donnees_pays, annee_en_cours, indemnites_manuelles_pour_annee_courante)
-        else: print("Traitement Webmiss ignoré.")
-
-        contenu_webtaux_txt = telecharger_fichier_dgfip(WEBTAUX_URL)
-        donnees_taux_historique_eur_par_devise = {} # Contiendra des taux EUR/Devise
-        if contenu_webtaux_txt: donnees_taux_historique_eur_par_devise = traiter_webtaux(contenu_webtaux_txt, annee_en_cours)
-        else: print("Échec téléchargement Webtaux.")
+            if annee_en_cours not in INDEMNITES_MANUELLES_SPECIFIQUES:
+                INDEMNITES_MANUELLES_SPECIFIQUES[annee_en_cours] = {}
+            indemnites_manuelles_pour_annee_courante = INDEMNITES_MANUELLES_SPECIFIQUES[annee_en_cours]
+
+            donnees_pays, donnees_taux_historique_eur_par_devise = projeter_annee(modele, annee_en_cours, indemnites_manuelles_pour_annee_courante)
+            tables_baremes, tables_taux = tables_annee(modele, donnees_pays, indemnites_manuelles_pour_annee_courante)
         
-        taux_annuels_eur_par_devise = {} # Stockera des taux EUR/Devise
-        if donnees_taux_historique_eur_par_devise:
-            taux_annuels_eur_par_devise = calculer_taux_annuels(donnees_taux_historique_eur_par_devise, annee_en_cours)
-        else: print("Aucune donnée de taux historique pour calculer les taux annuels.")
-
-        forfait_europe_valeur_calculee = None
-        if donnees_pays and taux_annuels_eur_par_devise: 
-            forfait_europe_valeur_calculee = calculer_moyenne_indemnites_europe(donnees_pays, annee_en_cours, PAYS_EUROPE_POUR_MOYENNE, taux_annuels_eur_par_devise) # Passe les taux EUR/Devise
-            if forfait_europe_valeur_calculee is not None:
-                print(f"Application du forfait Europe calculé ({forfait_europe_valeur_calculee} EUR) aux pays cibles pour {annee_en_cours}...")
-                date_application_forfait = f"{annee_en_cours}-01-01" 
-                for code_pays_cible in PAYS_CIBLES_FORFAIT_MOYEN_EU:
-                    if code_pays_cible not in donnees_pays:
-                        donnees_pays[code_pays_cible] = {"n": PAYS_INITIAUX_ET_CORRECTIONS.get(code_pays_cible, {}).get("n", code_pays_cible), "a": []}
-                    print(f"  Application du forfait Europe à {code_pays_cible} ({donnees_pays[code_pays_cible].get('n', code_pays_cible)})")
-                    donnees_pays[code_pays_cible]["a"] = [[date_application_forfait, "EUR", forfait_europe_valeur_calculee]]
-            else: print(f"Forfait Europe non calculé pour {annee_en_cours}.")
+            taux_annuels_eur_par_devise = {} # Stockera des taux EUR/Devise
+            if donnees_taux_historique_eur_par_devise:
+                taux_annuels_eur_par_devise = calculer_taux_annuels(donnees_taux_historique_eur_par_devise, annee_en_cours, tables_taux, arguments.quotidien)
+            else: print("Aucune donnée de taux historique pour calculer les taux annuels.")
+
+            forfait_europe_valeur_calculee = None
+            if donnees_pays and taux_annuels_eur_par_devise: 
+                forfait_europe_valeur_calculee = calculer_moyenne_indemnites_europe(donnees_pays, annee_en_cours, PAYS_EUROPE_POUR_MOYENNE, taux_annuels_eur_par_devise,
+                                                                                    tables_baremes, arguments.quotidien)
+                if forfait_europe_valeur_calculee is not None:
+                    print(f"Application du forfait Europe calculé ({forfait_europe_valeur_calculee} EUR) aux pays cibles pour {annee_en_cours}...")
+                    date_application_forfait = f"{annee_en_cours}-01-01" 
+                    for code_pays_cible in PAYS_CIBLES_FORFAIT_MOYEN_EU:
+                        if code_pays_cible not in donnees_pays:
+                            donnees_pays[code_pays_cible] = {"n": PAYS_INITIAUX_ET_CORRECTIONS.get(code_pays_cible, {}).get("n", code_pays_cible), "a": []}
+                        print(f"  Application du forfait Europe à {code_pays_cible} ({donnees_pays[code_pays_cible].get('n', code_pays_cible)})")
+                        donnees_pays[code_pays_cible]["a"] = [[date_application_forfait, "EUR", forfait_europe_valeur_calculee]]
+                else: print(f"Forfait Europe non calculé pour {annee_en_cours}.")
         
-        if donnees_pays and taux_annuels_eur_par_devise: 
-            nom_base_csv = f"dgfip_indemnites_{annee_en_cours}.csv"
-            dossier_cible = "impot_calc"
-            nom_csv_final = os.path.join(dossier_cible, nom_base_csv)
-            if not os.path.exists(dossier_cible) and dossier_cible != ".":
-                try: os.makedirs(dossier_cible, exist_ok=True)
-                except OSError as e:
-                    print(f"Avert.: Impossible de créer dossier {dossier_cible}: {e}. CSV écrit localement.")
-                    dossier_cible = "." ; nom_csv_final = os.path.join(dossier_cible, nom_base_csv)
-            generer_csv_final(donnees_pays, taux_annuels_eur_par_devise, annee_en_cours, nom_csv_final)
-        else: print(f"\nImpossible de générer le CSV final pour {annee_en_cours}.")
-
-        if forfait_europe_valeur_calculee is not None:
-            print(f"\nVALEUR FINALE DU FORFAIT EUROPE MOYEN CALCULÉ POUR {annee_en_cours}: {forfait_europe_valeur_calculee:.2f} EUR")
-        else: print(f"\nAucun forfait Europe moyen n'a pu être calculé pour {annee_en_cours}.")
-        print(f"*** FIN DU TRAITEMENT POUR L'ANNÉE : {annee_en_cours} ***")
+            if donnees_pays and taux_annuels_eur_par_devise: 
+                nom_base_csv = f"dgfip_indemnites_{annee_en_cours}.csv"
+                dossier_cible = "impot_calc"
+                nom_csv_final = os.path.join(dossier_cible, nom_base_csv)
+                if not os.path.exists(dossier_cible) and dossier_cible != ".":
+                    try: os.makedirs(dossier_cible, exist_ok=True)
+                    except OSError as e:
+                        print(f"Avert.: Impossible de créer dossier {dossier_cible}: {e}. CSV écrit localement.")
+                        dossier_cible = "." ; nom_csv_final = os.path.join(dossier_cible, nom_base_csv)
+                # La base des barèmes (toutes années) est la sortie de référence ; le CSV de l'année en est un export.
+                # Chemin imposé par IMPOT_CALC_BAREMES : utilisé tel quel, comme par l'application ; sinon à côté des CSV.
+                chemin_base = baremes_dgfip.BASE_CONFIGUREE or os.path.join(dossier_cible, baremes_dgfip.CHEMIN_BASE)
+                with traces.etape("dgfip.base_baremes"):
+                    baremes_dgfip.ecrire_annee(annee_en_cours, lignes_bareme_annee(donnees_pays, taux_annuels_eur_par_devise, annee_en_cours),
+                                               source="DGFiP", chemin=chemin_base)
+                    nb_lignes = baremes_dgfip.exporter_csv(annee_en_cours, nom_csv_final, chemin=chemin_base)
+                print(f"--- Barèmes {annee_en_cours} enregistrés dans '{os.path.abspath(chemin_base)}' ; "
+                      f"export CSV '{nom_csv_final}' ({nb_lignes} lignes). ---")
+            else: print(f"\nImpossible de générer le CSV final pour {annee_en_cours}.")
+
+            if forfait_europe_valeur_calculee is not None:
+                print(f"\nVALEUR FINALE DU FORFAIT EUROPE MOYEN CALCULÉ POUR {annee_en_cours}: {forfait_europe_valeur_calculee:.2f} EUR")
+            else: print(f"\nAucun forfait Europe moyen n'a pu être calculé pour {annee_en_cours}.")
+            print(f"*** FIN DU TRAITEMENT POUR L'ANNÉE : {annee_en_cours} ***")
+    if diagnostics["etapes"]:
+        print("\nDurées par étape (IMPOT_CALC_TRACES=1) :")
+        for nom_etape, mesure in traces.resume(diagnostics)["etapes"].items():
+            print(f"  {nom_etape:<24} {mesure['duree_s']:>9.3f} s  ({mesure['appels']} appel(s))")
     print("\nFin du script DGFiP.")
@@ -1,40 +1,147 @@
 import streamlit as st
-import pdfplumber
 import re
 from datetime import date, timedelta, time, datetime 
 import pandas as pd 
+import numpy as np
 import os
+import sys
+import csv
+import pickle
+import hashlib
+import threading
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict, deque
+from extraction_pdf import extraire_documents
+from analyse_incrementale import cle_fichier, pages_document, stats_pages
+import cache_pdf
+import baremes_dgfip
+import traces
 
 BASES_FR = ["CDG", "ORY"]
 
-@st.cache_data 
-def load_airport_data_from_csv(csv_filepath):
-    airport_data_dict = {}
-    try:
-        df = pd.read_csv(csv_filepath, delimiter=';', dtype=str, keep_default_na=False)
+# Ordinal (date.toordinal) du 1970-01-01, pour convertir des datetime64[D] en ordinaux
+ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+
+# Version du parseur EP5 : à incrémenter pour invalider les résultats en cache
+VERSION_PARSEUR_EP5 = 4
+
+# Nombre d'identifiants de rotations récents gardés pour le dédoublonnage en flux
+TAILLE_FENETRE_DEDUP = 2048
+
+# Au-delà de cet écart entre la dernière arrivée d'une rotation restée ouverte en fin de mois et le premier
+# départ du mois suivant, la rotation est abandonnée plutôt que complétée par les vols d'une autre
+ECART_MAX_ROTATION_OUVERTE = timedelta(days=10)
+
+# Fiche aéroport compacte (chaînes internées, pas de dictionnaire par aéroport)
+Aeroport = namedtuple("Aeroport", ["ville", "pays", "nom_aeroport"])
+
+# Version du format de l'index binaire des aéroports : à incrémenter en cas de changement
+VERSION_INDEX_AEROPORTS = 1
+
+def _construire_index_aeroports(csv_filepath):
+    """Lit le CSV des aéroports en une passe (module csv) et retourne {IATA: (ville, pays, nom)}."""
+    index = {}
+    with open(csv_filepath, newline='', encoding='utf-8-sig') as f:
+        lecteur = csv.reader(f, delimiter=';')
+        entetes = next(lecteur, [])
         required_cols = ['iata_code', 'municipality', 'iso_country', 'name']
-        if any(col not in df.columns for col in required_cols):
+        if any(col not in entetes for col in required_cols):
             return {}
-        for _, row in df.iterrows():
-            iata = str(row.get('iata_code', '')).strip().upper()
+        i_iata, i_ville, i_pays, i_nom = (entetes.index(col) for col in required_cols)
+        largeur = len(entetes)
+        for row in lecteur:
+            if len(row) < largeur:
+                row = row + [''] * (largeur - len(row))
+            iata = row[i_iata].strip().upper()
             if iata:
-                airport_data_dict[iata] = {
-                    "ville": str(row.get('municipality', 'N/A')).strip(),
-                    "pays": str(row.get('iso_country', 'N/A')).strip(),
-                    "nom_aeroport": str(row.get('name', 'N/A')).strip()
-                }
-    except Exception:
+                index[sys.intern(iata)] = (sys.intern(row[i_ville].strip()), sys.intern(row[i_pays].strip()), row[i_nom].strip())
+    return index
+
+def load_airport_data_from_csv(csv_filepath):
+    """
+    Charge les aéroports indexés par code IATA. L'index est conservé dans un fichier binaire
+    à côté du CSV ("<csv>.idx") et n'est reconstruit que si le CSV a changé (date/taille, puis empreinte).
+    """
+    chemin_index = f"{csv_filepath}.idx"
+    try:
+        stat = os.stat(csv_filepath)
+    except OSError:
+        return {}
+    tampon = (stat.st_mtime_ns, stat.st_size)
+
+    index, empreinte_csv = None, None
+    try:
+        with open(chemin_index, 'rb') as f:
+            artefact = pickle.load(f)
+        if artefact.get("version") == VERSION_INDEX_AEROPORTS:
+            if artefact.get("tampon") == tampon:
+                index = artefact["index"]
+            else:
+                # Date modifiée (ex. checkout) : on ne reconstruit que si le contenu a changé
+                with open(csv_filepath, 'rb') as f:
+                    empreinte_csv = hashlib.sha256(f.read()).hexdigest()
+                if artefact.get("empreinte") == empreinte_csv:
+                    index = artefact["index"]
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
         pass
-    return airport_data_dict
+
+    if index is None:
+        try:
+            index = _construire_index_aeroports(csv_filepath)
+            with open(csv_filepath, 'rb') as f:
+                empreinte_csv = hashlib.sha256(f.read()).hexdigest()
+        except Exception:
+            return {}
+    if empreinte_csv is not None and index:
+        try:
+            temporaire = f"{chemin_index}.{os.getpid()}.tmp"
+            with open(temporaire, 'wb') as f:
+                pickle.dump({"version": VERSION_INDEX_AEROPORTS, "tampon": tampon, "empreinte": empreinte_csv, "index": index},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporaire, chemin_index)
+        except OSError:
+            pass  # Dossier en lecture seule : l'index sera reconstruit au prochain démarrage
+    return {iata: Aeroport._make(valeurs) for iata, valeurs in index.items()}
 
 AIRPORT_DATA = load_airport_data_from_csv("airport-codes.csv")
 if not AIRPORT_DATA:
     AIRPORT_DATA = { 
-        "CDG": {"ville": "Paris", "pays": "FR"}, "ORY": {"ville": "Paris", "pays": "FR"},
-        "JFK": {"ville": "New York", "pays": "US"}, "EWR": {"ville": "New York", "pays": "US"},
-        "YUL": {"ville": "Montreal", "pays": "CA"}, "LFW": {"ville": "Lome", "pays": "TG"},
+        "CDG": Aeroport("Paris", "FR", ""), "ORY": Aeroport("Paris", "FR", ""),
+        "JFK": Aeroport("New York", "US", ""), "EWR": Aeroport("New York", "US", ""),
+        "YUL": Aeroport("Montreal", "CA", ""), "LFW": Aeroport("Lome", "TG", ""),
     }
 
+def codes_dgfip_pour_escales(iata, ville, pays):
+    """Version vectorisée de get_dgfip_code_for_escale sur des Series alignées."""
+    regles = [
+        ((pays == "JP") & (ville == "Tokyo"), "TY"),
+        ((iata == "EWR") | ((pays == "US") & (ville == "New York")), "NY"),
+        (iata.isin(['YTZ', 'YKZ', 'YYZ']), "VT"),
+        (iata.isin(['CXH', 'YVR']), "VV"),
+        (iata == 'LFW', "VL"),
+        (iata.isin(["ABV", "LOS", "PHC"]), "NV"),
+    ]
+    codes = pays.copy()
+    # Appliquées de la dernière à la première : la première règle vérifiée l'emporte
+    for condition, code in reversed(regles):
+        codes = codes.mask(condition, code)
+    return codes
+
+@st.cache_resource
+def table_aeroports():
+    """
+    Aéroports (ville, pays, code DGFiP) indexés par IATA, construits une fois par processus
+    et partagés par toutes les sessions (lecture seule).
+    """
+    table = pd.DataFrame.from_dict(AIRPORT_DATA, orient="index", columns=list(Aeroport._fields))
+    table["code_dgfip"] = codes_dgfip_pour_escales(table.index.to_series(), table["ville"], table["pays"])
+    return table
+
+def prechauffer_donnees_reference(annees):
+    """Charge à l'avance les aéroports et les barèmes de `annees`, pour que la première analyse n'en paie pas le coût."""
+    table_aeroports()
+    charger_baremes(annees)
+
 def get_dgfip_code_for_escale(iata_code, ville, pays_iso):
     if pays_iso == "JP" and ville == "Tokyo": return "TY"
     if iata_code == 'EWR' or (pays_iso == "US" and ville == "New York"): return "NY"
@@ -44,33 +151,104 @@ def get_dgfip_code_for_escale(iata_code, ville, pays_iso):
     if iata_code in ["ABV", "LOS", "PHC"]: return "NV"
     return pays_iso
 
-@st.cache_data 
-def load_indemnity_data(annee_str):
-    nom_fichier = f"dgfip_indemnites_{annee_str}.csv"
-    if not os.path.exists(nom_fichier):
-        return {}, f"Fichier d'indemnités introuvable pour {annee_str}: {nom_fichier}"
-    
-    indemnities_data = {}
+# Barèmes partagés par toutes les sessions du processus : {(annee, révision): table en lecture seule}.
+# Contrairement à st.cache_data, aucune copie n'est faite à chaque accès.
+_BAREMES_PARTAGES = {}
+_VERROU_BAREMES = threading.Lock()
+
+def _partager(annee_str, revision, table):
+    """Range la table d'une année dans le registre (en remplaçant sa révision précédente) et la retourne."""
+    for cle in [cle for cle in _BAREMES_PARTAGES if cle[0] == annee_str]:
+        del _BAREMES_PARTAGES[cle]
+    _BAREMES_PARTAGES[(annee_str, revision)] = {
+        code: (tuple(ordinaux), tuple(montants)) for code, (ordinaux, montants) in table.items()}
+    return _BAREMES_PARTAGES[(annee_str, revision)]
+
+def _tables_partagees(annees, revisions):
+    """Tables des années demandées ; seules celles absentes du registre sont lues dans la base, en une requête."""
+    with _VERROU_BAREMES:
+        manquantes = [annee_str for annee_str in annees if (annee_str, revisions[annee_str]) not in _BAREMES_PARTAGES]
+        if manquantes:
+            for annee_str, table in baremes_dgfip.lire_tables(manquantes).items():
+                _partager(annee_str, revisions[annee_str], table)
+        return {annee_str: _BAREMES_PARTAGES[(annee_str, revisions[annee_str])] for annee_str in annees}
+
+def _table_csv_partagee(annee_str, nom_fichier):
+    """Table d'une année lue dans son CSV (base d'une autre version de schéma), partagée tant que le fichier ne change pas."""
+    revision = ("csv", os.path.getmtime(nom_fichier))
+    with _VERROU_BAREMES:
+        if (annee_str, revision) not in _BAREMES_PARTAGES:
+            _partager(annee_str, revision, baremes_dgfip.lire_table_csv(nom_fichier))
+        return _BAREMES_PARTAGES[(annee_str, revision)]
+
+def _charger_baremes_csv(annees):
+    """Repli sans la base (illisible, non modifiable ou d'une autre version de schéma) : lecture directe des CSV."""
+    resultats = {}
+    for annee_str in annees:
+        nom_fichier = baremes_dgfip.nom_csv(annee_str)
+        if not os.path.exists(nom_fichier):
+            resultats[annee_str] = ({}, f"Fichier d'indemnités introuvable pour {annee_str}: {nom_fichier}")
+            continue
+        try:
+            resultats[annee_str] = (_table_csv_partagee(annee_str, nom_fichier), f"Indemnités pour {annee_str} chargées.")
+        except Exception as e:
+            resultats[annee_str] = ({}, f"Erreur de lecture du fichier d'indemnités pour {annee_str}: {e}")
+    return resultats
+
+def charger_baremes(annees):
+    """
+    Charge les barèmes DGFiP de plusieurs années depuis la base (baremes_dgfip) :
+    {annee: ({code_dgfip: (dates de validité en ordinaux croissants, montants EUR)}, message)}.
+    Une année absente de la base, ou dont le CSV a été déposé depuis sa dernière mise à jour, y est
+    importée depuis dgfip_indemnites_AAAA.csv. Si la base est d'une autre version de schéma, illisible,
+    ou si l'import échoue (base en lecture seule, chemin non accessible), le CSV est lu directement.
+    Les tables sont partagées entre sessions : elles ne doivent pas être modifiées.
+    """
+    annees = sorted({str(annee) for annee in annees})
     try:
-        df = pd.read_csv(nom_fichier, delimiter=';')
-        for _, row in df.iterrows():
-            code_dgfip = str(row["Code Pays"]).strip().upper()
-            date_validite = datetime.strptime(str(row["Date Validité Barème"]).strip(), "%Y-%m-%d").date()
-            montant_eur = float(str(row["Montant Barème (EUR)"]).strip())
-            if code_dgfip not in indemnities_data: indemnities_data[code_dgfip] = []
-            indemnities_data[code_dgfip].append({"date_validite": date_validite, "montant_eur": montant_eur})
-        for code in indemnities_data:
-            indemnities_data[code].sort(key=lambda x: x["date_validite"], reverse=True)
-        return indemnities_data, f"Indemnités pour {annee_str} chargées."
-    except Exception as e:
-        return {}, f"Erreur de lecture du fichier d'indemnités pour {annee_str}: {e}"
+        if not baremes_dgfip.version_compatible():
+            return _charger_baremes_csv(annees)
+        etat = baremes_dgfip.etat_annees()
+    except Exception:
+        return _charger_baremes_csv(annees)
+    messages, repli = {}, []
+    for annee_str in annees:
+        nom_fichier = baremes_dgfip.nom_csv(annee_str)
+        if annee_str in etat and not baremes_dgfip.csv_plus_recent(annee_str, nom_fichier, etat):
+            continue
+        if not os.path.exists(nom_fichier):
+            messages[annee_str] = f"Fichier d'indemnités introuvable pour {annee_str}: {nom_fichier}"
+            continue
+        try:
+            baremes_dgfip.importer_csv(annee_str, nom_fichier)
+        except Exception:
+            repli.append(annee_str)
+    try:
+        revisions = baremes_dgfip.annees_disponibles()
+        presentes = tuple(annee_str for annee_str in annees
+                          if annee_str in revisions and annee_str not in messages and annee_str not in repli)
+        tables = _tables_partagees(presentes, revisions) if presentes else {}
+    except Exception:
+        repli += [annee_str for annee_str in annees if annee_str not in messages and annee_str not in repli]
+        tables = {}
+    resultats = {annee_str: (tables.get(annee_str, {}), messages.get(annee_str, f"Indemnités pour {annee_str} chargées."))
+                 for annee_str in annees}
+    resultats.update(_charger_baremes_csv(repli))
+    return resultats
+
+def load_indemnity_data(annee_str):
+    """
+    Charge le barème DGFiP d'une année sous forme de table de recherche :
+    {code_dgfip: (dates de validité en ordinaux croissants, montants EUR)}.
+    """
+    return charger_baremes([annee_str])[str(annee_str)]
 
 def find_applicable_indemnity(code_dgfip, target_date, indemnity_data):
+    """Montant du barème en vigueur à `target_date` (recherche dichotomique), 0.0 si aucun."""
     if not indemnity_data or code_dgfip not in indemnity_data: return 0.0
-    for bareme in indemnity_data[code_dgfip]:
-        if bareme["date_validite"] <= target_date:
-            return bareme["montant_eur"]
-    return 0.0
+    ordinaux, montants = indemnity_data[code_dgfip]
+    i = bisect_right(ordinaux, target_date.toordinal()) - 1
+    return montants[i] if i >= 0 else 0.0
 
 def convertir_ep5_heure_en_objet_temps(heure_ep5_str):
     try:
@@ -82,6 +260,13 @@ def convertir_ep5_heure_en_objet_temps(heure_ep5_str):
     except (ValueError, TypeError):
         return (0, 0)
 
+def calculer_horodatage(jour, heure_ep5_str):
+    """Date et heure EP5 (heures, centièmes d'heure) d'un départ ou d'une arrivée ; une heure hors 0-24 vaut minuit."""
+    heures, minutes = convertir_ep5_heure_en_objet_temps(heure_ep5_str)
+    if not 0 <= heures <= 24:
+        heures, minutes = 0, 0
+    return datetime(jour.year, jour.month, jour.day) + timedelta(hours=heures, minutes=minutes)
+
 def calculer_date_segment(jour_str, ref_annee, ref_mois, date_depart_ref=None):
     try:
         jour = int(jour_str)
@@ -108,140 +293,602 @@ pattern_ep5_line = re.compile(
     r"(\d{1,2}\.?\d{0,3})"   # Heure Arrivée
 )
 
-def analyser_page_ep5(texte_page, annee_base, mois_base, nom_fichier):
+# pattern_ep5_line appliquée à toute la page en un seul parcours (findall, sans boucle Python par ligne) :
+# « ^ » ancre en début de ligne et les blancs [^\S\n] ne franchissent pas un saut de ligne.
+_BLANC = r"[^\S\n]"
+pattern_ep5_page = re.compile(
+    pattern_ep5_line.pattern.replace(r"\s", _BLANC),
+    re.MULTILINE
+)
+
+def decouper_page_ep5(texte_page):
+    """
+    Colonnes des lignes de vol d'une page EP5, comme les groupes de pattern_ep5_line sur chaque ligne :
+    [(type, immat, vol, départ, jour, heure, arrivée, jour, heure), ...].
+    Une page sans « | » (page de garde, récapitulatif) est écartée sans expression régulière.
+    """
+    if "|" not in texte_page:
+        return []
+    return pattern_ep5_page.findall(texte_page)
+
+# Dates de vol partagées entre segments (une par jour) : setdefault restitue l'objet déjà connu
+_DATES = {}
+
+class Segment:
+    """
+    Segment de vol EP5 : attributs fixes (__slots__), sans dictionnaire par segment. Les chaînes qui
+    se répètent d'un segment à l'autre (avion, vol, aéroports) sont internées et les dates partagées.
+    `annee_pdf` : année du relevé (None pour une page analysée seule).
+    """
+    __slots__ = ("avion_type", "avion_immat", "vol", "dep_airport", "dep_date", "arr_airport", "arr_date",
+                 "dep_dt", "arr_dt", "nom_fichier", "annee_pdf")
+
+    def __init__(self, avion_type, avion_immat, vol, dep_airport, dep_date, arr_airport, arr_date,
+                 dep_dt, arr_dt, nom_fichier=None, annee_pdf=None):
+        self.avion_type = sys.intern(avion_type)
+        self.avion_immat = sys.intern(avion_immat)
+        self.vol = sys.intern(vol)
+        self.dep_airport = sys.intern(dep_airport)
+        self.dep_date = _DATES.setdefault(dep_date, dep_date)
+        self.arr_airport = sys.intern(arr_airport)
+        self.arr_date = _DATES.setdefault(arr_date, arr_date)
+        self.dep_dt = dep_dt
+        self.arr_dt = arr_dt
+        self.nom_fichier = nom_fichier
+        self.annee_pdf = annee_pdf
+
+    def __reduce__(self):
+        # Rechargement depuis le cache par le constructeur : chaînes internées et dates partagées
+        return (Segment, tuple(getattr(self, nom) for nom in self.__slots__))
+
+    def __repr__(self):
+        return (f"Segment({self.vol} {self.dep_airport} {self.dep_dt:%Y-%m-%d %H:%M} → "
+                f"{self.arr_airport} {self.arr_dt:%Y-%m-%d %H:%M}, {self.avion_type} {self.avion_immat})")
+
+class Rotation(tuple):
+    """Rotation complète : segments consécutifs d'une base française à une base française (tuple, sans réserve de liste)."""
+    __slots__ = ()
+
+    @property
+    def identifiant(self):
+        """(départ, retour, aéroport départ, aéroport arrivée) : une même rotation lue sur deux relevés."""
+        return (self[0].dep_date, self[-1].arr_date, self[0].dep_airport, self[-1].arr_airport)
+
+    @property
+    def annee_pdf(self):
+        return self[0].annee_pdf
+
+def iterer_segments_ep5(texte_page, annee_base, mois_base, nom_fichier, annee_pdf=None):
+    """Génère les segments d'une page EP5, triés par date et heure de départ."""
     segments = []
-    for ligne in texte_page.split('\n'):
-        match = pattern_ep5_line.search(ligne.strip())
-        if match:
-            try:
-                date_dep = calculer_date_segment(match.group(5), annee_base, mois_base)
-                if not date_dep: continue
-                date_arr = calculer_date_segment(match.group(8), annee_base, mois_base, date_depart_ref=date_dep)
-                if not date_arr: continue
-                
-                segments.append({
-                    'avion_type': match.group(1), 'avion_immat': match.group(2),
-                    'dep_airport': match.group(4), 'dep_date': date_dep,
-                    'arr_airport': match.group(7), 'arr_date': date_arr,
-                    'nom_fichier': nom_fichier
-                })
-            except Exception:
-                continue
-    segments.sort(key=lambda s: s['dep_date'])
-    
-    rotations, rotation_en_cours = [], []
+    for colonnes in decouper_page_ep5(texte_page):
+        try:
+            avion_type, avion_immat, vol, dep_airport, jour_dep, heure_dep, arr_airport, jour_arr, heure_arr = colonnes
+            date_dep = calculer_date_segment(jour_dep, annee_base, mois_base)
+            if not date_dep: continue
+            date_arr = calculer_date_segment(jour_arr, annee_base, mois_base, date_depart_ref=date_dep)
+            if not date_arr: continue
+            
+            segments.append(Segment(
+                avion_type, avion_immat, vol, dep_airport, date_dep, arr_airport, date_arr,
+                calculer_horodatage(date_dep, heure_dep), calculer_horodatage(date_arr, heure_arr),
+                nom_fichier, annee_pdf
+            ))
+        except Exception:
+            continue
+    segments.sort(key=lambda s: s.dep_dt)
+    yield from segments
+
+def cle_segment(seg):
+    """Identifiant d'un segment, pour écarter un même vol présent dans deux relevés."""
+    return (seg.dep_date, seg.vol, seg.dep_airport, seg.arr_airport)
+
+def iterer_rotations(segments, rotation_en_cours=None):
+    """
+    Regroupe un flux de segments en rotations complètes (départ et retour sur une base française).
+    `rotation_en_cours` permet de reprendre une rotation restée ouverte (fin de page, de fichier ou de mois) ;
+    elle est complétée en place. Une rotation ne se ferme qu'au retour sur une base : les rotations
+    « open-jaw » (arrivée JFK, départ EWR) sont conservées.
+    """
+    if rotation_en_cours is None:
+        rotation_en_cours = []
     for seg in segments:
         rotation_en_cours.append(seg)
-        if seg['arr_airport'] in BASES_FR:
-            if rotation_en_cours[0]['dep_airport'] in BASES_FR:
-                rotations.append(list(rotation_en_cours))
-            rotation_en_cours = []
-    return rotations
+        if seg.arr_airport in BASES_FR:
+            if rotation_en_cours[0].dep_airport in BASES_FR:
+                yield Rotation(rotation_en_cours)
+            del rotation_en_cours[:]
 
-def analyse_missions(uploaded_files):
-    toutes_rotations_brutes = []
-    indemnity_data_par_annee = {}
-    warnings = []
-    # --- NOUVEAU : Set pour compter les mois uniques ---
-    mois_uniques_ep5 = set()
+def analyser_page_ep5(texte_page, annee_base, mois_base, nom_fichier):
+    return list(iterer_rotations(iterer_segments_ep5(texte_page, annee_base, mois_base, nom_fichier)))
+
+class AssembleurRotations:
+    """
+    Assemble les rotations au fil des relevés EP5 mensuels, classés par mois (MM-YYYY du fichier).
+    La rotation ouverte à la fin d'un mois est reprise au mois suivant, ce qui reconstitue les
+    rotations à cheval sur deux fichiers (départ le 30, retour le 2). Elle est abandonnée si le mois
+    suivant manque (voir _rompre_si_discontinu).
+    Les segments de chaque mois sont conservés : l'ajout d'un mois antérieur au dernier mois assemblé
+    ne relance que l'assemblage à partir de ce mois, sans relire les PDF.
+    Avec `conserver=False` (analyse en une fois, mois fournis dans l'ordre), les segments, les rotations
+    et les points de reprise d'un mois sont libérés dès qu'il est assemblé : la mémoire ne croît plus avec
+    le nombre de mois, mais un mois antérieur au dernier assemblé ne peut plus être ajouté ni retiré.
+    """
+
+    def __init__(self, conserver=True):
+        self.conserver = conserver
+        self.segments_par_mois = {}   # (annee, mois) -> segments triés par date et heure de départ
+        self.rotations = []           # rotations complètes, dans l'ordre d'assemblage
+        self._mois_assembles = []     # mois déjà assemblés, ordre chronologique
+        self._reprises = {}           # (annee, mois) -> état avant ce mois : (nb rotations, rotation ouverte, clés récentes)
+        self._rotation_en_cours = []
+        self._cles_recentes = deque(maxlen=256)
+        self.reconstruit = False      # le dernier ajout a-t-il fait recalculer des rotations déjà produites ?
+
+    def ajouter_segments(self, annee, mois, segments):
+        """
+        Intègre les segments d'un relevé du mois (annee, mois) et retourne les rotations complétées
+        depuis le point de reprise. Si ce mois précède un mois déjà assemblé, les rotations suivantes
+        sont recalculées et `reconstruit` passe à True.
+        """
+        cle_mois = (annee, mois)
+        self.segments_par_mois[cle_mois] = self._fusionner(self.segments_par_mois.get(cle_mois, []), segments)
+        return self._assembler_depuis(cle_mois)
+
+    def remplacer_segments(self, annee, mois, segments):
+        """Remplace tous les segments d'un mois (aucun : le mois est oublié) et réassemble à partir de ce mois."""
+        cle_mois = (annee, mois)
+        if segments:
+            self.segments_par_mois[cle_mois] = self._fusionner([], segments)
+        elif self.segments_par_mois.pop(cle_mois, None) is None:
+            self.reconstruit = False
+            return []
+        return self._assembler_depuis(cle_mois)
 
+    def retirer_mois(self, annee, mois):
+        """Oublie les segments d'un mois et réassemble les mois suivants. Retourne les rotations recalculées."""
+        return self.remplacer_segments(annee, mois, [])
+
+    @staticmethod
+    def _fusionner(existants, segments):
+        vus = {cle_segment(seg) for seg in existants}
+        nouveaux = []
+        for seg in segments:
+            cle = cle_segment(seg)
+            if cle not in vus:
+                vus.add(cle)
+                nouveaux.append(seg)
+        return sorted(existants + nouveaux, key=lambda s: s.dep_dt)
+
+    def _assembler_depuis(self, cle_mois):
+        self.reconstruit = bool(self._mois_assembles) and cle_mois <= self._mois_assembles[-1]
+        if not self.conserver:
+            if self.reconstruit:
+                raise ValueError(f"Mois {cle_mois[1]:02d}-{cle_mois[0]} antérieur au dernier mois assemblé : "
+                                 "ses voisins n'ont pas été conservés (AssembleurRotations(conserver=False)).")
+            del self.rotations[:]  # déjà retournées à l'appel précédent
+        if self.reconstruit:
+            # Mois déjà assemblé ou antérieur : retour à l'état d'avant le premier mois concerné
+            premier = next(m for m in self._mois_assembles if m >= cle_mois)
+            nb_rotations, rotation_ouverte, cles = self._reprises[premier]
+            del self.rotations[nb_rotations:]
+            self._rotation_en_cours = list(rotation_ouverte)
+            self._cles_recentes = deque(cles, maxlen=self._cles_recentes.maxlen)
+            self._mois_assembles = [m for m in self._mois_assembles if m < premier]
+        debut = len(self.rotations)
+        for m in sorted(m for m in self.segments_par_mois if not self._mois_assembles or m > self._mois_assembles[-1]):
+            if self.conserver:
+                self._reprises[m] = (len(self.rotations), list(self._rotation_en_cours), tuple(self._cles_recentes))
+            self._rompre_si_discontinu(m)
+            self.rotations.extend(iterer_rotations(self._sans_doublons(self.segments_par_mois[m]), self._rotation_en_cours))
+            self._mois_assembles.append(m)
+            if not self.conserver:
+                del self.segments_par_mois[m]
+                del self._mois_assembles[:-1]
+        for m in list(self._reprises):
+            if m not in self.segments_par_mois:
+                del self._reprises[m]
+        return self.rotations[debut:]
+
+    def _rompre_si_discontinu(self, cle_mois):
+        """
+        Abandonne la rotation ouverte si `cle_mois` ne suit pas directement le dernier mois assemblé
+        (relevé intermédiaire non téléversé) ou si son premier vol part plus de ECART_MAX_ROTATION_OUVERTE
+        après la dernière arrivée. Le point de reprise du mois la conserve : si le mois manquant est
+        ajouté ensuite, le réassemblage la complète normalement.
+        """
+        if not self._rotation_en_cours or not self._mois_assembles:
+            return
+        annee, mois = self._mois_assembles[-1]
+        segments = self.segments_par_mois[cle_mois]
+        if (cle_mois != (annee + mois // 12, mois % 12 + 1)
+                or (segments and segments[0].dep_dt - self._rotation_en_cours[-1].arr_dt > ECART_MAX_ROTATION_OUVERTE)):
+            del self._rotation_en_cours[:]
+
+    def _sans_doublons(self, segments):
+        # Un vol de fin de mois peut figurer sur deux relevés consécutifs
+        for seg in segments:
+            cle = cle_segment(seg)
+            if cle in self._cles_recentes:
+                continue
+            self._cles_recentes.append(cle)
+            yield seg
+
+def dedupliquer_rotations(rotations, fenetre, taille_fenetre=TAILLE_FENETRE_DEDUP):
+    """
+    Écarte les rotations déjà vues, identifiées par (départ, retour, aéroport départ, aéroport arrivée).
+    `fenetre` (OrderedDict partagé entre appels) ne garde que les `taille_fenetre` identifiants les plus récents,
+    ce qui suffit pour les doublons entre relevés de mois voisins et borne la mémoire.
+    """
+    for rot in rotations:
+        id_rot = rot.identifiant
+        if id_rot in fenetre:
+            fenetre.move_to_end(id_rot)
+            continue
+        fenetre[id_rot] = None
+        if len(fenetre) > taille_fenetre:
+            fenetre.popitem(last=False)
+        yield rot
+
+class IndexSegments:
+    """
+    Index temporel des segments des rotations retenues, en colonnes NumPy : départ et arrivée
+    (datetime64[m]), type d'avion et immatriculation codés dans l'ordre de première apparition.
+    Les segments sont ajoutés par lots ; le tri chronologique (heure de départ, puis ordre d'ajout)
+    est fait à la première requête qui suit un ajout.
+    """
+    CATEGORIES = ("avion_type", "avion_immat")
+
+    def __init__(self):
+        self.valeurs = {categorie: {} for categorie in self.CATEGORIES}   # catégorie -> {valeur: code}
+        self._lots = []
+        self._colonnes = None
+
+    def __len__(self):
+        return len(self._trie()["depart"])
+
+    def ajouter(self, segments):
+        segments = list(segments)
+        if not segments:
+            return
+        lot = {
+            "depart": np.array([seg.dep_dt for seg in segments], dtype="datetime64[m]"),
+            "arrivee": np.array([seg.arr_dt for seg in segments], dtype="datetime64[m]"),
+        }
+        for categorie, codes in self.valeurs.items():
+            lot[categorie] = np.array([codes.setdefault(getattr(seg, categorie), len(codes)) for seg in segments], dtype=np.int32)
+        self._lots.append(lot)
+        self._colonnes = None
+
+    def _trie(self):
+        if self._colonnes is None:
+            if not self._lots:
+                self._colonnes = {"depart": np.array([], dtype="datetime64[m]"), "arrivee": np.array([], dtype="datetime64[m]"),
+                                  **{categorie: np.array([], dtype=np.int32) for categorie in self.CATEGORIES}}
+            else:
+                colonnes = {nom: np.concatenate([lot[nom] for lot in self._lots]) for nom in self._lots[0]}
+                ordre = np.argsort(colonnes["depart"], kind="stable")
+                self._colonnes = {nom: valeurs[ordre] for nom, valeurs in colonnes.items()}
+                self._lots = [self._colonnes]
+        return self._colonnes
+
+    def heures_de_vol(self, debut=None, fin=None):
+        """Temps de vol (heures) des segments partis dans [debut, fin), dans l'ordre chronologique ; une arrivée avant le départ compte 0."""
+        colonnes = self._trie()
+        tranche = self._tranche(debut, fin)
+        minutes = (colonnes["arrivee"][tranche] - colonnes["depart"][tranche]).astype(np.int64)
+        return np.maximum(minutes, 0) / 60.0
+
+    def _tranche(self, debut, fin):
+        departs = self._trie()["depart"]
+        i = 0 if debut is None else np.searchsorted(departs, np.datetime64(debut, "m"), side="left")
+        j = len(departs) if fin is None else np.searchsorted(departs, np.datetime64(fin, "m"), side="left")
+        return slice(i, j)
+
+    def par_categorie(self, categorie):
+        """(valeurs dans l'ordre de première apparition, nombre de segments, heures de vol) pour `categorie`."""
+        codes = self._trie()[categorie]
+        valeurs = list(self.valeurs[categorie])
+        return (valeurs, np.bincount(codes, minlength=len(valeurs)),
+                np.bincount(codes, weights=self.heures_de_vol(), minlength=len(valeurs)))
+
+    def par_mois(self):
+        """(mois de départ en datetime64[M] croissants, nombre de segments, heures de vol)."""
+        mois = self._trie()["depart"].astype("datetime64[M]")
+        mois_uniques, codes = np.unique(mois, return_inverse=True)
+        return (mois_uniques, np.bincount(codes, minlength=len(mois_uniques)),
+                np.bincount(codes, weights=self.heures_de_vol(), minlength=len(mois_uniques)))
+
+def analyser_pages_ep5(pages, annee_base, mois_base, nom_fichier):
+    """Segments de toutes les pages EP5 d'un fichier, chacun annoté de l'année du PDF."""
+    segments = []
+    annee_str = str(annee_base)
+    for texte in pages:
+        texte = texte or ""
+        if "EP5" in texte.upper():
+            segments.extend(iterer_segments_ep5(texte, annee_base, mois_base, nom_fichier, annee_str))
+    return segments
+
+def table_baremes(indemnity_data_par_annee):
+    """Barèmes de plusieurs années en une table (annee, code, ordinal, montant) triée par date."""
+    lignes = [
+        (annee, code, ordinal, montant)
+        for annee, indemnity_data in indemnity_data_par_annee.items() if indemnity_data
+        for code, (ordinaux, montants) in indemnity_data.items()
+        for ordinal, montant in zip(ordinaux, montants)
+    ]
+    table = pd.DataFrame(lignes, columns=["annee", "code", "ordinal", "montant"])
+    return table.astype({"ordinal": "int64", "montant": "float64"}).sort_values("ordinal", kind="stable")
+
+def construire_frame_rotations(rotations):
+    """Décrit chaque rotation sur une ligne : départ, retour, année du PDF, itinéraire et escale principale."""
+    colonnes = {"date_depart": [], "date_retour": [], "horodatage_depart": [], "annee": [], "itineraire": [], "escale": []}
+    for rot in rotations:
+        itineraire_aeroports = [rot[0].dep_airport] + [s.arr_airport for s in rot]
+        escale_principale_iata = None
+        if len(itineraire_aeroports) > 1 and itineraire_aeroports[0] in BASES_FR:
+            escales_hors_base = [a for a in itineraire_aeroports if a not in BASES_FR]
+            if escales_hors_base:
+                escale_principale_iata = escales_hors_base[0]
+        colonnes["date_depart"].append(rot[0].dep_date)
+        colonnes["date_retour"].append(rot[-1].arr_date)
+        colonnes["horodatage_depart"].append(rot[0].dep_dt)
+        colonnes["annee"].append(rot.annee_pdf)
+        colonnes["itineraire"].append(" → ".join(dict.fromkeys(itineraire_aeroports)))
+        colonnes["escale"].append(escale_principale_iata)
+    frame = pd.DataFrame(colonnes)
+    frame["date_depart"] = pd.to_datetime(frame["date_depart"])
+    frame["date_retour"] = pd.to_datetime(frame["date_retour"])
+    frame["horodatage_depart"] = pd.to_datetime(frame["horodatage_depart"])
+    return frame
+
+def tarifer_rotations(frame, indemnity_data_par_annee):
+    """
+    Calcule les indemnités de toutes les rotations en une fois : jointure sur les aéroports,
+    codes DGFiP vectorisés et jointure « as-of » sur la table des barèmes de chaque année.
+    Retourne le tableau des rotations avec des colonnes numériques.
+    """
+    duree = (frame["date_retour"] - frame["date_depart"]).dt.days + 1
+    infos = frame[["escale"]].join(table_aeroports()[["ville", "pays", "code_dgfip"]], on="escale")
+
+    annees_avec_bareme = [annee for annee, data in indemnity_data_par_annee.items() if data]
+    tarifables = infos["escale"].notna() & infos["pays"].notna() & frame["annee"].isin(annees_avec_bareme)
+
+    indemnite_journaliere = pd.Series(0.0, index=frame.index)
+    escale_affichage = pd.Series("En base / Vol local", index=frame.index)
+    if tarifables.any():
+        a_tarifer = infos[tarifables]
+        requetes = pd.DataFrame({
+            "annee": frame.loc[tarifables, "annee"],
+            "code": a_tarifer["code_dgfip"],
+            "ordinal": frame.loc[tarifables, "date_depart"].values.astype("datetime64[D]").astype("int64") + ORDINAL_EPOCH,
+        })
+        requetes["position"] = requetes.index
+        tarifs = pd.merge_asof(requetes.sort_values("ordinal", kind="stable"), table_baremes(indemnity_data_par_annee),
+                               on="ordinal", by=["annee", "code"], direction="backward")
+        indemnite_journaliere.loc[tarifs["position"]] = tarifs["montant"].fillna(0.0).values
+        escale_affichage[tarifables] = a_tarifer["ville"] + " (" + a_tarifer["pays"] + ")"
+
+    return pd.DataFrame({
+        "Mois Départ": frame["date_depart"].dt.strftime("%B %Y"),
+        "Jour Dép.": frame["date_depart"].dt.day,
+        "Jour Ret.": frame["date_retour"].dt.day,
+        "Itinéraire Global": frame["itineraire"],
+        "Escale Principale": escale_affichage,
+        "Indemnité/jour Réf. (EUR)": indemnite_journaliere,
+        "Durée (j)": duree,
+        "Indemnité Tot. (EUR)": indemnite_journaliere * duree,
+    })
+
+def nouveau_contexte_missions(conserver_segments=True):
+    """
+    État d'analyse EP5, accumulé par iter_analyse_missions au fil des fichiers et réutilisable
+    d'un téléversement à l'autre (un enregistrement par fichier, indexé par empreinte).
+    Avec `conserver_segments=False` (analyse en une fois : analyse_missions, traitement par lot), les
+    segments de chaque mois sont libérés une fois tarifés ; il ne reste que les lignes tarifées et l'index
+    des segments, et le contexte ne peut plus recevoir de mois antérieurs ni retirer de relevés.
+    """
+    return {
+        "fichiers": {},
+        "messages_baremes": {},
+        "indemnity_data_par_annee": {},
+        "conserver_segments": conserver_segments,
+        "assembleur": AssembleurRotations(conserver=conserver_segments),
+        "lignes": [],
+        "fenetre_dedup": OrderedDict(),
+        "index_segments": IndexSegments(),
+        "annee_predominante": None,
+        "total_indemnites": 0.0,
+        "diagnostics": traces.nouveaux_diagnostics(),
+    }
+
+def _tarifer_nouvelles_rotations(rotations, contexte):
+    """Dédoublonne et tarife des rotations fraîchement assemblées ; None s'il n'y a rien de nouveau."""
+    rotations_uniques = list(dedupliquer_rotations(rotations, contexte["fenetre_dedup"]))
+    if not rotations_uniques:
+        return None
+    contexte["index_segments"].ajouter(seg for rot in rotations_uniques for seg in rot)
+    for rot in rotations_uniques:
+        annee_rot = rot.annee_pdf or "N/A"
+        if contexte["annee_predominante"] is None or annee_rot > contexte["annee_predominante"]:
+            contexte["annee_predominante"] = annee_rot
+
+    # Tarification en colonnes : une passe pour décrire les rotations, puis calcul vectoriel
+    with traces.etape("tarification"):
+        frame = construire_frame_rotations(rotations_uniques)
+        lignes = tarifer_rotations(frame, contexte["indemnity_data_par_annee"])
+        lignes.index = pd.Index(frame["horodatage_depart"])
+    contexte["total_indemnites"] += sum(lignes["Indemnité Tot. (EUR)"].tolist())
+    contexte["lignes"].append(lignes)
+    return lignes
+
+def _retarifer_tout(contexte):
+    """Après un réassemblage, repart de toutes les rotations de l'assembleur (sans relire de PDF)."""
+    contexte.update(lignes=[], fenetre_dedup=OrderedDict(), index_segments=IndexSegments(),
+                    annee_predominante=None, total_indemnites=0.0)
+    return _tarifer_nouvelles_rotations(contexte["assembleur"].rotations, contexte)
+
+def _integrer_mois(contexte, mois, segments):
+    assembleur = contexte["assembleur"]
+    rotations = assembleur.ajouter_segments(*mois, segments)
+    if assembleur.reconstruit:
+        return _retarifer_tout(contexte)
+    return _tarifer_nouvelles_rotations(rotations, contexte)
+
+def iter_analyse_missions(uploaded_files, contexte):
+    """
+    Pipeline EP5 en flux : pages → segments → rotations → lignes tarifées.
+    Seuls les fichiers fournis sont lus ; ils sont traités dans l'ordre de leur mois (MM-YYYY) et leurs
+    rotations prolongent celles déjà assemblées dans `contexte` (voir nouveau_contexte_missions).
+    Produit, mois par mois dès que ses relevés sont lus, ((annee, mois), DataFrame des rotations
+    nouvellement tarifées, indexé par date et heure de départ).
+    """
+    indemnity_data_par_annee = contexte["indemnity_data_par_annee"]
+    fichiers_dates = []
     for f in uploaded_files:
+        enregistrement = {"nom": f.name, "mois": None, "segments": [], "erreur": None}
+        contexte["fichiers"][cle_fichier(f)] = enregistrement
         annee_fichier_base, mois_fichier_base = 0, 0
         match_date = re.search(r"(\d{2})[_-]?(\d{4})", f.name) # MM-YYYY
         if match_date:
             mois_fichier_base, annee_fichier_base = int(match_date.group(1)), int(match_date.group(2))
-            # --- NOUVEAU : On ajoute le tuple (année, mois) au set ---
-            mois_uniques_ep5.add((annee_fichier_base, mois_fichier_base))
+            enregistrement["mois"] = (annee_fichier_base, mois_fichier_base)
         else:
-            warnings.append(f"Format de date non reconnu dans '{f.name}'.")
             continue
         
-        annee_str = str(annee_fichier_base)
+        fichiers_dates.append((f, enregistrement))
 
-        if annee_str not in indemnity_data_par_annee:
-            data, msg = load_indemnity_data(annee_str)
-            indemnity_data_par_annee[annee_str] = data
-            warnings.append(msg)
-        
-        try:
-            with pdfplumber.open(f) as pdf:
-                for page in pdf.pages:
-                    texte = page.extract_text() or ""
-                    if "EP5" in texte.upper():
-                        rotations_page = analyser_page_ep5(texte, annee_fichier_base, mois_fichier_base, f.name)
-                        for rot in rotations_page:
-                            for seg in rot:
-                                seg["Année_PDF"] = annee_str
-                        toutes_rotations_brutes.extend(rotations_page)
-        except Exception as e:
-            warnings.append(f"Erreur d'analyse du PDF {f.name}: {e}")
+    # Barèmes des années manquantes, lus ensemble dans la base (une rotation à cheval sur deux années
+    # trouve ainsi ses deux barèmes sans second chargement)
+    annees_manquantes = {str(e["mois"][0]) for _, e in fichiers_dates} - set(indemnity_data_par_annee)
+    if annees_manquantes:
+        with traces.etape("baremes"):
+            for annee_str, (data, msg) in charger_baremes(annees_manquantes).items():
+                indemnity_data_par_annee[annee_str] = data
+                contexte["messages_baremes"][annee_str] = msg
 
-    if not toutes_rotations_brutes:
-        return {"has_results": False, "warnings": warnings, "mois_trouves": mois_uniques_ep5}
+    # Ordre chronologique des relevés, nécessaire pour prolonger les rotations d'un mois à l'autre
+    fichiers_dates.sort(key=lambda fe: fe[1]["mois"])
+    enregistrements = [e for _, e in fichiers_dates]
+    documents = extraire_documents([f for f, _ in fichiers_dates], filtre="EP5")
 
-    rotations_uniques, vus = [], set()
-    for rot in toutes_rotations_brutes:
-        id_rot = (rot[0]['dep_date'], rot[-1]['arr_date'], rot[0]['dep_airport'], rot[-1]['arr_airport'])
-        if id_rot not in vus:
-            rotations_uniques.append(rot)
-            vus.add(id_rot)
-    rotations_uniques.sort(key=lambda r: r[0]['dep_date'])
+    # Extraction parallèle du texte, résultats restitués dans l'ordre des fichiers.
+    # Les pages sans la mention EP5 sont écartées avant l'extraction complète.
+    mois_en_cours, segments_mois = None, []
+    for enregistrement, document in zip(enregistrements, documents):
+        if mois_en_cours is not None and mois_en_cours != enregistrement["mois"]:
+            lignes = _integrer_mois(contexte, mois_en_cours, segments_mois)
+            if lignes is not None:
+                yield mois_en_cours, lignes
+            segments_mois = []
+        mois_en_cours = enregistrement["mois"]
+        annee_fichier_base, mois_fichier_base = mois_en_cours
 
-    donnees_tableau = []
-    total_indemnites_general = 0.0
-    all_segments = [seg for rot in rotations_uniques for seg in rot]
+        enregistrement["pages"] = pages_document(document)
+        cle = cache_pdf.cle_cache(document["empreinte"], VERSION_PARSEUR_EP5, annee_fichier_base, mois_fichier_base)
+        segments_fichier = cache_pdf.lire("ep5", cle) if document["erreur"] is None else None
+        if segments_fichier is None:
+            with traces.etape("regex", fichier=document["nom"]):
+                segments_fichier = analyser_pages_ep5(document["pages"], annee_fichier_base, mois_fichier_base, document["nom"])
+            if document["erreur"] is None:
+                cache_pdf.ecrire("ep5", cle, segments_fichier)
+        else:
+            for seg in segments_fichier:
+                seg.nom_fichier = document["nom"]
+        enregistrement["erreur"] = document["erreur"]
+        if contexte["conserver_segments"]:
+            enregistrement["segments"] = segments_fichier
+        segments_mois.extend(segments_fichier)
 
-    for rot in rotations_uniques:
-        date_depart, date_retour = rot[0]['dep_date'], rot[-1]['arr_date']
-        duree = (date_retour - date_depart).days + 1
-        annee_rot = rot[0].get("Année_PDF")
-        
-        itineraire_aeroports = [rot[0]['dep_airport']] + [s['arr_airport'] for s in rot]
-        itineraire_str = " → ".join(dict.fromkeys(itineraire_aeroports))
-        
-        indemnity_data_annee = indemnity_data_par_annee.get(annee_rot, {})
-        
-        escale_principale_iata = None
-        if len(itineraire_aeroports) > 1 and itineraire_aeroports[0] in BASES_FR:
-            escales_hors_base = [a for a in itineraire_aeroports if a not in BASES_FR]
-            if escales_hors_base:
-                escale_principale_iata = escales_hors_base[0]
+    if mois_en_cours is not None:
+        lignes = _integrer_mois(contexte, mois_en_cours, segments_mois)
+        if lignes is not None:
+            yield mois_en_cours, lignes
 
-        total_indemnites_rotation, indemnite_journaliere = 0.0, 0.0
-        escale_affichage = "En base / Vol local"
-
-        if escale_principale_iata and indemnity_data_annee and AIRPORT_DATA:
-            airport_info = AIRPORT_DATA.get(escale_principale_iata, {})
-            if airport_info:
-                code_recherche = get_dgfip_code_for_escale(escale_principale_iata, airport_info.get("ville"), airport_info.get("pays"))
-                indemnite_journaliere = find_applicable_indemnity(code_recherche, date_depart, indemnity_data_annee)
-                total_indemnites_rotation = indemnite_journaliere * duree
-                escale_affichage = f"{airport_info.get('ville')} ({airport_info.get('pays')})"
-
-        donnees_tableau.append({
-            "Mois Départ": date_depart.strftime("%B %Y"), "Jour Dép.": date_depart.day, "Jour Ret.": date_retour.day,
-            "Itinéraire Global": itineraire_str, "Escale Principale": escale_affichage,
-            "Indemnité/jour Réf. (EUR)": f"{indemnite_journaliere:.2f}",
-            "Durée (j)": duree, "Indemnité Tot. (EUR)": f"{total_indemnites_rotation:.2f}"
-        })
-        total_indemnites_general += total_indemnites_rotation
+def ajouter_missions(contexte, uploaded_files):
+    """Analyse uniquement les relevés EP5 fournis et les intègre au contexte."""
+    with traces.collecte(contexte["diagnostics"]):
+        for _ in iter_analyse_missions(uploaded_files, contexte):
+            pass
+    return contexte
+
+def retirer_missions(contexte, empreintes):
+    """Retire des relevés du contexte ; les mois concernés sont réassemblés à partir des segments restants."""
+    if not contexte["conserver_segments"]:
+        raise ValueError("Contexte EP5 sans segments conservés (analyse en une fois) : aucun relevé ne peut en être retiré.")
+    mois_touches = set()
+    for empreinte in empreintes:
+        enregistrement = contexte["fichiers"].pop(empreinte, None)
+        if enregistrement:
+            traces.oublier_fichiers(contexte["diagnostics"], [enregistrement["nom"]])
+            if enregistrement["mois"]:
+                mois_touches.add(enregistrement["mois"])
+    if not mois_touches:
+        return contexte
+    with traces.collecte(contexte["diagnostics"]):
+        for mois in sorted(mois_touches):
+            segments = [seg for e in contexte["fichiers"].values() if e["mois"] == mois for seg in e["segments"]]
+            contexte["assembleur"].remplacer_segments(*mois, segments)
+        _retarifer_tout(contexte)
+    return contexte
+
+def _stats_vers_df(index_segments, categorie, libelle):
+    """Segments et heures de vol par valeur de `categorie`, triés par nombre décroissant (ordre d'apparition à égalité)."""
+    valeurs, nombres, heures = index_segments.par_categorie(categorie)
+    frame = pd.DataFrame({libelle: valeurs, "Nombre de Segments": nombres.astype("int64"), "Heures de vol": heures.round(2)})
+    return frame.sort_values("Nombre de Segments", ascending=False, kind="stable").reset_index(drop=True)
 
-    df_rotations = pd.DataFrame(donnees_tableau)
-    
-    df_types, df_immats = pd.DataFrame(), pd.DataFrame()
-    if all_segments:
-        df_types = pd.DataFrame(pd.Series(s['avion_type'] for s in all_segments).value_counts()).reset_index().rename(columns={'index': 'Type Avion', 0: 'Nombre de Segments'})
-        df_immats = pd.DataFrame(pd.Series(s['avion_immat'] for s in all_segments).value_counts()).reset_index().rename(columns={'index': 'Immatriculation', 0: 'Nombre de Segments'})
+def _heures_par_mois_df(index_segments):
+    mois, nombres, heures = index_segments.par_mois()
+    return pd.DataFrame({"Mois": pd.to_datetime(mois).strftime("%B %Y"), "Nombre de Segments": nombres.astype("int64"),
+                         "Heures de vol": heures.round(2)})
 
-    annee_predom = max([r[0].get("Année_PDF", "N/A") for r in rotations_uniques], default="N/A")
+def synthese_missions(contexte):
+    """Résultat de l'analyse EP5 à partir du contexte accumulé (sans relire de PDF), avec ses diagnostics."""
+    with traces.collecte(contexte["diagnostics"]), traces.etape("dataframe"):
+        resultat = _construire_synthese(contexte)
+    resultat["diagnostics"] = traces.resume(contexte["diagnostics"])
+    return resultat
+
+def _construire_synthese(contexte):
+    # Message de barème : avertissement si l'année n'a pas de barème, simple information sinon
+    warnings, informations, annees_annoncees = [], [], set()
+    mois_uniques_ep5 = set()
+    for enregistrement in contexte["fichiers"].values():
+        if enregistrement["mois"] is None:
+            warnings.append(f"Format de date non reconnu dans '{enregistrement['nom']}'.")
+            continue
+        mois_uniques_ep5.add(enregistrement["mois"])
+        annee_str = str(enregistrement["mois"][0])
+        if annee_str not in annees_annoncees and annee_str in contexte["messages_baremes"]:
+            bareme_charge = bool(contexte["indemnity_data_par_annee"].get(annee_str))
+            (informations if bareme_charge else warnings).append(contexte["messages_baremes"][annee_str])
+            annees_annoncees.add(annee_str)
+    for enregistrement in sorted(contexte["fichiers"].values(), key=lambda e: e["mois"] or (0, 0)):
+        if enregistrement["erreur"]:
+            warnings.append(f"Erreur d'analyse du PDF {enregistrement['nom']}: {enregistrement['erreur']}")
+
+    if not contexte["lignes"]:
+        return {"has_results": False, "warnings": warnings, "informations": informations, "mois_trouves": mois_uniques_ep5,
+                "stats_pages": stats_pages(contexte)}
+
+    # Tri stable par date et heure de départ : à égalité, l'ordre de lecture est conservé
+    df_rotations = pd.concat(contexte["lignes"]).sort_index(kind="stable").reset_index(drop=True)
+    total_indemnites_general = sum(df_rotations["Indemnité Tot. (EUR)"].tolist())
 
     return {
         "has_results": True,
         "rotations_df": df_rotations,
-        "stats_avions_type_df": df_types,
-        "stats_avions_immat_df": df_immats,
+        "stats_avions_type_df": _stats_vers_df(contexte["index_segments"], "avion_type", 'Type Avion'),
+        "stats_avions_immat_df": _stats_vers_df(contexte["index_segments"], "avion_immat", 'Immatriculation'),
+        "stats_heures_mois_df": _heures_par_mois_df(contexte["index_segments"]),
         "total_indemnites": total_indemnites_general,
-        "annee_predominante": annee_predom,
+        "annee_predominante": contexte["annee_predominante"] or "N/A",
         "warnings": warnings,
-        "mois_trouves": mois_uniques_ep5
+        "informations": informations,
+        "mois_trouves": mois_uniques_ep5,
+        "stats_pages": stats_pages(contexte)
     }
+
+def analyse_missions(uploaded_files):
+    return synthese_missions(ajouter_missions(nouveau_contexte_missions(conserver_segments=False), uploaded_files))
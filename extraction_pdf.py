@@ -0,0 +1,404 @@
+import os
+import io
+import time
+import atexit
+import threading
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+from pdfminer.pdfdevice import PDFDevice
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfminer.pdffont import PDFUnicodeNotDefined
+import cache_pdf
+import traces
+
+# Version du format des textes extraits : à incrémenter pour invalider le cache
+VERSION_EXTRACTION = 2
+
+# Nombre de pages confiées à un même worker lorsqu'un document est découpé
+PAGES_PAR_TACHE = 4
+
+# Le flux brut d'une page coûte environ 1/60 d'un extract_text() (benchmarks/bench_prefiltre.py). Après
+# PAGES_AVANT_SUSPENSION pages consécutives contenant le marqueur, le pré-filtre est suspendu et le marqueur
+# est cherché dans le texte extrait ; la première page sans marqueur le rétablit. Une page extraite pour
+# rien pendant la suspension ne coûte ainsi pas plus que le pré-filtre sur la série qui l'a précédée.
+# Séries par marqueur, propres à chaque processus.
+PAGES_AVANT_SUSPENSION = 64
+_series_avec_marqueur = {}
+
+_pool = None
+_pool_taille = 0
+_verrou_pool = threading.Lock()
+
+
+def nombre_workers():
+    """Taille du pool d'extraction (variable IMPOT_CALC_WORKERS, sinon nombre de cœurs, max 4)."""
+    try:
+        n = int(os.environ.get("IMPOT_CALC_WORKERS", "0"))
+    except ValueError:
+        n = 0
+    return n if n > 0 else min(4, os.cpu_count() or 1)
+
+
+def nom_fichier(fichier):
+    """Nom affichable d'un fichier téléversé (UploadedFile) ou d'un chemin."""
+    nom = getattr(fichier, "name", None)
+    return os.path.basename(nom) if nom else os.path.basename(str(fichier))
+
+
+def lire_octets(fichier):
+    """Contenu binaire d'un UploadedFile, d'un flux ouvert ou d'un chemin."""
+    if hasattr(fichier, "getvalue"):
+        return fichier.getvalue()
+    if hasattr(fichier, "read"):
+        fichier.seek(0)
+        return fichier.read()
+    with open(fichier, "rb") as f:
+        return f.read()
+
+
+class FluxMemoire(io.RawIOBase):
+    """
+    Flux en lecture seule sur un tampon (bytes, memoryview, mémoire partagée), pour pdfplumber.
+    io.BytesIO copierait le tampon ; ici seuls les blocs lus par pdfminer sont copiés.
+    """
+
+    def __init__(self, tampon):
+        super().__init__()
+        self._vue = memoryview(tampon).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, position, origine=io.SEEK_SET):
+        if origine == io.SEEK_CUR:
+            position += self._position
+        elif origine == io.SEEK_END:
+            position += len(self._vue)
+        if position < 0:
+            raise ValueError("position négative")
+        self._position = position
+        return position
+
+    def read(self, taille=-1):
+        fin = len(self._vue) if taille is None or taille < 0 else min(len(self._vue), self._position + taille)
+        debut, self._position = self._position, max(self._position, fin)
+        return self._vue[debut:fin].tobytes()
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, tampon):
+        donnees = self.read(len(tampon))
+        tampon[:len(donnees)] = donnees
+        return len(donnees)
+
+    def close(self):
+        if not self.closed:
+            self._vue.release()  # la mémoire partagée ne peut être fermée tant qu'une vue existe
+        super().close()
+
+
+# Empreintes des fichiers téléversés déjà calculées, par identifiant d'upload (UploadedFile.file_id) :
+# à chaque rerun Streamlit recrée les UploadedFile, mais un même upload n'est haché qu'une fois
+# (partagé entre le script et les analyses en arrière-plan : accès sous _verrou_empreintes)
+_EMPREINTES = OrderedDict()
+TAILLE_EMPREINTES = 4096
+_verrou_empreintes = threading.Lock()
+
+
+def empreinte_fichier(fichier, contenu=None):
+    """Empreinte SHA-256 du contenu d'un fichier, calculée une seule fois par upload (ou par objet)."""
+    identifiant = getattr(fichier, "file_id", None)
+    if identifiant is not None:
+        with _verrou_empreintes:
+            empreinte = _EMPREINTES.get(identifiant)
+            if empreinte is not None:
+                _EMPREINTES.move_to_end(identifiant)
+                return empreinte
+    empreinte = getattr(fichier, "_empreinte_pdf", None)
+    if empreinte is None:
+        empreinte = cache_pdf.empreinte(lire_octets(fichier) if contenu is None else contenu)
+        try:
+            fichier._empreinte_pdf = empreinte
+        except AttributeError:
+            pass  # chemin (str) : rien où la mémoriser
+    if identifiant is not None:
+        with _verrou_empreintes:
+            _EMPREINTES[identifiant] = empreinte
+            if len(_EMPREINTES) > TAILLE_EMPREINTES:
+                _EMPREINTES.popitem(last=False)
+    return empreinte
+
+
+class DocumentPdf:
+    """
+    PDF à analyser : vue (memoryview) sur le tampon du fichier téléversé, sans copie, et empreinte
+    calculée une seule fois. Pour les workers, le contenu est placé une fois en mémoire partagée
+    (vers_memoire_partagee) au lieu d'être sérialisé à chaque tâche.
+    """
+    __slots__ = ("nom", "contenu", "empreinte", "_memoire")
+
+    def __init__(self, fichier):
+        self.nom = nom_fichier(fichier)
+        # getvalue() d'un UploadedFile renvoie son tampon sans copie ; memoryview n'en fait pas non plus
+        self.contenu = memoryview(lire_octets(fichier))
+        self.empreinte = empreinte_fichier(fichier, self.contenu)
+        self._memoire = None
+
+    def flux(self):
+        return FluxMemoire(self.contenu)
+
+    def vers_memoire_partagee(self):
+        """(nom du segment, taille) du contenu copié une fois en mémoire partagée, lisible par les workers."""
+        if self._memoire is None:
+            self._memoire = shared_memory.SharedMemory(create=True, size=max(1, len(self.contenu)))
+            self._memoire.buf[:len(self.contenu)] = self.contenu
+        return self._memoire.name, len(self.contenu)
+
+    def liberer(self):
+        """Libère le contenu et le segment de mémoire partagée éventuel."""
+        if self._memoire is not None:
+            self._memoire.close()
+            self._memoire.unlink()
+            self._memoire = None
+        self.contenu.release()
+
+
+def _get_pool(taille):
+    global _pool, _pool_taille
+    with _verrou_pool:  # plusieurs analyses de fond peuvent démarrer en même temps
+        if _pool is None or _pool_taille != taille:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # "spawn" : les workers ne doivent pas hériter des threads de Streamlit
+            _pool = ProcessPoolExecutor(max_workers=taille, mp_context=multiprocessing.get_context("spawn"))
+            _pool_taille = taille
+        return _pool
+
+
+@atexit.register
+def _fermer_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _compter_pages(contenu):
+    with FluxMemoire(contenu) as flux, pdfplumber.open(flux) as pdf:
+        return len(pdf.pages)
+
+
+class _CollecteurTexteBrut(PDFDevice):
+    """Périphérique pdfminer qui ne garde que les caractères, sans calcul de mise en page."""
+
+    def __init__(self, rsrcmgr):
+        super().__init__(rsrcmgr)
+        self.caracteres = []
+
+    def render_string(self, textstate, seq, ncs, graphicstate):
+        font = textstate.font
+        for obj in seq:
+            if isinstance(obj, bytes):
+                for cid in font.decode(obj):
+                    try:
+                        self.caracteres.append(font.to_unichr(cid))
+                    except PDFUnicodeNotDefined:
+                        pass
+
+
+def texte_brut_page(pdf, page):
+    """Flux brut des caractères d'une page, bien moins coûteux que extract_text()."""
+    collecteur = _CollecteurTexteBrut(pdf.rsrcmgr)
+    PDFPageInterpreter(pdf.rsrcmgr, collecteur).process_page(page.page_obj)
+    return "".join(collecteur.caracteres)
+
+
+def page_pertinente(pdf, page, filtre):
+    """
+    Pré-filtre : la page contient-elle le marqueur `filtre` (majuscules, sans espaces) ?
+    En cas de doute (erreur de décodage), la page est considérée comme pertinente.
+    """
+    try:
+        brut = texte_brut_page(pdf, page)
+    except Exception:
+        return True
+    return filtre in "".join(brut.split()).upper()
+
+
+def prefiltre_selectif(filtre):
+    """Le pré-filtre sur le flux brut est-il appliqué pour ce marqueur (voir PAGES_AVANT_SUSPENSION) ?"""
+    return _series_avec_marqueur.get(filtre, 0) < PAGES_AVANT_SUSPENSION
+
+
+def _noter_pertinence(filtre, pertinente):
+    _series_avec_marqueur[filtre] = _series_avec_marqueur.get(filtre, 0) + 1 if pertinente else 0
+
+
+def _extraire_pages(contenu, debut=0, fin=None, arret=None, filtre=None):
+    """
+    Extrait le texte des pages [debut, fin) d'un PDF. Exécuté dans un worker.
+    Si `filtre` est fourni, les pages qui ne contiennent pas ce marqueur ont pour texte None : tant que le
+    marqueur est sélectif (prefiltre_selectif), elles sont écartées sur leur flux brut sans passer par
+    extract_text() (pages ignorées) ; sinon le marqueur est cherché dans le texte extrait.
+    Si `arret` (regex compilée) est fourni, s'arrête après la première page qui y correspond.
+    Retourne (textes, erreur, statistiques : pages extraites / ignorées, durée).
+    """
+    debut_chrono = time.perf_counter()
+    textes = []
+    stats = {"pages_extraites": 0, "pages_ignorees": 0, "duree_extraction_s": 0.0}
+    try:
+        with FluxMemoire(contenu) as flux, pdfplumber.open(flux) as pdf:
+            for page in pdf.pages[debut:fin]:
+                prefiltrer = filtre is not None and prefiltre_selectif(filtre)
+                if prefiltrer:
+                    pertinente = page_pertinente(pdf, page, filtre)
+                    _noter_pertinence(filtre, pertinente)
+                    if not pertinente:
+                        textes.append(None)
+                        stats["pages_ignorees"] += 1
+                        continue
+                texte = page.extract_text()
+                stats["pages_extraites"] += 1
+                if filtre is not None and not prefiltrer:
+                    # Sans le marqueur dans le texte extrait, la page est jugée sur son flux brut comme avec le pré-filtre
+                    pertinente = filtre in "".join((texte or "").split()).upper() or page_pertinente(pdf, page, filtre)
+                    _noter_pertinence(filtre, pertinente)
+                    if not pertinente:
+                        texte = None
+                textes.append(texte)
+                if arret is not None and texte and arret.search(texte):
+                    break
+    except Exception as e:
+        stats["duree_extraction_s"] = time.perf_counter() - debut_chrono
+        return textes, str(e), stats
+    stats["duree_extraction_s"] = time.perf_counter() - debut_chrono
+    return textes, None, stats
+
+
+def _extraire_pages_partagees(nom_memoire, taille, debut=0, fin=None, arret=None, filtre=None):
+    """_extraire_pages sur un PDF placé en mémoire partagée par le processus principal (aucune copie du PDF)."""
+    memoire = shared_memory.SharedMemory(name=nom_memoire)
+    vue = memoire.buf[:taille]
+    try:
+        return _extraire_pages(vue, debut, fin, arret, filtre)
+    finally:
+        vue.release()
+        memoire.close()
+
+
+def _liberer(pdf, futures):
+    """Libère un PDF une fois ses tâches terminées ou annulées (un worker peut encore lire sa mémoire partagée)."""
+    for future in futures:
+        if not future.cancel():
+            future.exception()
+    pdf.liberer()
+
+
+def extraire_documents(fichiers, pages_max=None, arret=None, filtre=None, max_workers=None):
+    """
+    Extrait le texte de plusieurs PDF en parallèle sur un pool de processus.
+
+    Générateur : produit pour chaque fichier, dans l'ordre d'entrée, un dictionnaire
+    {"nom", "empreinte", "pages": [texte, ...], "erreur", "pages_extraites", "pages_ignorees", "duree_extraction_s"}
+    dès que ses pages sont disponibles. Les textes déjà extraits d'un contenu identique
+    sont relus depuis le cache disque (aucune page comptée).
+    - pages_max : ne lit que les N premières pages (1 pour les bulletins de paie).
+    - arret : regex compilée ; la lecture d'un document s'arrête à la première page correspondante.
+    - filtre : marqueur recherché dans chaque page (ex. "EP5") ; les autres pages ont pour texte None
+      et, tant que le marqueur est sélectif, sont écartées sur leur flux brut sans extract_text().
+    """
+    documents = []
+    for f in fichiers:
+        document = {"nom": nom_fichier(f), "empreinte": None, "pages": None, "erreur": None,
+                    "pages_extraites": 0, "pages_ignorees": 0, "duree_extraction_s": 0.0, "pdf": None}
+        try:
+            document["pdf"] = DocumentPdf(f)
+        except Exception as e:
+            document["erreur"] = str(e)
+        else:
+            document["empreinte"] = document["pdf"].empreinte
+            document["cle"] = cache_pdf.cle_cache(document["empreinte"], VERSION_EXTRACTION, pdfplumber.__version__,
+                                                  pages_max, arret.pattern if arret is not None else None, filtre)
+            document["pages"] = cache_pdf.lire("textes", document["cle"])
+        documents.append(document)
+
+    a_extraire = [d for d in documents if d["erreur"] is None and d["pages"] is None]
+    taille = max_workers or nombre_workers()
+    sequentiel = taille <= 1 or len(a_extraire) <= 1 and (pages_max == 1 or arret is not None)
+
+    try:
+        taches = {}
+        if not sequentiel:
+            pool = _get_pool(taille)
+            # Peu de fichiers pour beaucoup de workers : on découpe aussi par pages.
+            # Le découpage est impossible quand la lecture s'arrête sur une page (arret).
+            decouper = len(a_extraire) < taille and arret is None and pages_max != 1
+            for document in a_extraire:
+                pdf = document["pdf"]
+                nb_pages = None
+                if decouper:
+                    try:
+                        nb_pages = _compter_pages(pdf.contenu)
+                    except Exception as e:
+                        document["erreur"] = str(e)
+                        continue
+                    if pages_max is not None:
+                        nb_pages = min(nb_pages, pages_max)
+                # Le PDF est placé une fois en mémoire partagée : chaque tâche ne transmet que son nom
+                nom_memoire, taille_pdf = pdf.vers_memoire_partagee()
+                if nb_pages is None or nb_pages <= PAGES_PAR_TACHE:
+                    taches[id(document)] = [pool.submit(_extraire_pages_partagees, nom_memoire, taille_pdf, 0, pages_max, arret, filtre)]
+                else:
+                    taches[id(document)] = [pool.submit(_extraire_pages_partagees, nom_memoire, taille_pdf, d,
+                                                        min(d + PAGES_PAR_TACHE, nb_pages), None, filtre)
+                                            for d in range(0, nb_pages, PAGES_PAR_TACHE)]
+
+        for document in documents:
+            pdf = document.pop("pdf")
+            if document["erreur"] is None and document["pages"] is None:
+                if sequentiel:
+                    pages, erreur, stats = _extraire_pages(pdf.contenu, 0, pages_max, arret, filtre)
+                    document.update(stats)
+                else:
+                    pages, erreur = [], None
+                    for future in taches[id(document)]:
+                        try:
+                            textes, erreur_bloc, stats = future.result()
+                        except Exception as e:
+                            textes, erreur_bloc, stats = [], str(e), {}
+                        pages.extend(textes)
+                        for compteur, valeur in stats.items():
+                            document[compteur] += valeur
+                        if erreur_bloc:
+                            erreur = erreur_bloc
+                            break
+                document["pages"], document["erreur"] = pages, erreur
+                if erreur is None:
+                    cache_pdf.ecrire("textes", document["cle"], pages)
+            if pdf is not None:
+                _liberer(pdf, taches.get(id(document), ()))
+            document.pop("cle", None)
+            if document["pages"] is None:
+                document["pages"] = []
+            if traces.actives():
+                # Durée mesurée dans le worker : somme des blocs de pages, hors attente dans la file du pool
+                traces.duree("extract_text", document["duree_extraction_s"], fichier=document["nom"])
+                traces.fichier(document["nom"], pages_extraites=document["pages_extraites"], pages_ignorees=document["pages_ignorees"])
+                traces.compter("pages_extraites", document["pages_extraites"])
+                traces.compter("pages_ignorees", document["pages_ignorees"])
+            yield document
+    finally:
+        # Générateur abandonné avant la fin : aucun segment de mémoire partagée ne doit survivre
+        for document in documents:
+            pdf = document.pop("pdf", None)
+            if pdf is not None:
+                _liberer(pdf, taches.get(id(document), ()))
@@ -1,17 +1,35 @@
+import os
+import threading
+import importlib
+from datetime import date
 import streamlit as st
-from paie_app import analyse_bulletins
-from ep5_app import analyse_missions
-from attestation_app import analyse_attestation_nuitees
-import pandas as pd
+
+# Les analyseurs (pdfplumber, pandas, données de référence) ne sont importés qu'à la première utilisation
+# de leur menu : l'écran d'accueil s'affiche sans les charger (voir benchmarks/bench_demarrage.py).
 
 # --- Configuration de la page ---
 st.set_page_config(page_title="Impôt Calc ✨", page_icon="✈️", layout="wide")
 
+# --- Préchargement des données de référence (une fois par processus) ---
+PRECHAUFFAGE = os.environ.get("IMPOT_CALC_PRECHAUFFAGE", "1") != "0"
+
+def _prechauffer(annees):
+    from ep5_app import prechauffer_donnees_reference
+    prechauffer_donnees_reference(annees)
+
+@st.cache_resource
+def demarrer_prechauffage():
+    """Importe ep5_app et charge en tâche de fond les aéroports et les barèmes de l'année en cours et de la précédente."""
+    annee = date.today().year
+    fil = threading.Thread(target=_prechauffer, args=([annee - 1, annee],), name="prechauffage", daemon=True)
+    fil.start()
+    return fil
+
 # --- Fonctions utilitaires ---
 @st.cache_data
 def convert_df_to_csv(df):
-    """Convertit un DataFrame en CSV (UTF-8 avec BOM) pour le téléchargement."""
-    return df.to_csv(index=False, sep=';').encode('utf-8-sig')
+    """Convertit un DataFrame en CSV (UTF-8 avec BOM) pour le téléchargement, montants à 2 décimales."""
+    return df.to_csv(index=False, sep=';', float_format='%.2f').encode('utf-8-sig')
 
 # --- NOUVELLE FONCTION D'AFFICHAGE DU BILAN ---
 def afficher_bilan_mensuel(res_dict, type_doc):
@@ -45,6 +63,68 @@ def afficher_bilan_mensuel(res_dict, type_doc):
             mois_manquants_str = ", ".join([noms_mois[m-1] for m in mois_manquants_nums])
             st.error(f"**Mois manquants :** {mois_manquants_str}")
 
+def afficher_diagnostics(res_dict):
+    """Panneau Diagnostics : durée par étape, par fichier, pages traitées et accès au cache."""
+    import pandas as pd  # déjà chargé par l'analyseur qui a produit les mesures
+    diagnostics = res_dict.get("diagnostics") if res_dict else None
+    with st.expander("🔎 Diagnostics", expanded=False):
+        if not diagnostics or not (diagnostics["etapes"] or diagnostics["fichiers"]):
+            st.info("Aucune mesure : relancez l'analyse avec les diagnostics activés.")
+            return
+        st.write("**Durée par étape :**")
+        st.dataframe(pd.DataFrame([{"Étape": nom, "Durée (s)": e["duree_s"], "Appels": e["appels"]}
+                                   for nom, e in diagnostics["etapes"].items()]), hide_index=True, use_container_width=True)
+        if diagnostics["fichiers"]:
+            st.write("**Par fichier :**")
+            df_fichiers = pd.DataFrame.from_dict(diagnostics["fichiers"], orient="index").rename_axis("Fichier").reset_index()
+            st.dataframe(df_fichiers, hide_index=True, use_container_width=True)
+        if diagnostics["compteurs"]:
+            st.write("**Pages et cache :**")
+            st.dataframe(pd.DataFrame(list(diagnostics["compteurs"].items()), columns=["Compteur", "Valeur"]),
+                         hide_index=True, use_container_width=True)
+
+# --- Analyses en tâche de fond (analyse_fond) ---
+# Une analyse plus courte (fichiers déjà en cache) s'affiche directement, sans barre de progression
+DELAI_AFFICHAGE_DIRECT_S = 0.3
+
+def total_provisoire(menu, res):
+    if menu == 'paie':
+        return res.get("total_general", 0.0)
+    if menu == 'ep5':
+        return res.get("total_indemnites", 0.0)
+    return sum(res.get("resultats", {}).values())
+
+def publier_tache(menu):
+    """Reporte dans la session le résultat d'une tâche terminée, une seule fois ; retourne True si c'est fait."""
+    import analyse_fond
+    tache = st.session_state.get(f"tache_{menu}")
+    if tache is None or tache["publiee"] or not analyse_fond.terminee(tache):
+        return False
+    tache["publiee"] = True
+    if tache["resultat"] is not None:
+        st.session_state[ANALYSEURS[menu][1]] = tache["resultat"]
+    return True
+
+@st.fragment(run_every=0.5)
+def suivre_analyse(menu):
+    """Progression de l'analyse en cours (fichiers traités, mois trouvés, total provisoire), rafraîchie seule."""
+    tache = st.session_state.get(f"tache_{menu}")
+    if tache is None or tache["publiee"]:
+        return
+    if publier_tache(menu):
+        st.rerun()
+    progression = tache["progression"]
+    texte = f"Analyse en cours : {progression['faits']}/{progression['total']} fichier(s)"
+    if progression["fichier"]:
+        texte += f" — {progression['fichier']}"
+    st.progress(progression["faits"] / progression["total"] if progression["total"] else 0.0, text=texte + " ⏳")
+    partiel = tache["partiel"]
+    if partiel:
+        details = [f"total provisoire {total_provisoire(menu, partiel):.2f} €"]
+        if "mois_trouves" in partiel:
+            details.insert(0, f"{len(partiel['mois_trouves'])} mois trouvé(s)")
+        st.caption("Résultats partiels : " + ", ".join(details))
+
 # --- Initialisation de l'état de la session ---
 if 'menu_actif' not in st.session_state:
     st.session_state.menu_actif = None
@@ -57,6 +137,21 @@ if 'resultats_attestation' not in st.session_state:
 if 'show_synthese' not in st.session_state:
     st.session_state.show_synthese = False
 
+# État d'analyse par menu, conservé entre deux téléversements : seuls les fichiers ajoutés sont analysés.
+# (clé d'état, clé de résultats, module, (nouvel_etat, ajouter, retirer, synthese)) ; le module est importé
+# et l'état créé à la première analyse du menu.
+ANALYSEURS = {
+    'paie': ('etat_paie', 'resultats_paie', 'paie_app', ('nouvel_etat_paie', 'ajouter_bulletins', 'retirer_bulletins', 'synthese_bulletins')),
+    'ep5': ('etat_ep5', 'resultats_ep5', 'ep5_app', ('nouveau_contexte_missions', 'ajouter_missions', 'retirer_missions', 'synthese_missions')),
+    'attestation': ('etat_attestation', 'resultats_attestation', 'attestation_app', ('nouvel_etat_attestations', 'ajouter_attestations', 'retirer_attestations', 'synthese_attestations')),
+}
+
+def fonctions_analyseur(menu):
+    """(nouvel_etat, ajouter, retirer, synthese) du menu, en important son module au premier appel."""
+    _, _, nom_module, noms = ANALYSEURS[menu]
+    module = importlib.import_module(nom_module)
+    return tuple(getattr(module, nom) for nom in noms)
+
 # --- Fonctions de navigation ---
 def activer_menu(menu):
     st.session_state.menu_actif = menu
@@ -81,6 +176,7 @@ with col_gauche:
     st.markdown("---")
     st.write("**2. Obtenir le résumé final**")
     st.button("SYNTHESE ANNUELLE", on_click=activer_synthese, use_container_width=True, type="primary")
+    st.checkbox("🔎 Diagnostics", key="diagnostics", help="Mesure la durée de chaque étape des prochaines analyses.")
     st.markdown("---")
     
     fichiers_analyses = None
@@ -102,13 +198,23 @@ with col_droite:
     st.header("📈 Résultats")
 
     if fichiers_analyses:
-        with st.spinner(f"Analyse de {len(fichiers_analyses)} fichier(s)... ⏳"):
-            if st.session_state.menu_actif == 'paie':
-                st.session_state.resultats_paie = analyse_bulletins(fichiers_analyses)
-            elif st.session_state.menu_actif == 'ep5':
-                st.session_state.resultats_ep5 = analyse_missions(fichiers_analyses)
-            elif st.session_state.menu_actif == 'attestation':
-                st.session_state.resultats_attestation = analyse_attestation_nuitees(fichiers_analyses)
+        import analyse_fond
+        menu = st.session_state.menu_actif
+        cle_etat, cle_resultats, _, _ = ANALYSEURS[menu]
+        nouvel_etat, ajouter, retirer, synthese = fonctions_analyseur(menu)
+        if cle_etat not in st.session_state:
+            st.session_state[cle_etat] = nouvel_etat()
+        # Même liste de fichiers qu'au rendu précédent : la tâche existante est reprise, pas relancée
+        tache = analyse_fond.soumettre(st.session_state.get(f"tache_{menu}"), st.session_state[cle_etat], fichiers_analyses,
+                                       ajouter, retirer, synthese, diagnostics=st.session_state.diagnostics,
+                                       forcer_synthese=st.session_state[cle_resultats] is None)
+        st.session_state[f"tache_{menu}"] = tache
+        analyse_fond.attendre(tache, DELAI_AFFICHAGE_DIRECT_S)
+        publier_tache(menu)
+        if not tache["publiee"]:
+            suivre_analyse(menu)
+        if tache["publiee"] and tache["erreur"] is not None:
+            st.error(f"Erreur pendant l'analyse : {tache['erreur']}")
 
     # --- Bloc d'affichage pour la SYNTHESE ANNUELLE ---
     if st.session_state.show_synthese:
@@ -144,11 +250,13 @@ with col_droite:
         with st.container(border=True):
             res = st.session_state.resultats_paie
             st.subheader("💵 Synthèse des Bulletins de Paie")
+            for avertissement in res.get("warnings", []):
+                st.warning(avertissement)
             # --- NOUVEAU : Appel du bilan mensuel ici aussi ---
             afficher_bilan_mensuel(res, "Bulletins de Paie")
             st.markdown("---")
             df = res.get("dataframe")
-            if isinstance(df, pd.DataFrame) and not df.empty:
+            if df is not None and not df.empty:
                 st.dataframe(df, hide_index=True, use_container_width=True)
                 csv_data = convert_df_to_csv(df)
                 st.download_button("📥 Télécharger la synthèse (CSV)", csv_data, "synthese_paie.csv", 'text/csv')
@@ -164,22 +272,36 @@ with col_droite:
             st.markdown("---")
             if res.get("has_results"):
                 st.metric(f"💰 Total Indemnités pour {res.get('annee_predominante', 'N/A')}", f"{res.get('total_indemnites', 0.0):.2f} EUR")
-                tab1, tab2 = st.tabs(["📅 Rotations", "✈️ Stats Avions"])
+                tab1, tab2, tab3 = st.tabs(["📅 Rotations", "✈️ Stats Avions", "⏱️ Heures de vol"])
                 with tab1:
-                    df_rot = res.get("rotations_df", pd.DataFrame())
-                    st.dataframe(df_rot, hide_index=True, use_container_width=True)
-                    if not df_rot.empty:
+                    df_rot = res.get("rotations_df")
+                    st.dataframe(df_rot, hide_index=True, use_container_width=True, column_config={
+                        "Indemnité/jour Réf. (EUR)": st.column_config.NumberColumn(format="%.2f"),
+                        "Indemnité Tot. (EUR)": st.column_config.NumberColumn(format="%.2f"),
+                    })
+                    if df_rot is not None and not df_rot.empty:
                         csv_data = convert_df_to_csv(df_rot)
                         st.download_button("📥 Télécharger les rotations (CSV)", csv_data, f"rotations_{res.get('annee_predominante')}.csv", 'text/csv')
                 with tab2:
                     st.write("**Statistiques par Type d'Avion :**")
-                    df_types = res.get("stats_avions_type_df", pd.DataFrame())
-                    if not df_types.empty:
-                        st.bar_chart(df_types.set_index('Type Avion'))
+                    df_types = res.get("stats_avions_type_df")
+                    if df_types is not None and not df_types.empty:
+                        st.bar_chart(df_types.set_index('Type Avion')[["Nombre de Segments"]])
                     st.write("**Statistiques par Immatriculation :**")
-                    df_immats = res.get("stats_avions_immat_df", pd.DataFrame())
-                    if not df_immats.empty:
-                        st.bar_chart(df_immats.set_index('Immatriculation'))
+                    df_immats = res.get("stats_avions_immat_df")
+                    if df_immats is not None and not df_immats.empty:
+                        st.bar_chart(df_immats.set_index('Immatriculation')[["Nombre de Segments"]])
+                with tab3:
+                    st.write("**Heures de vol par mois :**")
+                    df_mois = res.get("stats_heures_mois_df")
+                    if df_mois is not None and not df_mois.empty:
+                        st.bar_chart(df_mois, x="Mois", y="Heures de vol", sort=False)
+                        st.dataframe(df_mois, hide_index=True, use_container_width=True)
+                    for cle, libelle in (("stats_avions_type_df", "Type d'Avion"), ("stats_avions_immat_df", "Immatriculation")):
+                        df_stats = res.get(cle)
+                        if df_stats is not None and not df_stats.empty:
+                            st.write(f"**Heures de vol par {libelle} :**")
+                            st.dataframe(df_stats, hide_index=True, use_container_width=True)
             else:
                 st.warning("Aucune rotation trouvée.")
 
@@ -195,3 +317,10 @@ with col_droite:
     
     elif not st.session_state.show_synthese:
         st.info("Bienvenue ! Choisissez une action dans le menu de gauche pour commencer.")
+
+    if st.session_state.diagnostics and not st.session_state.show_synthese and st.session_state.menu_actif in ANALYSEURS:
+        afficher_diagnostics(st.session_state[ANALYSEURS[st.session_state.menu_actif][1]])
+
+# Après le premier rendu, pour ne pas le retarder
+if PRECHAUFFAGE:
+    demarrer_prechauffage()
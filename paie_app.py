@@ -1,49 +1,202 @@
 import streamlit as st
-import pdfplumber
+import os
 import re
+import json
+from functools import lru_cache
 from datetime import datetime
 import pandas as pd
+from extraction_pdf import extraire_documents
+from analyse_incrementale import cle_fichier, stats_pages
+import cache_pdf
+import traces
 
-def analyse_bulletins(uploaded_files):
+# Version du parseur de bulletins : à incrémenter pour invalider les résultats en cache
+VERSION_PARSEUR_PAIE = 1
+
+# Lignes recherchées sur les bulletins : libellé sur le bulletin -> colonne de la synthèse
+CLES_A_CHERCHER = {
+    "IR EXONEREES": "IR EXO",
+    "IR NON EXONEREES": "IR NON EXO", 
+    "REMB.CARTE NAVIGO": "IND TRANSPORT"
+}
+
+# Montant en fin de ligne de bulletin (ex. "1 234,56", "-12.00")
+PATTERN_MONTANT = re.compile(r"-?\s*\d+[\.,]\d{2}")
+
+def charger_libelles_paie(chemin=None):
     """
-    Analyse les bulletins de paie PDF, extrait les données financières clés,
-    et retourne un dictionnaire complet incluant l'ensemble des mois uniques trouvés.
+    Libellés recherchés : ceux par défaut, complétés (ou renommés) par un fichier JSON
+    {"libellé sur le bulletin": "colonne"} désigné par IMPOT_CALC_LIBELLES_PAIE (primes, IKV...).
+    Retourne (libellés, avertissement) : un fichier absent, illisible ou mal formé est ignoré
+    (libellés par défaut) et le problème est décrit dans l'avertissement, None sinon.
+    """
+    chemin = chemin or os.environ.get("IMPOT_CALC_LIBELLES_PAIE")
+    if not chemin:
+        return dict(CLES_A_CHERCHER), None
+    try:
+        with open(chemin, encoding="utf-8") as f:
+            supplementaires = json.load(f)
+        if not isinstance(supplementaires, dict) or not all(
+                isinstance(cle, str) and isinstance(colonne, str) for cle, colonne in supplementaires.items()):
+            raise ValueError("le fichier doit contenir un objet {\"libellé\": \"colonne\"}")
+    except (OSError, ValueError) as e:
+        return dict(CLES_A_CHERCHER), f"Libellés de paie de {chemin} ignorés ({e}) : libellés par défaut utilisés."
+    return {**CLES_A_CHERCHER, **supplementaires}, None
+
+LIBELLES_PAIE, AVERTISSEMENT_LIBELLES = charger_libelles_paie()
+
+def _regex_trie(libelles):
+    """Alternation factorisée en arbre de préfixes : le coût par position ne croît pas avec le nombre de libellés."""
+    racine = {}
+    for libelle in libelles:
+        noeud = racine
+        for caractere in libelle:
+            noeud = noeud.setdefault(caractere, {})
+        noeud[""] = {}
+
+    def motif(noeud):
+        branches = [re.escape(c) + motif(suite) for c, suite in sorted(noeud.items()) if c]
+        if not branches:
+            return ""
+        corps = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + corps + ")?" if "" in noeud else corps
+
+    return motif(racine)
+
+@lru_cache(maxsize=8)
+def compiler_libelles(libelles):
+    """
+    Prépare la recherche simultanée d'un ensemble de libellés (tuple).
+    Retourne (regex, inclus) : la regex trouve en une passe le plus long libellé à chaque position ;
+    inclus[libellé] liste les libellés qu'il contient (comptés eux aussi sur la ligne).
+    Si deux libellés peuvent se chevaucher, la recherche se fait en lecture anticipée à chaque position.
+    """
+    libelles = tuple(l for l in libelles if l)
+    if not libelles:
+        return None, {}
+    inclus = {l: [k for k in libelles if k in l] for l in libelles}
+    chevauchement = any(b.startswith(a[i:]) and len(b) > len(a) - i
+                        for a in libelles for b in libelles for i in range(1, len(a)))
+    motif = _regex_trie(libelles)
+    return re.compile(f"(?=({motif}))" if chevauchement else f"({motif})"), inclus
+
+def analyser_texte_bulletin(text_page, cles_a_chercher):
+    """Extrait les montants de chaque ligne recherchée sur la page d'un bulletin."""
+    montants_par_cle = {cle: [] for cle in cles_a_chercher}
+    regex, inclus = compiler_libelles(tuple(cles_a_chercher))
+    if not text_page or regex is None:
+        return montants_par_cle
+
+    # Une seule passe sur la page ; seules les lignes portant un libellé sont analysées
+    debut_ligne, trouves = -1, set()
+    for match in regex.finditer(text_page):
+        debut = text_page.rfind("\n", 0, match.start()) + 1
+        if debut != debut_ligne:
+            _ajouter_montant_ligne(text_page, debut_ligne, trouves, montants_par_cle)
+            debut_ligne, trouves = debut, set()
+        trouves.update(inclus[match.group(1)])
+    _ajouter_montant_ligne(text_page, debut_ligne, trouves, montants_par_cle)
+    return montants_par_cle
+
+def _ajouter_montant_ligne(text_page, debut, libelles, montants_par_cle):
+    """Dernier montant de la ligne commençant à `debut`, ajouté une fois pour chaque libellé trouvé."""
+    if not libelles:
+        return
+    fin = text_page.find("\n", debut)
+    match_montants = PATTERN_MONTANT.findall(text_page, debut, fin if fin != -1 else len(text_page))
+    if match_montants:
+        valeur_str = match_montants[-1].replace(" ", "").replace(",", ".")
+        try:
+            valeur = float(valeur_str)
+        except ValueError:
+            return
+        for libelle in libelles:
+            montants_par_cle[libelle].append(valeur)
+
+def extraire_date_nom(nom_fichier):
+    """Extrait la date (mois/année) du nom de fichier."""
+    try:
+        base = nom_fichier.replace(".pdf", "")
+        code_date_str = base[-6:] 
+        if not code_date_str.isdigit() or len(code_date_str) != 6:
+            match_alt = re.search(r"(\d{2})[_-]?(\d{4})", base)
+            if match_alt:
+                code_date_str = match_alt.group(1) + match_alt.group(2)
+            else:
+                match_alt_inv = re.search(r"(\d{4})(\d{2})", base)
+                if match_alt_inv:
+                    code_date_str = match_alt_inv.group(2) + match_alt_inv.group(1)
+                else:
+                    return None
+        return datetime.strptime(code_date_str, "%m%Y")
+    except Exception:
+        return None
+
+def nouvel_etat_paie():
+    """État d'analyse incrémentale : un enregistrement par bulletin, indexé par empreinte du fichier."""
+    return {"fichiers": {}, "diagnostics": traces.nouveaux_diagnostics()}
+
+def ajouter_bulletins(etat, uploaded_files):
+    """Analyse uniquement les bulletins fournis et les ajoute à l'état."""
+    with traces.collecte(etat["diagnostics"]):
+        fichiers_a_lire, dates_a_lire = [], []
+        for fichier in uploaded_files:
+            date_obj = extraire_date_nom(fichier.name)
+            if not date_obj:
+                # Bulletin ignoré : enregistré pour la synthèse, mais jamais lu
+                etat["fichiers"][cle_fichier(fichier)] = {"nom": fichier.name, "date": None, "montants": None, "erreur": None}
+                continue
+            fichiers_a_lire.append(fichier)
+            dates_a_lire.append(date_obj)
+
+        # Seule la première page de chaque bulletin est lue, en parallèle
+        for date_obj, document in zip(dates_a_lire, extraire_documents(fichiers_a_lire, pages_max=1)):
+            enregistrement = {"nom": document["nom"], "date": date_obj, "montants": None, "erreur": document["erreur"],
+                              "pages": {"extraites": document["pages_extraites"], "ignorees": 0}}
+            if not document["erreur"]:
+                cle = cache_pdf.cle_cache(document["empreinte"], VERSION_PARSEUR_PAIE, *LIBELLES_PAIE)
+                montants_par_cle = cache_pdf.lire("paie", cle)
+                if montants_par_cle is None:
+                    text_page = document["pages"][0] if document["pages"] else None
+                    with traces.etape("regex", fichier=document["nom"]):
+                        montants_par_cle = analyser_texte_bulletin(text_page, LIBELLES_PAIE)
+                    cache_pdf.ecrire("paie", cle, montants_par_cle)
+                enregistrement["montants"] = montants_par_cle
+            etat["fichiers"][document["empreinte"] or f"nom:{document['nom']}"] = enregistrement
+    return etat
+
+def retirer_bulletins(etat, empreintes):
+    """Retire de l'état les bulletins dont l'empreinte est fournie."""
+    for empreinte in empreintes:
+        enregistrement = etat["fichiers"].pop(empreinte, None)
+        if enregistrement:
+            traces.oublier_fichiers(etat["diagnostics"], [enregistrement["nom"]])
+    return etat
+
+def synthese_bulletins(etat):
+    """
+    Construit la synthèse mensuelle à partir des bulletins déjà analysés (sans relire de PDF),
+    et retourne un dictionnaire complet incluant l'ensemble des mois uniques trouvés
+    et les diagnostics (durées par étape et par fichier) si les traces sont actives.
     """
+    with traces.collecte(etat["diagnostics"]), traces.etape("dataframe"):
+        resultat = _construire_synthese(etat)
+    resultat["diagnostics"] = traces.resume(etat["diagnostics"])
+    return resultat
+
+def _construire_synthese(etat):
     resultats_mensuels = {}
     fichiers_ignores = []
+    warnings = [AVERTISSEMENT_LIBELLES] if AVERTISSEMENT_LIBELLES else []
     # --- MODIFIÉ : On garde le set pour le retourner à la fin ---
     mois_uniques = set()
-    
-    def extraire_date_nom(nom_fichier):
-        """Extrait la date (mois/année) du nom de fichier."""
-        try:
-            base = nom_fichier.replace(".pdf", "")
-            code_date_str = base[-6:] 
-            if not code_date_str.isdigit() or len(code_date_str) != 6:
-                match_alt = re.search(r"(\d{2})[_-]?(\d{4})", base)
-                if match_alt:
-                    code_date_str = match_alt.group(1) + match_alt.group(2)
-                else:
-                    match_alt_inv = re.search(r"(\d{4})(\d{2})", base)
-                    if match_alt_inv:
-                        code_date_str = match_alt_inv.group(2) + match_alt_inv.group(1)
-                    else:
-                        return None
-            return datetime.strptime(code_date_str, "%m%Y")
-        except Exception:
-            return None
-
-    fichiers_tries = sorted(uploaded_files, key=lambda f: extraire_date_nom(f.name) or datetime.min)
-    cles_a_chercher = {
-        "IR EXONEREES": "IR EXO",
-        "IR NON EXONEREES": "IR NON EXO", 
-        "REMB.CARTE NAVIGO": "IND TRANSPORT"
-    }
-
-    for fichier in fichiers_tries:
-        date_obj = extraire_date_nom(fichier.name)
+    cles_a_chercher = LIBELLES_PAIE
+
+    enregistrements = sorted(etat["fichiers"].values(), key=lambda e: e["date"] or datetime.min)
+    for enregistrement in enregistrements:
+        date_obj = enregistrement["date"]
         if not date_obj:
-            fichiers_ignores.append(fichier.name)
+            fichiers_ignores.append(enregistrement["nom"])
             continue
 
         mois_uniques.add((date_obj.year, date_obj.month))
@@ -52,27 +205,15 @@ def analyse_bulletins(uploaded_files):
         if date_mois_str not in resultats_mensuels:
             resultats_mensuels[date_mois_str] = {cle: [] for cle in cles_a_chercher.keys()}
 
-        try:
-            with pdfplumber.open(fichier) as pdf:
-                if len(pdf.pages) > 0:
-                    page_a_analyser = pdf.pages[0]
-                    text_page = page_a_analyser.extract_text()
-                    
-                    if text_page:
-                        for line in text_page.split('\n'):
-                            for cle_longue in cles_a_chercher.keys():
-                                if cle_longue in line:
-                                    match_montants = re.findall(r"-?\s*\d+[\.,]\d{2}", line)
-                                    if match_montants:
-                                        valeur_str = match_montants[-1].replace(" ", "").replace(",", ".")
-                                        try:
-                                            montant = float(valeur_str)
-                                            resultats_mensuels[date_mois_str][cle_longue].append(montant)
-                                        except ValueError:
-                                            pass
-        except Exception as e:
-            fichiers_ignores.append(f"{fichier.name} (erreur de lecture: {e})")
+    for enregistrement in enregistrements:
+        if enregistrement["date"] and enregistrement["erreur"]:
+            fichiers_ignores.append(f"{enregistrement['nom']} (erreur de lecture: {enregistrement['erreur']})")
+        elif enregistrement["montants"]:
+            date_mois_str = enregistrement["date"].strftime("%B %Y")
+            for cle_longue, montants in enregistrement["montants"].items():
+                resultats_mensuels[date_mois_str][cle_longue].extend(montants)
 
+    stats_pages_etat = stats_pages(etat)
     donnees_tableau = []
     if resultats_mensuels:
         cles_mois_tries = sorted(resultats_mensuels.keys(), key=lambda mois_str_key: datetime.strptime(mois_str_key, "%B %Y"))
@@ -104,7 +245,9 @@ def analyse_bulletins(uploaded_files):
             "totaux_par_cle": totaux_par_cle,
             "total_general": total_general,
             "fichiers_ignores": fichiers_ignores,
-            "mois_trouves": mois_uniques # --- MODIFIÉ ---
+            "warnings": warnings,
+            "mois_trouves": mois_uniques, # --- MODIFIÉ ---
+            "stats_pages": stats_pages_etat
         }
     else:
         return {
@@ -112,5 +255,14 @@ def analyse_bulletins(uploaded_files):
             "totaux_par_cle": {},
             "total_general": 0.0,
             "fichiers_ignores": fichiers_ignores,
-            "mois_trouves": mois_uniques # --- MODIFIÉ ---
+            "warnings": warnings,
+            "mois_trouves": mois_uniques, # --- MODIFIÉ ---
+            "stats_pages": stats_pages_etat
         }
+
+def analyse_bulletins(uploaded_files):
+    """
+    Analyse les bulletins de paie PDF, extrait les données financières clés,
+    et retourne un dictionnaire complet incluant l'ensemble des mois uniques trouvés.
+    """
+    return synthese_bulletins(ajouter_bulletins(nouvel_etat_paie(), uploaded_files))
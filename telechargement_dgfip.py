@@ -0,0 +1,105 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import cache_pdf
+import traces
+
+# Copies locales des fichiers DGFiP, revalidées à chaque exécution (ETag / Last-Modified)
+CACHE_DIR = os.environ.get("IMPOT_CALC_DGFIP_CACHE_DIR", os.path.join(cache_pdf.CACHE_DIR, "dgfip"))
+DELAI_S = 10
+ENCODAGES = ("utf-8", "latin-1", "cp1252")
+
+
+def decoder(contenu, url=""):
+    """Texte d'un fichier DGFiP : utf-8, sinon latin-1 / cp1252."""
+    for encodage in ENCODAGES:
+        try:
+            texte = contenu.decode(encodage)
+        except UnicodeDecodeError:
+            print(f"  > Échec avec {encodage}...")
+            continue
+        print(f"  > {url or 'Fichier'} décodé avec {encodage}.")
+        return texte
+    print(f"  > ERREUR : Impossible de décoder {url}.")
+    return contenu.decode("utf-8", "replace")
+
+
+def _chemins(nom, dossier):
+    return os.path.join(dossier, nom), os.path.join(dossier, nom + ".json")
+
+
+def _lire_copie(nom, dossier):
+    """(contenu, métadonnées) de la copie locale, ou (None, {})."""
+    chemin, chemin_meta = _chemins(nom, dossier)
+    try:
+        with open(chemin_meta, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(chemin, "rb") as f:
+            return f.read(), meta
+    except (OSError, ValueError):
+        return None, {}
+
+
+def _ecrire_copie(nom, dossier, contenu, meta):
+    chemin, chemin_meta = _chemins(nom, dossier)
+    try:
+        os.makedirs(dossier, exist_ok=True)
+        for destination, donnees in ((chemin, contenu), (chemin_meta, json.dumps(meta).encode("utf-8"))):
+            temporaire = f"{destination}.{os.getpid()}.tmp"
+            with open(temporaire, "wb") as f:
+                f.write(donnees)
+            os.replace(temporaire, destination)
+    except OSError as e:
+        print(f"  > Avert. : copie locale de {nom} non enregistrée ({e}).")
+
+
+def telecharger(session, nom, url, dossier=None):
+    """
+    Télécharge un fichier en requête conditionnelle. Retourne (contenu binaire ou None, statut) :
+    "modifie" (200), "inchange" (304, copie locale), "hors_ligne" (erreur réseau, copie locale) ou "echec".
+    """
+    dossier = dossier or CACHE_DIR
+    copie, meta = _lire_copie(nom, dossier)
+    entetes = {}
+    if copie is not None and meta.get("url") == url:
+        if meta.get("etag"):
+            entetes["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            entetes["If-Modified-Since"] = meta["last_modified"]
+    try:
+        reponse = session.get(url, headers=entetes, timeout=DELAI_S)
+        if reponse.status_code == 304 and entetes:
+            return copie, "inchange"
+        reponse.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"ERREUR téléchargement {url}: {e}")
+        if copie is not None:
+            print(f"  > Copie locale de {nom} utilisée.")
+            return copie, "hors_ligne"
+        return None, "echec"
+    _ecrire_copie(nom, dossier, reponse.content, {
+        "url": url, "etag": reponse.headers.get("ETag"), "last_modified": reponse.headers.get("Last-Modified")})
+    return reponse.content, "modifie"
+
+
+@traces.trace("dgfip.telechargement")
+def telecharger_sources(urls, dossier=None):
+    """
+    Télécharge en parallèle {nom: url} avec une session partagée ; retourne {nom: texte ou None}.
+    Un fichier inchangé sur le serveur est relu depuis la copie locale, sans transfert.
+    """
+    taille = max(1, len(urls))
+    with requests.Session() as session:
+        session.mount("https://", HTTPAdapter(pool_maxsize=taille))
+        session.mount("http://", HTTPAdapter(pool_maxsize=taille))
+        with ThreadPoolExecutor(max_workers=taille) as executeur:
+            taches = {nom: executeur.submit(telecharger, session, nom, url, dossier) for nom, url in urls.items()}
+            resultats = {nom: tache.result() for nom, tache in taches.items()}
+    textes = {}
+    for nom, (contenu, statut) in resultats.items():
+        print(f"Téléchargement de {urls[nom]} : {statut}.")
+        traces.compter(f"dgfip_{statut}")
+        textes[nom] = decoder(contenu, urls[nom]) if contenu is not None else None
+    return textes
@@ -0,0 +1,9 @@
+import os
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.join(RACINE, "benchmarks"))
+
+# Analyses sans cache disque : chaque test relit ses PDF
+os.environ.setdefault("IMPOT_CALC_CACHE", "0")
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+import baremes_dgfip
+import ep5_app
+from test_ep5_rotations import MARS
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def base_non_modifiable(tmp_path, monkeypatch):
+    """Base des barèmes dans un dossier inexistant : ni lecture ni écriture possibles."""
+    monkeypatch.chdir(RACINE)
+    monkeypatch.setattr(baremes_dgfip, "CHEMIN_BASE", str(tmp_path / "absent" / "dgfip_baremes.sqlite"))
+
+
+def test_base_non_modifiable_repli_sur_le_csv(base_non_modifiable):
+    table, message = ep5_app.charger_baremes(["2025"])["2025"]
+    attendu = baremes_dgfip.lire_table_csv(baremes_dgfip.nom_csv("2025"))
+    assert {code: (list(o), list(m)) for code, (o, m) in table.items()} == attendu
+    assert message == "Indemnités pour 2025 chargées."
+
+
+def test_base_non_modifiable_rotations_tarifees(base_non_modifiable):
+    resultat = ep5_app.analyse_missions([MARS()])
+    assert resultat["rotations_df"]["Escale Principale"].tolist() == ["Barcelona (ES)"]
+    assert resultat["total_indemnites"] > 0
+    assert not resultat["warnings"]
@@ -0,0 +1,43 @@
+import ep5_app
+from pdf_synthetique import ecrire_pdf, fichier_memoire
+
+
+def releve(mois, annee, *lignes_vol):
+    lignes = ["RELEVE EP5 - ACTIVITE PERSONNEL NAVIGANT"]
+    lignes += [f"{numero} A350-900 FHTYA {ligne}" for numero, ligne in enumerate(lignes_vol, start=1)]
+    return fichier_memoire(f"EP5_{mois:02d}-{annee}.pdf", ecrire_pdf([lignes]))
+
+
+JANVIER = lambda: releve(1, 2025, "AF0006 CDG 30 | 10.00 JFK 30 | 18.00")
+FEVRIER = lambda: releve(2, 2025, "AF0009 JFK 2 | 10.00 CDG 3 | 6.00")
+MARS = lambda: releve(3, 2025, "AF1448 CDG 2 | 8.00 BCN 2 | 10.00", "AF1449 BCN 2 | 12.00 CDG 2 | 14.00")
+
+
+def itineraires(resultat):
+    return resultat["rotations_df"][["Itinéraire Global", "Durée (j)"]].values.tolist()
+
+
+def test_mois_manquant_abandonne_la_rotation_ouverte():
+    resultat = ep5_app.analyse_missions([JANVIER(), MARS()])
+    assert itineraires(resultat) == [["CDG → BCN", 1]]
+
+
+def test_mois_manquant_ajoute_ensuite_complete_la_rotation():
+    contexte = ep5_app.ajouter_missions(ep5_app.nouveau_contexte_missions(), [JANVIER(), MARS()])
+    resultat = ep5_app.synthese_missions(ep5_app.ajouter_missions(contexte, [FEVRIER()]))
+    assert itineraires(resultat) == [["CDG → JFK", 5], ["CDG → BCN", 1]]
+
+
+def test_rotation_open_jaw_a_cheval_sur_deux_mois():
+    fevrier = releve(2, 2025, "AF0011 EWR 2 | 10.00 CDG 3 | 6.00")
+    resultat = ep5_app.analyse_missions([JANVIER(), fevrier])
+    assert itineraires(resultat) == [["CDG → JFK", 5]]
+
+
+def test_analyse_en_une_fois_libere_les_segments():
+    contexte = ep5_app.ajouter_missions(ep5_app.nouveau_contexte_missions(conserver_segments=False),
+                                        [JANVIER(), FEVRIER(), MARS()])
+    assert contexte["assembleur"].segments_par_mois == {} and contexte["assembleur"]._reprises == {}
+    assert all(not enregistrement["segments"] for enregistrement in contexte["fichiers"].values())
+    incremental = ep5_app.ajouter_missions(ep5_app.nouveau_contexte_missions(), [JANVIER(), FEVRIER(), MARS()])
+    assert itineraires(ep5_app.synthese_missions(contexte)) == itineraires(ep5_app.synthese_missions(incremental))
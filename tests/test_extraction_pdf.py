@@ -0,0 +1,32 @@
+import pytest
+
+import extraction_pdf
+from pdf_synthetique import ecrire_pdf
+
+RELEVE = ["RELEVE EP5 - ACTIVITE PERSONNEL NAVIGANT", "1 A350-900 FHTYA AF0006 CDG 30 | 10.00 JFK 30 | 18.00"]
+RECAPITULATIF = ["RECAPITULATIF DES HEURES", "Aucune ligne de vol sur cette page"]
+
+
+@pytest.fixture(autouse=True)
+def series_vierges(monkeypatch):
+    monkeypatch.setattr(extraction_pdf, "_series_avec_marqueur", {})
+
+
+def test_prefiltre_suspendu_puis_retabli(monkeypatch):
+    monkeypatch.setattr(extraction_pdf, "PAGES_AVANT_SUSPENSION", 2)
+    contenu = ecrire_pdf([RELEVE, RELEVE, RELEVE, RECAPITULATIF, RELEVE, RECAPITULATIF])
+    textes, erreur, stats = extraction_pdf._extraire_pages(contenu, filtre="EP5")
+    assert erreur is None
+    assert [texte is None for texte in textes] == [False, False, False, True, False, True]
+    # Pages 3 et 4 extraites pendant la suspension ; la page 4, sans marqueur, rétablit le pré-filtre
+    assert (stats["pages_extraites"], stats["pages_ignorees"]) == (5, 1)
+
+
+def test_textes_identiques_au_prefiltre_systematique(monkeypatch):
+    contenu = ecrire_pdf([RELEVE, RECAPITULATIF, RELEVE, RELEVE, RECAPITULATIF, RELEVE])
+    monkeypatch.setattr(extraction_pdf, "PAGES_AVANT_SUSPENSION", float("inf"))
+    systematique, _, _ = extraction_pdf._extraire_pages(contenu, filtre="EP5")
+    monkeypatch.setattr(extraction_pdf, "PAGES_AVANT_SUSPENSION", 0)
+    sans_prefiltre, _, stats = extraction_pdf._extraire_pages(contenu, filtre="EP5")
+    assert sans_prefiltre == systematique
+    assert stats["pages_ignorees"] == 0
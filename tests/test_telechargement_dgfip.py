@@ -0,0 +1,73 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import telechargement_dgfip
+
+
+class Fichier(BaseHTTPRequestHandler):
+    """Fichier servi avec ETag et Last-Modified ; 304 si la requête conditionnelle correspond."""
+    contenu = b"Code;Pays\nES;Espagne\n"
+    etag = '"v1"'
+    last_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+    requetes = []
+
+    def do_GET(self):
+        type(self).requetes.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.send_header("Content-Length", str(len(self.contenu)))
+        self.end_headers()
+        self.wfile.write(self.contenu)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serveur(monkeypatch):
+    monkeypatch.setattr(Fichier, "requetes", [])
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Fichier)
+    fil = threading.Thread(target=httpd.serve_forever, daemon=True)
+    fil.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/webmiss.csv", httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requete_conditionnelle(serveur, tmp_path, monkeypatch):
+    url, _ = serveur
+    with requests.Session() as session:
+        assert telechargement_dgfip.telecharger(session, "webmiss", url, str(tmp_path)) == (Fichier.contenu, "modifie")
+        assert "If-None-Match" not in Fichier.requetes[-1]
+
+        assert telechargement_dgfip.telecharger(session, "webmiss", url, str(tmp_path)) == (Fichier.contenu, "inchange")
+        assert Fichier.requetes[-1]["If-None-Match"] == Fichier.etag
+        assert Fichier.requetes[-1]["If-Modified-Since"] == Fichier.last_modified
+
+        monkeypatch.setattr(Fichier, "contenu", b"Code;Pays\nES;Espagne\nPT;Portugal\n")
+        monkeypatch.setattr(Fichier, "etag", '"v2"')
+        assert telechargement_dgfip.telecharger(session, "webmiss", url, str(tmp_path)) == (Fichier.contenu, "modifie")
+
+
+def test_hors_ligne_copie_locale(serveur, tmp_path):
+    url, httpd = serveur
+    with requests.Session() as session:
+        telechargement_dgfip.telecharger(session, "webmiss", url, str(tmp_path))
+        httpd.shutdown()
+        httpd.server_close()
+        assert telechargement_dgfip.telecharger(session, "webmiss", url, str(tmp_path)) == (Fichier.contenu, "hors_ligne")
+
+
+def test_telecharger_sources(serveur, tmp_path):
+    url, _ = serveur
+    assert telechargement_dgfip.telecharger_sources({}, str(tmp_path)) == {}
+    textes = telechargement_dgfip.telecharger_sources({"webmiss": url, "webtaux": url + "?taux"}, str(tmp_path))
+    assert textes == {"webmiss": Fichier.contenu.decode(), "webtaux": Fichier.contenu.decode()}
@@ -0,0 +1,21 @@
+import os
+
+import baremes_dgfip
+import ep5_app
+import traitement_lot
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_empreinte_referentiels_suit_parseurs_et_baremes(tmp_path, monkeypatch):
+    monkeypatch.chdir(RACINE)
+    monkeypatch.setattr(baremes_dgfip, "CHEMIN_BASE", str(tmp_path / "dgfip_baremes.sqlite"))
+    initiale = traitement_lot.empreinte_referentiels()
+    assert traitement_lot.empreinte_referentiels() == initiale
+
+    baremes_dgfip.importer_csv("2025", baremes_dgfip.nom_csv("2025"))
+    apres_bareme = traitement_lot.empreinte_referentiels()
+    assert apres_bareme != initiale
+
+    monkeypatch.setattr(ep5_app, "VERSION_PARSEUR_EP5", ep5_app.VERSION_PARSEUR_EP5 + 1)
+    assert traitement_lot.empreinte_referentiels() != apres_bareme
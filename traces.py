@@ -0,0 +1,141 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Mesures des étapes d'analyse (durées, compteurs), collectées uniquement si elles sont activées :
+# variable IMPOT_CALC_TRACES=1, ou activation(True) autour d'un traitement (panneau Diagnostics).
+_actif = ContextVar("traces_actives", default=os.environ.get("IMPOT_CALC_TRACES", "0") == "1")
+_collecteur = ContextVar("collecteur_traces", default=None)
+
+
+class _EtapeNeutre:
+    """Étape sans effet, renvoyée quand aucune collecte n'est en cours."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NEUTRE = _EtapeNeutre()
+
+
+class _Etape:
+    __slots__ = ("diagnostics", "nom", "fichier", "debut")
+
+    def __init__(self, diagnostics, nom, fichier):
+        self.diagnostics, self.nom, self.fichier = diagnostics, nom, fichier
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _ajouter_duree(self.diagnostics, self.nom, time.perf_counter() - self.debut, self.fichier)
+        return False
+
+
+def nouveaux_diagnostics():
+    """Structure des mesures : durées par étape, compteurs, et durée / pages par fichier."""
+    return {"etapes": {}, "compteurs": {}, "fichiers": {}}
+
+
+def actives():
+    """Une collecte est-elle en cours dans ce contexte ?"""
+    return _collecteur.get() is not None
+
+
+@contextmanager
+def activation(actif=True):
+    """Active (ou désactive) les traces pour les traitements lancés dans ce bloc."""
+    jeton = _actif.set(actif)
+    try:
+        yield
+    finally:
+        _actif.reset(jeton)
+
+
+@contextmanager
+def collecte(diagnostics):
+    """Dirige les mesures de ce bloc vers `diagnostics` (voir nouveaux_diagnostics), si les traces sont actives."""
+    if not _actif.get():
+        yield diagnostics
+        return
+    jeton = _collecteur.set(diagnostics)
+    try:
+        yield diagnostics
+    finally:
+        _collecteur.reset(jeton)
+
+
+def etape(nom, fichier=None):
+    """Gestionnaire de contexte mesurant la durée d'une étape (et, si fourni, l'imputant à un fichier)."""
+    diagnostics = _collecteur.get()
+    if diagnostics is None:
+        return _NEUTRE
+    return _Etape(diagnostics, nom, fichier)
+
+
+def trace(nom):
+    """Décorateur : chaque appel de la fonction est mesuré comme l'étape `nom`."""
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            with etape(nom):
+                return fonction(*args, **kwargs)
+        return enveloppe
+    return decorateur
+
+
+def duree(nom, duree_s, fichier=None):
+    """Enregistre une durée mesurée ailleurs (dans un worker d'extraction par exemple)."""
+    diagnostics = _collecteur.get()
+    if diagnostics is not None:
+        _ajouter_duree(diagnostics, nom, duree_s, fichier)
+
+
+def compter(nom, n=1):
+    """Incrémente un compteur (pages extraites, accès au cache...)."""
+    diagnostics = _collecteur.get()
+    if diagnostics is not None:
+        diagnostics["compteurs"][nom] = diagnostics["compteurs"].get(nom, 0) + n
+
+
+def fichier(nom, **mesures):
+    """Ajoute des mesures (durée, pages...) à la ligne d'un fichier."""
+    diagnostics = _collecteur.get()
+    if diagnostics is not None:
+        _ajouter_fichier(diagnostics, nom, **mesures)
+
+
+def _ajouter_duree(diagnostics, nom, duree_s, fichier):
+    etape = diagnostics["etapes"].setdefault(nom, {"duree_s": 0.0, "appels": 0})
+    etape["duree_s"] += duree_s
+    etape["appels"] += 1
+    if fichier is not None:
+        _ajouter_fichier(diagnostics, fichier, duree_s=duree_s)
+
+
+def _ajouter_fichier(diagnostics, nom, **mesures):
+    ligne = diagnostics["fichiers"].setdefault(nom, {"duree_s": 0.0})
+    for cle, valeur in mesures.items():
+        ligne[cle] = ligne.get(cle, 0) + valeur
+
+
+def oublier_fichiers(diagnostics, noms):
+    """Retire des diagnostics les fichiers qui ne font plus partie de l'analyse."""
+    for nom in noms:
+        diagnostics["fichiers"].pop(nom, None)
+
+
+def resume(diagnostics):
+    """Copie arrondie des diagnostics, pour un résultat d'analyse."""
+    return {
+        "etapes": {nom: {"duree_s": round(e["duree_s"], 4), "appels": e["appels"]} for nom, e in diagnostics["etapes"].items()},
+        "compteurs": dict(diagnostics["compteurs"]),
+        "fichiers": {nom: {cle: round(v, 4) if isinstance(v, float) else v for cle, v in ligne.items()}
+                     for nom, ligne in diagnostics["fichiers"].items()},
+    }
@@ -0,0 +1,284 @@
+"""
+Traitement par lot, sans interface : synthèse annuelle de chaque navigant d'une base.
+
+    python traitement_lot.py DOSSIER_BASE --sortie DOSSIER_SORTIE [--workers N] [--format csv|parquet] [--forcer]
+
+DOSSIER_BASE contient un dossier par personne, avec ses PDF de paie, EP5 et attestations
+(dans des sous-dossiers paie/, ep5/, attestation/ ou, à défaut, reconnus à leur nom).
+Pour chaque personne, DOSSIER_SORTIE/<personne>/ reçoit la synthèse et le détail de chaque analyse ;
+DOSSIER_SORTIE/synthese_globale.<format> regroupe toutes les personnes. Le format parquet nécessite
+pyarrow ou fastparquet, qui ne font pas partie de requirements.txt (pip install pyarrow).
+Une personne dont les PDF n'ont pas changé depuis le dernier traitement réussi est ignorée,
+ce qui permet de relancer le lot après une interruption ; une mise à jour des barèmes DGFiP,
+des libellés de paie, de l'index des aéroports ou d'un parseur fait retraiter tout le monde.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+# Version du format de sortie : à incrémenter pour forcer le retraitement de toutes les personnes
+VERSION_LOT = 2
+DOSSIER_APPLICATION = os.path.dirname(os.path.abspath(__file__))
+MANIFESTE = "manifeste.json"
+TYPES_DOCUMENTS = ("paie", "ep5", "attestation")
+
+
+class FichierDisque:
+    """PDF sur disque présenté comme un UploadedFile (name, getvalue) aux analyseurs."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.name = os.path.basename(chemin)
+
+    def getvalue(self):
+        with open(self.chemin, "rb") as f:
+            return f.read()
+
+
+def type_document(chemin_relatif):
+    """paie, ep5 ou attestation : d'après le sous-dossier, sinon d'après le nom du fichier ; None si non reconnu."""
+    parties = [p.lower() for p in chemin_relatif.replace("\\", "/").split("/")]
+    for partie in parties:
+        if "ep5" in partie:
+            return "ep5"
+        if partie.startswith(("attestation", "nuitee")):
+            return "attestation"
+        if partie.startswith(("paie", "bulletin")):
+            return "paie"
+    return None
+
+
+def lister_personnes(dossier_base):
+    """
+    {personne: {type: [chemins PDF triés]}} pour chaque sous-dossier de la base ;
+    les PDF de type non reconnu sont rangés sous "ignores" (non analysés, signalés dans la synthèse).
+    """
+    personnes = {}
+    for personne in sorted(os.listdir(dossier_base)):
+        dossier = os.path.join(dossier_base, personne)
+        if not os.path.isdir(dossier) or personne.startswith("."):
+            continue
+        documents = {type_doc: [] for type_doc in TYPES_DOCUMENTS + ("ignores",)}
+        for racine, _, noms in os.walk(dossier):
+            for nom in noms:
+                if nom.lower().endswith(".pdf"):
+                    chemin = os.path.join(racine, nom)
+                    documents[type_document(os.path.relpath(chemin, dossier)) or "ignores"].append(chemin)
+        for chemins in documents.values():
+            chemins.sort()
+        personnes[personne] = documents
+    return personnes
+
+
+def empreinte_referentiels():
+    """
+    Empreinte de ce qui, hors PDF, détermine les résultats : versions des parseurs, libellés de paie,
+    barèmes DGFiP (base et CSV) et index des aéroports. Les CSV de barèmes plus récents que la base y sont
+    d'abord importés, pour que l'empreinte ne change pas au premier traitement qui les importerait.
+    """
+    import baremes_dgfip
+    from paie_app import VERSION_PARSEUR_PAIE, LIBELLES_PAIE
+    from ep5_app import VERSION_PARSEUR_EP5, charger_baremes
+    from attestation_app import VERSION_PARSEUR_ATTESTATION
+
+    fichiers_csv = sorted(nom for nom in os.listdir(DOSSIER_APPLICATION)
+                          if nom.startswith("dgfip_indemnites_") and nom.endswith(".csv"))
+    charger_baremes([nom[len("dgfip_indemnites_"):-len(".csv")] for nom in fichiers_csv])
+    try:
+        etat_baremes = sorted(baremes_dgfip.etat_annees().items())
+    except Exception:
+        etat_baremes = []
+    h = hashlib.sha256(f"{VERSION_PARSEUR_PAIE}|{VERSION_PARSEUR_EP5}|{VERSION_PARSEUR_ATTESTATION}|"
+                       f"{sorted(LIBELLES_PAIE.items())}|{etat_baremes}".encode("utf-8"))
+    for nom in fichiers_csv + ["airport-codes.csv"]:
+        try:
+            st = os.stat(os.path.join(DOSSIER_APPLICATION, nom))
+        except OSError:
+            continue
+        h.update(f"|{nom}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def empreinte_entrees(documents, format_sortie, referentiels=""):
+    """
+    Empreinte des PDF d'une personne (chemin, taille, date de modification), des options de sortie
+    et des données de référence (empreinte_referentiels).
+    """
+    h = hashlib.sha256(f"{VERSION_LOT}|{format_sortie}|{referentiels}".encode("utf-8"))
+    for type_doc in TYPES_DOCUMENTS + ("ignores",):
+        for chemin in documents.get(type_doc, ()):
+            st = os.stat(chemin)
+            h.update(f"|{type_doc}|{chemin}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def a_jour(dossier_personne, empreinte):
+    """Les sorties de cette personne correspondent-elles déjà à ses PDF actuels ?"""
+    try:
+        with open(os.path.join(dossier_personne, MANIFESTE), encoding="utf-8") as f:
+            manifeste = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return manifeste.get("empreinte") == empreinte and all(
+        os.path.exists(os.path.join(dossier_personne, nom)) for nom in manifeste.get("fichiers", []))
+
+
+def verifier_format(format_sortie):
+    """ImportError explicite si le format demandé n'a pas de moteur installé (parquet : pyarrow ou fastparquet)."""
+    if format_sortie == "parquet" and not any(importlib.util.find_spec(module) for module in ("pyarrow", "fastparquet")):
+        raise ImportError("Le format parquet nécessite pyarrow ou fastparquet : pip install pyarrow (ou --format csv).")
+
+
+def ecrire_table(df, chemin_sans_extension, format_sortie):
+    """Écrit un DataFrame en CSV (comme les exports de l'application) ou en Parquet. Retourne le nom du fichier."""
+    chemin = f"{chemin_sans_extension}.{format_sortie}"
+    temporaire = f"{chemin}.tmp"
+    if format_sortie == "parquet":
+        df.to_parquet(temporaire, index=False)
+    else:
+        df.to_csv(temporaire, index=False, sep=';', float_format='%.2f', encoding='utf-8-sig')
+    os.replace(temporaire, chemin)
+    return os.path.basename(chemin)
+
+
+def lire_table(chemin, format_sortie):
+    if format_sortie == "parquet":
+        return pd.read_parquet(chemin)
+    return pd.read_csv(chemin, sep=';', encoding='utf-8-sig')
+
+
+def synthese_personne(personne, res_paie, res_ep5, res_attest, fichiers_ignores=()):
+    """
+    Ligne de synthèse annuelle, mêmes totaux que la SYNTHESE ANNUELLE de l'application.
+    Avertissements : problèmes des analyses (les messages d'information n'y figurent pas) et PDF non analysés.
+    """
+    total_paie = res_paie.get("total_general", 0.0)
+    total_ep5 = res_ep5.get("total_indemnites", 0.0)
+    total_attestation = sum(res_attest["resultats"].values()) if res_attest.get("resultats") else 0.0
+    avertissements = res_paie.get("warnings", []) + res_ep5.get("warnings", []) + res_attest.get("erreurs", []) + [
+        f"Fichier ignoré : {nom}" for nom in list(res_paie.get("fichiers_ignores", [])) + list(fichiers_ignores)]
+    return {
+        "Personne": personne,
+        "Année": res_ep5.get("annee_predominante", "N/A"),
+        "Mois Paie": len(res_paie.get("mois_trouves", ())),
+        "Mois EP5": len(res_ep5.get("mois_trouves", ())),
+        "Total Paie (EUR)": total_paie,
+        "Total EP5 (EUR)": total_ep5,
+        "Total Attestations (EUR)": total_attestation,
+        "Total Général (EUR)": total_paie + total_ep5 + total_attestation,
+        "Avertissements": " | ".join(avertissements),
+    }
+
+
+def traiter_personne(personne, documents, dossier_personne, format_sortie, empreinte):
+    """Analyse les PDF d'une personne et écrit ses sorties. Exécuté dans un worker."""
+    # Import tardif : les analyseurs chargent leurs référentiels relativement au dossier de l'application
+    from paie_app import analyse_bulletins
+    from ep5_app import analyse_missions
+    from attestation_app import analyse_attestation_nuitees
+
+    res_paie = analyse_bulletins([FichierDisque(c) for c in documents["paie"]])
+    res_ep5 = analyse_missions([FichierDisque(c) for c in documents["ep5"]])
+    res_attest = analyse_attestation_nuitees([FichierDisque(c) for c in documents["attestation"]])
+
+    os.makedirs(dossier_personne, exist_ok=True)
+    base = os.path.join(dossier_personne, "")
+    fichiers = []
+    if not res_paie["dataframe"].empty:
+        fichiers.append(ecrire_table(res_paie["dataframe"], base + "paie", format_sortie))
+    if res_ep5.get("has_results"):
+        fichiers.append(ecrire_table(res_ep5["rotations_df"], base + "rotations", format_sortie))
+    if res_attest["resultats"]:
+        df_attest = pd.DataFrame(list(res_attest["resultats"].items()), columns=["Année", "Montant (EUR)"])
+        fichiers.append(ecrire_table(df_attest, base + "attestations", format_sortie))
+    ligne = synthese_personne(personne, res_paie, res_ep5, res_attest,
+                              [os.path.basename(chemin) for chemin in documents.get("ignores", ())])
+    fichiers.append(ecrire_table(pd.DataFrame([ligne]), base + "synthese", format_sortie))
+
+    # Le manifeste est écrit en dernier : une personne interrompue sera retraitée
+    with open(os.path.join(dossier_personne, MANIFESTE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump({"empreinte": empreinte, "fichiers": fichiers}, f, ensure_ascii=False)
+    os.replace(os.path.join(dossier_personne, MANIFESTE + ".tmp"), os.path.join(dossier_personne, MANIFESTE))
+    return ligne
+
+
+def _initialiser_worker():
+    os.chdir(DOSSIER_APPLICATION)
+    # Le parallélisme est entre personnes : extraction séquentielle dans chaque worker
+    os.environ["IMPOT_CALC_WORKERS"] = "1"
+
+
+def traiter_lot(dossier_base, dossier_sortie, workers=None, format_sortie="csv", forcer=False):
+    """Traite toutes les personnes de la base ; retourne (DataFrame de synthèse globale, erreurs par personne)."""
+    verifier_format(format_sortie)
+    personnes = lister_personnes(dossier_base)
+    referentiels = empreinte_referentiels()
+    a_traiter, deja_faits = {}, []
+    for personne, documents in personnes.items():
+        dossier_personne = os.path.join(dossier_sortie, personne)
+        empreinte = empreinte_entrees(documents, format_sortie, referentiels)
+        if not forcer and a_jour(dossier_personne, empreinte):
+            deja_faits.append(personne)
+        else:
+            a_traiter[personne] = (documents, dossier_personne, empreinte)
+    print(f"{len(personnes)} personne(s) : {len(a_traiter)} à traiter, {len(deja_faits)} déjà à jour.")
+
+    erreurs = {}
+    if a_traiter:
+        taille = workers or min(len(a_traiter), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=taille, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_initialiser_worker) as executeur:
+            taches = {executeur.submit(traiter_personne, personne, documents, dossier_personne, format_sortie, empreinte): personne
+                      for personne, (documents, dossier_personne, empreinte) in a_traiter.items()}
+            for fait, tache in enumerate(as_completed(taches), start=1):
+                personne = taches[tache]
+                try:
+                    ligne = tache.result()
+                    print(f"[{fait}/{len(taches)}] {personne} : {ligne['Total Général (EUR)']:.2f} EUR")
+                except Exception as e:
+                    erreurs[personne] = str(e)
+                    print(f"[{fait}/{len(taches)}] {personne} : ERREUR {e}", file=sys.stderr)
+
+    # Synthèse globale reconstruite à partir des sorties de chaque personne (traitées ou déjà à jour)
+    lignes = []
+    for personne in personnes:
+        if personne in erreurs:
+            lignes.append(pd.DataFrame([{"Personne": personne, "Avertissements": f"ERREUR : {erreurs[personne]}"}]))
+            continue
+        chemin = os.path.join(dossier_sortie, personne, f"synthese.{format_sortie}")
+        if os.path.exists(chemin):
+            lignes.append(lire_table(chemin, format_sortie))
+    globale = pd.concat(lignes, ignore_index=True) if lignes else pd.DataFrame()
+    if not globale.empty:
+        os.makedirs(dossier_sortie, exist_ok=True)
+        ecrire_table(globale, os.path.join(dossier_sortie, "synthese_globale"), format_sortie)
+    return globale, erreurs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dossier_base", help="un sous-dossier par personne")
+    parser.add_argument("--sortie", required=True, help="dossier des synthèses")
+    parser.add_argument("--workers", type=int, default=None, help="personnes traitées en parallèle (défaut : nombre de cœurs)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--forcer", action="store_true", help="retraite aussi les personnes déjà à jour")
+    args = parser.parse_args()
+    try:
+        verifier_format(args.format)
+    except ImportError as e:
+        parser.error(str(e))
+
+    dossier_base, dossier_sortie = os.path.abspath(args.dossier_base), os.path.abspath(args.sortie)
+    os.chdir(DOSSIER_APPLICATION)
+    _, erreurs = traiter_lot(dossier_base, dossier_sortie, args.workers, args.format, args.forcer)
+    sys.exit(1 if erreurs else 0)
+
+
+if __name__ == "__main__":
+    main()